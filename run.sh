@@ -31,6 +31,10 @@ function init() {
         file2="$base_dir/all_json_file-"`date +"%Y%m%d%H%M%S"`".json"
         mv $base_dir/all_json_file.json $file2
     fi
+    # 上次异常退出时未合并的结果日志
+    if [  -f ${file1}l ];then
+        mv ${file1}l ${file2:-$base_dir/all_json_file-`date +"%Y%m%d%H%M%S"`.json}l
+    fi
     
     opt_use_net=0
 }
@@ -154,12 +158,34 @@ function download() {
 
 # 解压指定的本地benchmark工具包，
 # 如果在命令行中使用-f制定了本地文件，或者在kytuning.cfg配置了本地文件，调用该函数处理
+# 解压压缩包到指定目录, 压缩包大小和修改时间与上次解压时相同且解压出的目录仍存在则跳过
+# 参数: 压缩包 目标目录 [tar其他参数]
+function extract_once() {
+    local tarfile=$1
+    local dest=$2
+    local stamp=$dest/.$(basename $tarfile).extracted
+    local sign=`stat -c '%s %Y' $tarfile 2>/dev/null`
+    if [ -z "$sign" ]; then
+        echo "$tarfile 不存在"
+        return 1
+    fi
+    # 压缩包中的第一个顶层目录(或文件), 被删除后需重新解压
+    local top=`tar -tf $tarfile 2>/dev/null | head -1`
+    top=${top#./}
+    top=${top%%/*}
+    if [ -f $stamp ] && [ "`cat $stamp`" == "$sign" ] && [ -n "$top" ] && [ -e "$dest/$top" ]; then
+        echo "$tarfile 未修改, 跳过解压"
+        return 0
+    fi
+    tar -xv ${@:3} -f $tarfile -C $dest && echo "$sign" > $stamp
+}
+
 function handle_tarfile() {
-    tar xv --skip-old-files -f $1  
-    tar -xvf ${tools_path}/lmbench.tar -C ${tools_path}
-    tar -xvf ${tools_path}/cpu2006.tar -C ${tools_path}
-    tar -xvf ${tools_path}/cpu2017.tar -C ${tools_path}
-    tar -xvf ${tools_path}/jvm2008.tar -C ${tools_path}
+    extract_once $1 . --skip-old-files
+    extract_once ${tools_path}/lmbench.tar ${tools_path}
+    extract_once ${tools_path}/cpu2006.tar ${tools_path}
+    extract_once ${tools_path}/cpu2017.tar ${tools_path}
+    extract_once ${tools_path}/jvm2008.tar ${tools_path}
 
 }
 
@@ -267,6 +293,8 @@ function main() {
 
     if [ $# -eq 0 ]; then
         run "$rk_benchmark"
+        # 合并各测试遗留的结果日志(all_json_file.jsonl)到all_json_file.json
+        python3 $cur_path/src/kytuning.py --compact
         json_file="$base_dir/all_json_file.json"
         if [ $# -eq 0 ] && [ -f $json_file ]; then
             sed -i 's/NR\/RE//g' $base_dir/all_json_file.json
@@ -5,10 +5,14 @@
  * Author: liyl_kl <liyulong@kylinos.cn>
  * Date: Fri Mar 1 15:05:49 2024 +0800
 """
+import os
 import sys
 import json
 import requests
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "kytuning"))
+from blobstore import BlobStore
+
 project_name="麒麟自测1"
 user_name = "李四"
 password = ""
@@ -34,6 +38,8 @@ with open(json_file, 'r') as f:
         json_data = f.read()
         # 将 JSON 字符串解析为 Python 对象
         data = json.loads(json_data)
+        # 环境信息中的大段文本以blob引用保存, 上传前还原为base64编码
+        data = BlobStore(os.path.join(os.path.dirname(os.path.abspath(json_file)), "blobs")).inline(data)
         # 向 Python 对象中添加新的键值对
         data['user_name'] = username
         data['project_name'] = project_name
@@ -0,0 +1,131 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import shutil
+import logging
+
+__all__ = ['AffinityError', 'parse_cpulist', 'cpu_topology', 'allocate_slots']
+
+
+class AffinityError(Exception):
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+
+def parse_cpulist(text) -> list:
+    """
+    解析CPU列表, 如 "0-3,8,10-11"
+    """
+    cpus = []
+    for part in str(text).strip().split(','):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        try:
+            if '-' in part:
+                low, high = part.split('-', 1)
+                cpus.extend(range(int(low), int(high) + 1))
+            else:
+                cpus.append(int(part))
+        except ValueError:
+            raise AffinityError('invalid cpu list: {text}'.format(text=text))
+    return cpus
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as fp:
+            return fp.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_topology() -> list:
+    """
+    当前进程可用的CPU及其所在的物理核、NUMA节点
+    :return: [(cpu, (package, core), node), ...] 按CPU编号排序
+    """
+    nodes = {}
+    for path in glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        for cpu in parse_cpulist(_read(path) or ''):
+            nodes[cpu] = node
+    ret = []
+    for cpu in sorted(os.sched_getaffinity(0)):
+        topo = '/sys/devices/system/cpu/cpu{cpu}/topology'.format(cpu=cpu)
+        package = _read(os.path.join(topo, 'physical_package_id'))
+        core = _read(os.path.join(topo, 'core_id'))
+        key = (package, core) if core is not None else (None, cpu)
+        ret.append((cpu, key, nodes.get(cpu, 0)))
+    return ret
+
+
+def _interleave(groups):
+    """
+    依次从各组中取一个, 使相邻的副本分布在不同的NUMA节点上
+    """
+    ret = []
+    groups = [list(group) for group in groups]
+    while any(groups):
+        for group in groups:
+            if group:
+                ret.append(group.pop(0))
+    return ret
+
+
+def allocate_slots(copies, pin = 'core', cpus = None) -> list:
+    """
+    为并行运行的副本分配互不重叠的CPU:
+        core    每个副本绑定到一个物理核上的一个CPU(taskset), 各副本尽量分布在不同的NUMA节点
+        numa    每个副本绑定到一个NUMA节点的CPU及内存(numactl)
+        none    不绑定
+    :param copies: 副本数, 0表示每个物理核(pin为numa时每个节点)一个
+    :param cpus: 可用的CPU列表, 如"0-63", 默认为当前进程可用的全部CPU
+    :return: [{'cpus': [...], 'node': 节点, 'prefix': 运行命令的前缀}, ...]
+    :raise AffinityError: 可用的物理核或NUMA节点少于副本数, 或缺少numactl
+    """
+    topology = cpu_topology()
+    if cpus is not None:
+        allowed = set(parse_cpulist(cpus))
+        topology = [item for item in topology if item[0] in allowed]
+    if len(topology) == 0:
+        raise AffinityError('no cpu available in {cpus}'.format(cpus=cpus))
+    if pin == 'none':
+        if copies <= 0:
+            raise AffinityError("parallel copies must be given when pin is 'none'")
+        return [{'cpus': [], 'node': None, 'prefix': ''} for _ in range(copies)]
+
+    byid = {}
+    for cpu, core, node in topology:
+        byid.setdefault(node, {}).setdefault(core, []).append(cpu)
+    if pin == 'numa':
+        if shutil.which('numactl') is None:
+            raise AffinityError("pin 'numa' requires numactl")
+        slots = [{'cpus': sorted(cpu for core in byid[node].values() for cpu in core), 'node': node,
+                  'prefix': 'numactl --cpunodebind={node} --membind={node}'.format(node=node)}
+                 for node in sorted(byid)]
+        unit = 'numa nodes'
+    elif pin == 'core':
+        # 每个物理核只取第一个CPU, 避免两个副本共用同一物理核的超线程
+        slots = _interleave([[{'cpus': [cores[core][0]], 'node': node,
+                               'prefix': 'taskset -c {cpu}'.format(cpu=cores[core][0])}
+                              for core in sorted(cores, key=lambda core: cores[core][0])]
+                             for node, cores in sorted(byid.items())])
+        unit = 'cores'
+    else:
+        raise AffinityError('unknown pin: {pin}'.format(pin=pin))
+    if copies <= 0:
+        return slots
+    if copies > len(slots):
+        raise AffinityError('{copies} copies need {copies} {unit}, only {count} available'.format(
+            copies=copies, unit=unit, count=len(slots)))
+    logging.debug('parallel slots: {slots}'.format(slots=[slot['prefix'] for slot in slots[:copies]]))
+    return slots[:copies]
@@ -0,0 +1,95 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import zlib
+import base64
+import hashlib
+
+__all__ = ['BlobStore']
+
+
+class BlobStore(object):
+    """
+    按内容寻址的压缩存储, 用于存放rpm -qa/sysctl -a等大段环境信息.
+        store = BlobStore('/root/kytuning/blobs')
+        ref = store.put(text)          # 'blob:sha256:<hex>'
+        text = store.get_text(ref)
+    文件保存为 <root>/<hex[:2]>/<hex>.z, 内容为zlib压缩后的原始数据.
+    """
+    PREFIX = 'blob:sha256:'
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def is_ref(cls, value) -> bool:
+        return isinstance(value, str) and value.startswith(cls.PREFIX)
+
+    def _path(self, ref):
+        digest = ref[len(self.PREFIX):]
+        return os.path.join(self.root, digest[:2], digest + '.z')
+
+    def put(self, data) -> str:
+        if data is None:
+            data = ''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        ref = self.PREFIX + hashlib.sha256(data).hexdigest()
+        path = self._path(ref)
+        if os.path.exists(path):
+            return ref
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        tmp_file = '{path}.{pid}.tmp'.format(path = path, pid = os.getpid())
+        with open(tmp_file, 'wb') as fp:
+            fp.write(zlib.compress(data, 6))
+        os.replace(tmp_file, path)
+        return ref
+
+    def exists(self, ref) -> bool:
+        return os.path.exists(self._path(ref))
+
+    def get(self, ref) -> bytes:
+        with open(self._path(ref), 'rb') as fp:
+            return zlib.decompress(fp.read())
+
+    def get_text(self, ref) -> str:
+        return self.get(ref).decode('utf-8', 'replace')
+
+    def get_base64(self, ref) -> str:
+        return base64.b64encode(self.get(ref)).decode('ascii')
+
+    def refs(self, obj) -> list:
+        """
+        列出obj(dict/list嵌套结构)中引用的全部blob
+        """
+        if self.is_ref(obj):
+            return [obj]
+        ret = []
+        if isinstance(obj, dict):
+            obj = list(obj.values())
+        if isinstance(obj, list):
+            for v in obj:
+                ret.extend(self.refs(v))
+        return ret
+
+    def missing(self, obj) -> list:
+        return [ref for ref in self.refs(obj) if not self.exists(ref)]
+
+    def inline(self, obj):
+        """
+        将obj中的blob引用替换为base64编码的内容, 返回新对象, 用于上传
+        """
+        if self.is_ref(obj):
+            return self.get_base64(obj) if self.exists(obj) else None
+        if isinstance(obj, dict):
+            return {k: self.inline(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.inline(v) for v in obj]
+        return obj
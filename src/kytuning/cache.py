@@ -0,0 +1,337 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import subprocess
+
+__all__ = ['BuildCache', 'ExtractCache', 'ResultCache', 'toolchain_version', 'tree_manifest']
+
+
+_toolchain = None
+
+
+def toolchain_version() -> str:
+    """
+    编译工具链版本(cc/gcc/g++/gfortran首行及CC/CFLAGS等环境变量), 进程内只查询一次
+    """
+    global _toolchain
+    if _toolchain is not None:
+        return _toolchain
+    lines = []
+    for cc in ('cc', 'gcc', 'g++', 'gfortran'):
+        try:
+            out = subprocess.run([cc, '--version'], stdout = subprocess.PIPE,
+                                 stderr = subprocess.DEVNULL).stdout.decode('utf-8', 'replace')
+            lines.append(out.split('\n', 1)[0])
+        except OSError:
+            lines.append('')
+    for name in ('CC', 'CXX', 'FC', 'CFLAGS', 'CXXFLAGS', 'FFLAGS', 'LDFLAGS'):
+        lines.append('{name}={value}'.format(name = name, value = os.environ.get(name, '')))
+    _toolchain = '\n'.join(lines)
+    return _toolchain
+
+
+def tree_manifest(top, exclude = set()) -> str:
+    """
+    目录文件清单(相对路径/大小/mtime)的摘要, 用于判断目录内容是否被修改
+    :param exclude: 不参与计算的路径(相对top)
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(top):
+        rel_root = os.path.relpath(root, top)
+        dirs[:] = sorted(d for d in dirs if os.path.normpath(os.path.join(rel_root, d)) not in exclude)
+        for name in sorted(files):
+            rel = os.path.normpath(os.path.join(rel_root, name))
+            if rel in exclude:
+                continue
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            digest.update('{0}\0{1}\0{2}\n'.format(rel, st.st_size, st.st_mtime_ns).encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+class BuildCache(object):
+    """
+    编译产物缓存, 同一个方案中编译命令与工具链不变时只编译一次.
+        cache = BuildCache('/root/kytuning/fio-3.34', exclude = ['results'])
+        if not cache.hit(tcase):
+            tcase.build()
+            cache.record(tcase)
+    编译完成后在tool_dir中保存.kytuning-build.json, 记录缓存键及目录文件清单
+    (路径/大小/mtime)的摘要, 文件被修改或删除后缓存失效.
+    """
+    STAMP = '.kytuning-build.json'
+
+    def __init__(self, tool_dir, exclude = [], enable = True, force = False):
+        """
+        :param tool_dir: 测试工具目录
+        :param exclude: 不参与文件清单计算的目录(相对tool_dir), 如测试结果目录
+        :param enable: 是否启用缓存
+        :param force: 忽略已有缓存, 第一次编译后恢复正常
+        """
+        self.tool_dir = os.path.abspath(tool_dir) if tool_dir else None
+        self.exclude = set(os.path.normpath(p) for p in exclude)
+        self.exclude.add(self.STAMP)
+        self.enable = enable and self.tool_dir is not None
+        self.force = force
+
+    def _stamp_file(self):
+        return os.path.join(self.tool_dir, self.STAMP)
+
+    def key(self, tcase) -> str:
+        data = json.dumps([tcase.build_cmd, tcase.clean_cmd, toolchain_version()])
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def manifest(self) -> str:
+        return tree_manifest(self.tool_dir, self.exclude)
+
+    def _load(self) -> dict:
+        try:
+            with open(self._stamp_file(), 'r') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def built(self) -> bool:
+        """
+        tool_dir中是否留有未清理的编译产物
+        """
+        return self.enable and os.path.exists(self._stamp_file())
+
+    def hit(self, tcase) -> bool:
+        if not self.enable or self.force:
+            return False
+        stamp = self._load()
+        if stamp.get('key') != self.key(tcase):
+            return False
+        if stamp.get('manifest') != self.manifest():
+            logging.info('build cache: {tdir} changed since last build'.format(tdir = self.tool_dir))
+            return False
+        return True
+
+    def record(self, tcase):
+        """
+        记录编译结果, 测试用例结束时再次调用以包含运行期间产生的文件
+        """
+        if not self.enable:
+            return
+        self.force = False
+        stamp = {'key': self.key(tcase), 'manifest': self.manifest(), 'build': tcase.build_cmd}
+        try:
+            with open(self._stamp_file(), 'w') as fp:
+                json.dump(stamp, fp)
+        except OSError as e:
+            logging.warning('build cache: save stamp failed: {err}'.format(err = e))
+
+    def invalidate(self):
+        if os.path.exists(self._stamp_file()):
+            os.remove(self._stamp_file())
+
+
+class ExtractCache(object):
+    """
+    测试工具压缩包解压缓存, 按压缩包的sha256判断是否需要重新解压.
+        cache = ExtractCache('/root/kytuning', pristine = 'reflink')
+        if cache.stale(tool_tgz, tool_dir): 删除tool_dir后重新解压
+        解压后调用 cache.extracted(tool_tgz, tool_dir)
+    解压完成后在tool_dir中保存.kytuning-extract记录压缩包摘要; 压缩包摘要按
+    路径/大小/mtime记录在<base_path>/.extract/digests.json中, 未修改的压缩包不再计算.
+    pristine为reflink时, 解压后在<base_path>/.extract/中保存一份原始副本(文件系统不支持reflink时为普通复制),
+    之后tool_dir被编译等操作修改时从副本克隆恢复, 无需再次解压.
+    """
+    STAMP = '.kytuning-extract'
+
+    def __init__(self, base_path, pristine = False):
+        """
+        :param base_path: 缓存保存路径
+        :param pristine: False/'reflink', 是否保存并恢复原始副本
+        """
+        self.root = os.path.join(base_path, '.extract')
+        self.index_file = os.path.join(self.root, 'digests.json')
+        if pristine == 'hardlink':
+            # 硬链接的副本与tool_dir共用inode, 编译时原地改写的文件会同时修改副本
+            logging.warning("extract_pristine 'hardlink' is no longer supported, use 'reflink'")
+            pristine = 'reflink'
+        self.pristine = pristine if pristine == 'reflink' else False
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_file, 'r') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        os.makedirs(self.root, exist_ok = True)
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as fp:
+            json.dump(index, fp)
+        os.replace(tmp_file, self.index_file)
+
+    def digest(self, archive):
+        """
+        压缩包sha256, 压缩包不存在时返回None
+        """
+        try:
+            st = os.stat(archive)
+        except OSError:
+            return None
+        path = os.path.abspath(archive)
+        index = self._load_index()
+        item = index.get(path)
+        if item and item['size'] == st.st_size and item['mtime'] == st.st_mtime_ns:
+            return item['sha256']
+        sha = hashlib.sha256()
+        with open(archive, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                sha.update(chunk)
+        index[path] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha256': sha.hexdigest()}
+        self._save_index(index)
+        return index[path]['sha256']
+
+    def stamp(self, tool_dir):
+        try:
+            with open(os.path.join(tool_dir, self.STAMP), 'r') as fp:
+                return fp.read().strip()
+        except OSError:
+            return None
+
+    def stale(self, archive, tool_dir) -> bool:
+        """
+        tool_dir是否由其他版本的压缩包解压而来, 未记录摘要的目录沿用原有行为视为有效
+        """
+        stamp = self.stamp(tool_dir)
+        if stamp is None:
+            return False
+        digest = self.digest(archive)
+        return digest is not None and stamp != digest
+
+    def _snapshot(self, digest):
+        return os.path.join(self.root, digest)
+
+    def _clone(self, src, dst):
+        r = subprocess.run(['cp', '-a', '--reflink=auto', src, dst])
+        return r.returncode == 0
+
+    def extracted(self, archive, tool_dir):
+        """
+        记录解压结果, pristine模式下保存原始副本
+        """
+        digest = self.digest(archive)
+        if digest is None or not os.path.isdir(tool_dir):
+            return
+        with open(os.path.join(tool_dir, self.STAMP), 'w') as fp:
+            fp.write(digest)
+        if not self.pristine:
+            return
+        snapshot = self._snapshot(digest)
+        if os.path.exists(snapshot):
+            return
+        os.makedirs(self.root, exist_ok = True)
+        tmp_dir = snapshot + '.tmp'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        if self._clone(tool_dir, tmp_dir):
+            os.rename(tmp_dir, snapshot)
+        else:
+            logging.warning('extract cache: snapshot {tdir} failed'.format(tdir = tool_dir))
+
+    def restore(self, archive, tool_dir, exclude = ()) -> bool:
+        """
+        pristine模式下用原始副本恢复tool_dir(不存在或已被修改时)
+        :param exclude: 不参与比较的路径(相对tool_dir), 如测试结果目录; 编译缓存的记录文件总是不参与比较
+        :return: 是否已恢复或无需恢复; False表示需要重新解压
+        """
+        if not self.pristine:
+            return False
+        digest = self.digest(archive)
+        if digest is None:
+            return False
+        snapshot = self._snapshot(digest)
+        if not os.path.isdir(snapshot):
+            return False
+        if os.path.exists(tool_dir):
+            exclude = set(os.path.normpath(p) for p in exclude) | {BuildCache.STAMP}
+            if tree_manifest(tool_dir, exclude) == tree_manifest(snapshot, exclude):
+                return True
+            logging.info('extract cache: {tdir} was modified, restore pristine copy'.format(tdir = tool_dir))
+            shutil.rmtree(tool_dir)
+        return self._clone(snapshot, tool_dir)
+
+
+class ResultCache(object):
+    """
+    测试结果复用缓存, 测试命令、参数取值、编译及主机指纹均相同且未超过ttl时复用上次的测试结果.
+        cache = ResultCache('/root/kytuning/result_cache', blobs, ttl = 604800)
+        key = cache.key({'run': ..., 'configs': ..., 'build': ..., 'host': ...})
+        datas = cache.load(key)        # 各次迭代的结果数据, 无可用结果时返回None
+        cache.save(key, datas, info)
+    索引保存为 <root>/<key[:2]>/<key>.json, 结果数据按内容保存在BlobStore中.
+    """
+
+    def __init__(self, root, blobs, ttl = 0, fresh = False):
+        """
+        :param blobs: 保存结果数据的BlobStore
+        :param ttl: 有效期(秒), 0表示不使用缓存
+        :param fresh: 不复用已有结果, 但仍保存本次结果
+        """
+        self.root = root
+        self.blobs = blobs
+        self.ttl = ttl or 0
+        self.fresh = fresh
+
+    @property
+    def enable(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key(parts: dict) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def load(self, key):
+        if not self.enable or self.fresh:
+            return None
+        try:
+            with open(self._path(key), 'r') as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('time', 0) > self.ttl:
+            return None
+        refs = entry.get('iterations', [])
+        if len(refs) == 0 or len(self.blobs.missing(refs)) > 0:
+            return None
+        return [self.blobs.get_text(ref) for ref in refs]
+
+    def save(self, key, datas, info = None):
+        """
+        :param datas: 各次迭代的结果数据
+        :param info: 随索引保存的附加信息, 如测试用例名称
+        """
+        if not self.enable or len(datas) == 0:
+            return
+        entry = {'time': time.time(), 'info': info, 'iterations': [self.blobs.put(data) for data in datas]}
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            with open(path + '.tmp', 'w') as fp:
+                json.dump(entry, fp)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logging.warning('result cache: save {path} failed: {err}'.format(path = path, err = e))
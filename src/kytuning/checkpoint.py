@@ -0,0 +1,75 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from .journal import JsonlJournal
+
+__all__ = ['Checkpoint']
+
+
+class Checkpoint(object):
+    """
+    测试进度日志, 保存在结果目录的checkpoint.jsonl中, 每条记录写入后立即落盘:
+        {"type": "iteration", "testcase": name, "ordinal": n, "iteration": idx, "result": path}
+        {"type": "testcase", "testcase": name, "ordinal": n}                测试用例完成
+        {"type": "screening", "rung": idx, "keep": [name, ...]}             一轮筛选完成
+    --resume时据此跳过已完成的测试; 中断时未还原的参数由RollbackJournal还原.
+    测试用例名称可能重复(如未命名的testcase), 按测试用例序号及名称区分.
+    """
+    FILE_NAME = 'checkpoint.jsonl'
+
+    def __init__(self, result_dir):
+        self.path = os.path.join(result_dir, self.FILE_NAME)
+        self.iterations = {}
+        self.testcases = set()
+        self.screening = {}
+        for record in JsonlJournal.load(self.path):
+            key = (record.get('ordinal'), record.get('testcase'))
+            if record.get('type') == 'iteration':
+                self.iterations[(key, record.get('iteration'))] = record.get('result')
+            elif record.get('type') == 'testcase':
+                self.testcases.add(key)
+            elif record.get('type') == 'screening':
+                self.screening[record.get('rung')] = record.get('keep', [])
+        self.journal = JsonlJournal(self.path, 1)
+
+    @staticmethod
+    def _key(tcase):
+        return (tcase.ordinal, tcase.name)
+
+    def testcase_done(self, tcase) -> bool:
+        return self._key(tcase) in self.testcases
+
+    def iteration_result(self, tcase, idx):
+        """
+        :return: 已完成迭代的结果文件路径, 未完成时返回None
+        """
+        return self.iterations.get((self._key(tcase), idx))
+
+    def screening_result(self, rung):
+        """
+        :return: 已完成的一轮筛选保留的测试用例名称, 未完成时返回None
+        """
+        return self.screening.get(rung)
+
+    def save_screening(self, rung, keep):
+        self.screening[rung] = keep
+        self.journal.append({'type': 'screening', 'rung': rung, 'keep': keep})
+
+    def save_iteration(self, tcase, idx, result):
+        self.iterations[(self._key(tcase), idx)] = result
+        self.journal.append({'type': 'iteration', 'testcase': tcase.name, 'ordinal': tcase.ordinal,
+                             'iteration': idx, 'result': result})
+
+    def save_testcase(self, tcase):
+        self.testcases.add(self._key(tcase))
+        self.journal.append({'type': 'testcase', 'testcase': tcase.name, 'ordinal': tcase.ordinal})
+
+    def close(self):
+        self.journal.close()
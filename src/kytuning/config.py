@@ -50,7 +50,11 @@ class KYConfig(object):
         :return:
         """
         global extra_data
-        extra_data.update(conf)
+        for k, v in conf.items():
+            if isinstance(v, dict) and isinstance(extra_data.get(k), dict):
+                extra_data[k].update(v)
+            else:
+                extra_data[k] = v
 
     def get(self, keys: list):
         """
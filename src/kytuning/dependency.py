@@ -9,6 +9,8 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shlex
+import shutil
 from .exec_cmd import ExecCmd
 
 class DependencyError(Exception):
@@ -19,6 +21,13 @@ class DependencyError(Exception):
 class DependencyManager(object):
     env = dict(os.environ, LC_ALL="C")
 
+    # 包管理器: (检测命令, 查询方式, 安装/卸载命令), 按顺序检测
+    backends = [
+        ('dnf',     'rpm',  'dnf'),
+        ('yum',     'rpm',  'yum'),
+        ('apt-get', 'dpkg', 'apt-get'),
+    ]
+
     def __init__(self, rpmlist = []):
         self.rpmlist = rpmlist
 
@@ -43,39 +52,69 @@ class DependencyManager(object):
         if rpmlist == None:
             raise Exception("The len of rpmlist is 0")
 
+        self.query, self.installer = self.detect_backend()
+
+        installed = self.query_installed(rpmlist)
         for rpm in rpmlist:
-            installed = self.check_install(rpm)
-            if installed == True:
+            if rpm in installed:
                 self.dont_install.append(rpm)
             else:
                 self.need_install.append(rpm)
 
 
-    def install_once(self, rpm=None):
+    def detect_backend(self):
         """
-        安装软件
-        :param rpm:
-        :return:
+        检测包管理器, 都不存在时按rpm/yum处理
+        :return: (查询方式, 安装/卸载命令)
         """
-        if rpm == None:
-            return False
+        for cmd, query, installer in self.backends:
+            if shutil.which(cmd) is not None:
+                return query, installer
+        return 'rpm', 'yum'
+
 
-        cmd = 'yum -y install ' + rpm
-        result = ExecCmd(command = cmd, env = self.env).run()
-        return 0 if result.exit_status == 0 else 1
+    def query_installed(self, rpms) -> set:
+        """
+        一次查询所有软件包的安装状态
+        :param rpms: 软件包列表
+        :return: 已安装的软件包集合
+        """
+        if len(rpms) == 0:
+            return set()
+
+        names = ' '.join(shlex.quote(rpm) for rpm in rpms)
+        if self.query == 'dpkg':
+            cmd = "dpkg-query -W -f '${Package} ${db:Status-Status}\\n' " + names
+            result = ExecCmd(command = cmd, env = self.env).run()
+            installed = set()
+            for line in (result.stdout or '').splitlines():
+                fields = line.split()
+                if len(fields) == 2 and fields[1] == 'installed':
+                    installed.add(fields[0])
+        else:
+            cmd = "rpm -qa --queryformat '%{name}\\n' " + names
+            result = ExecCmd(command = cmd, env = self.env).run()
+            installed = set((result.stdout or '').split())
+        return set(rpm for rpm in rpms if rpm in installed)
 
 
     def install(self) -> list:
         """
-        安装软件的列表
+        在一个事务中安装软件列表
         :return:
         """
+        if len(self.need_install) == 0:
+            return self.succ_install
+
+        cmd = self.installer + ' -y install ' + ' '.join(shlex.quote(rpm) for rpm in self.need_install)
+        ExecCmd(command = cmd, env = self.env).run()
+
+        installed = self.query_installed(self.need_install)
         for rpm in self.need_install:
-           result =  self.install_once(rpm)
-           if result == 0:
-               self.succ_install.append(rpm)
-           else:
-               self.fail_install.append(rpm)
+            if rpm in installed:
+                self.succ_install.append(rpm)
+            else:
+                self.fail_install.append(rpm)
 
         if len(self.fail_install) > 0:
             # environment recovery
@@ -85,18 +124,18 @@ class DependencyManager(object):
         return self.succ_install
 
 
-    def uninstall_once(self, rpm):
+    def remove(self, rpms) -> set:
         """
-        卸载软件
-        :param rpm:
-        :return:
+        在一个事务中卸载软件列表
+        :param rpms: 软件包列表
+        :return: 仍处于安装状态的软件包集合
         """
-        if rpm == None:
-            return False
+        if len(rpms) == 0:
+            return set()
 
-        cmd = 'yum -y remove ' + rpm
-        result = ExecCmd(command = cmd, env = self.env).run()
-        return 0 if result.exit_status == 0 else 1
+        cmd = self.installer + ' -y remove ' + ' '.join(shlex.quote(rpm) for rpm in rpms)
+        ExecCmd(command = cmd, env = self.env).run()
+        return self.query_installed(rpms)
 
 
     def uninstall_norecord(self):
@@ -104,8 +143,7 @@ class DependencyManager(object):
         卸载已经安装完成的软件
         :return:
         """
-        for rpm in self.succ_install[::-1]:
-            result = self.uninstall_once(rpm)
+        self.remove(self.succ_install[::-1])
         
 
     def uninstall(self) :
@@ -113,12 +151,12 @@ class DependencyManager(object):
         卸载软件列表
         :return:
         """
+        remained = self.remove(self.succ_install[::-1])
         for rpm in self.succ_install[::-1]:
-            result = self.uninstall_once(rpm)
-            if result == 0:
-                self.succ_uninstall.append(rpm)
-            else:
+            if rpm in remained:
                 self.fail_uninstall.append(rpm)
+            else:
+                self.succ_uninstall.append(rpm)
                 
         if len(self.fail_uninstall) > 0:
             raise DependencyError("Dependency uninstall failed:" + str(self.fail_uninstall))
@@ -132,17 +170,7 @@ class DependencyManager(object):
         :param rpm:
         :return:
         """
-        cmd = "rpm -qa  --queryformat '%{name}' " + rpm
-        result = ExecCmd(command = cmd, env = self.env).run()
-
-        '''
-        If the result.stdout is not empty, 
-        it means that the software package has been installed
-        '''
-        if result.exit_status == 0 and len(result.stdout) > 0:
-            return True
-        else:
-            return False
+        return rpm in self.query_installed([rpm])
 
 
 if __name__ == "__main__":
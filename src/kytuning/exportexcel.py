@@ -12,6 +12,7 @@
 __all__ = ['ExportXlsx']
 import os
 import re
+import copy
 import json
 import difflib
 import argparse
@@ -40,6 +41,8 @@ class BenchMark(object):
         self.items = None
         self.tool_name = None
         self.tool_version = None  # 暂时未使用
+        # BlobStore, 环境信息中blob引用的解析, 为None时按base64处理
+        self.blobs = None
 
         self.sheet_env_title = "性能测试环境"
         self.index_start = 1
@@ -239,11 +242,44 @@ class BenchMark(object):
 
     def ret_to_dict(self, file: str): ...
 
+    def primary_metric(self, ret_dict: dict):
+        """主指标, 用于判断多次迭代的结果是否稳定, 无单一主指标的工具返回None"""
+        return None
+
+    def metric_value(self, ret_dict: dict, path: str = None):
+        """
+        取结果中的指标数值
+        :param path: 以'.'分隔的键路径(列表用下标), 如"items.iops", 为空时取primary_metric
+        :return: 指标数值, 不存在或不是数值时返回None
+        """
+        if not ret_dict:
+            return None
+        if path:
+            value = ret_dict
+            for key in path.split("."):
+                if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                    value = value[int(key)]
+                elif isinstance(value, dict) and key in value:
+                    value = value[key]
+                else:
+                    return None
+        else:
+            try:
+                value = self.primary_metric(ret_dict)
+            except (KeyError, IndexError, TypeError, AttributeError):
+                return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        temp = re.search(r"-?\d+\.?\d*(e[-+]?\d+)?", str(value)) if value is not None else None
+        return float(temp.group()) if temp else None
+
     def env_dict_to_excel(self, sheet: Worksheet, env_dict: dict):
         if not env_dict:
             return
         text_sheet_title = "性能测试环境统计表"
-        _env_dict = env_dict
+        # getenv.json为{"envinfo": {...}}, jsontoexcel将各项放在顶层
+        _env_dict = dict(env_dict["envinfo"])
+        _env_dict.update({k: v for k, v in env_dict.items() if k != "envinfo"})
         index_start = 1
         self.set_cell_style(sheet, index_start, index_start,
                             text_sheet_title, self.alignment_center,
@@ -262,7 +298,7 @@ class BenchMark(object):
         row_start_idx = 5
         _row_up = 0
         _row = 1
-        A_names = list(_env_dict["envinfo"].keys())
+        A_names = list(env_dict["envinfo"].keys())
         A_names_len = len(A_names)
         for A_i in range(A_names_len):     # 遍历第一列中的内容
             self.set_cell_style(
@@ -309,7 +345,11 @@ class BenchMark(object):
                             if dict_keys_type == str:
                                 cell_str = _env_dict[A_names[A_i]][key_names[i]
                                                          ][dict_keys_name[j]]
-                                if any(dict_keys_name[j]
+                                if self.blobs is not None and self.blobs.is_ref(cell_str):
+                                    # blob已被清理时保留引用文本, 不中断结果导出
+                                    if self.blobs.exists(cell_str):
+                                        cell_str = self.blobs.get_text(cell_str)
+                                elif any(dict_keys_name[j]
                                        in s for s in base64_list):
                                     cell_str = b64decode(
                                         cell_str).decode("ascii")
@@ -464,6 +504,11 @@ class Unixbench(BenchMark):
         else:
             return None
 
+    def primary_metric(self, ret_dict: dict):
+        """多线程(无多线程结果时单线程)的Index Score"""
+        _ret = ret_dict.get(self.thread[1]) or ret_dict.get(self.thread[0])
+        return _ret[self.items[-1]]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         sheet = None
         if self.tool_name in workbook.sheetnames:  # 已存在sheet
@@ -590,6 +635,11 @@ class Speccpu2006(BenchMark):
             ret_dict["items"][_items_key] = score_dict
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """第一组结果base的总分(SPECint_2006/SPECfp_2006)"""
+        _scores = list(ret_dict["items"].values())[0][self.tune[0]]
+        return list(_scores.values())[-1]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         for k, v in ret_dict["items"].items():
             for _k, _v in v.items():
@@ -740,6 +790,11 @@ class Speccpu2017(BenchMark):
             ret_dict["items"][_score_key] = score_dict
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """第一组结果base的总分"""
+        _scores = list(ret_dict["items"].values())[0][self.tune[0]]
+        return list(_scores.values())[-1]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         for k, v in ret_dict["items"].items():
             for _k, _v in v.items():
@@ -820,6 +875,10 @@ class Iozone(BenchMark):
                 break
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """第一条记录的写测试速率"""
+        return ret_dict['测试记录'][0][self.items['rw_items'][0]]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         if ret_dict['tool_name'] in workbook.sheetnames:
             sheet = workbook[ret_dict['tool_name']]
@@ -893,6 +952,11 @@ class Specjvm2008(BenchMark):
         ret_dict["items"][_tune] = _score_dict
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """composite result"""
+        _scores = list(ret_dict["items"].values())[0]
+        return list(_scores.values())[-1]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         sheet_name = "%s" % (self.tool_name)
         if sheet_name in workbook.sheetnames:  # 已存在sheet
@@ -1161,6 +1225,11 @@ class Stream(BenchMark):
         else:
             return None
 
+    def primary_metric(self, ret_dict: dict):
+        """多线程(无多线程结果时单线程)的Triad带宽"""
+        _ret = ret_dict[self.thread[1]][self.items[-1]] or ret_dict[self.thread[0]][self.items[-1]]
+        return _ret
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         sheet = None
         if self.tool_name in workbook.sheetnames:  # 已存在sheet
@@ -1212,6 +1281,10 @@ class Netperf(BenchMark):
                 ret_dict['测试记录'].append(lines[i].strip().split(' ')[-1])
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """TCP_Stream吞吐量"""
+        return ret_dict['测试记录'][0]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         print(ret_dict)
         sheet = None
@@ -1309,6 +1382,10 @@ class Fio(BenchMark):
             zip(self.items["items"], [_bs, _io, _iops, _bw]))
         return ret_dict
 
+    def primary_metric(self, ret_dict: dict):
+        """IOPS"""
+        return ret_dict["items"]["iops"]
+
     def ret_dict_to_excel(self, workbook: Workbook, ret_dict: dict):
         sheet = None
         if self.tool_name in workbook.sheetnames:  # 已存在sheet
@@ -1340,6 +1417,57 @@ class ExportXlsx(object):
         self.excel_name = "kytuning-result.xlsx"
         self.jsob_name = "kytuning-result.json"
 
+        # 结果解析缓存, 键为(路径, 大小, mtime, 解析类), 同一结果文件只解析一次
+        self.parse_cache = {}
+        self.parse_hit = 0
+        self.parse_miss = 0
+
+        # deferred模式: 在内存中保持同一个Workbook, 仅在flush()或达到checkpoint时写盘
+        self.deferred = False
+        self.checkpoint = 0
+        self.wb = None
+        self.wb_file = None
+        self.wb_dirty = 0
+
+    def set_deferred(self, deferred: bool = True, checkpoint: int = 0):
+        """
+        设置表格写入方式
+        :param deferred      True时在内存中汇总结果, 结束时写盘
+        :param checkpoint    deferred模式下每写入checkpoint次保存一次, 0表示仅在flush()时保存
+        """
+        self.flush()
+        self.deferred = deferred
+        self.checkpoint = checkpoint if checkpoint and checkpoint > 0 else 0
+
+    def flush(self):
+        """将内存中的Workbook写盘"""
+        if self.wb is not None and self.wb_dirty > 0:
+            self.wb.save(self.wb_file)
+            self.wb_dirty = 0
+        return self.wb_file
+
+    def _open_workbook(self, excel_file: str):
+        if self.deferred:
+            if self.wb is not None and self.wb_file == excel_file:
+                return self.wb
+            # 切换到其它表格文件前先保存当前表格
+            self.flush()
+            self.wb = None
+            self.wb_file = None
+        if os.path.isfile(excel_file):
+            return load_workbook(excel_file)
+        return None
+
+    def _save_workbook(self, wb: Workbook, excel_file: str):
+        if not self.deferred:
+            wb.save(excel_file)
+            return
+        self.wb = wb
+        self.wb_file = excel_file
+        self.wb_dirty += 1
+        if self.checkpoint > 0 and self.wb_dirty >= self.checkpoint:
+            self.flush()
+
     @ staticmethod
     def get_files(ret_path: str) -> list:
         files = []
@@ -1374,7 +1502,35 @@ class ExportXlsx(object):
         self.tool_cls.value_cmd = cmd
         self.tool_cls.value_modify_args = argv
         self.tool_cls.tool_name = _tool_name
-        return self.tool_cls.ret_to_dict(_ret_path)
+
+        # 不同调用方传入的工具名大小写不同(fio/Fio), 以解析类区分, 命中后再回填tool_name
+        key = self._parse_key(type(self.tool_cls).__name__, _ret_path)
+        if key is not None and key in self.parse_cache:
+            self.parse_hit += 1
+            ret_dict = copy.deepcopy(self.parse_cache[key])
+            if ret_dict is not None and "tool_name" in ret_dict:
+                ret_dict["tool_name"] = _tool_name
+            return ret_dict
+        self.parse_miss += 1
+        ret_dict = self.tool_cls.ret_to_dict(_ret_path)
+        if key is not None:
+            self.parse_cache[key] = copy.deepcopy(ret_dict)
+        return ret_dict
+
+    def metric_value(self, tool_name: str, ret_dict: dict, path: str = None):
+        """取解析结果中的指标数值, 见BenchMark.metric_value"""
+        tool_cls = self.get_tool_cls(tool_name)
+        if tool_cls is None:
+            return None
+        return tool_cls.metric_value(ret_dict, path)
+
+    @ staticmethod
+    def _parse_key(tool: str, ret_path: str):
+        try:
+            st = os.stat(ret_path)
+        except OSError:
+            return None
+        return (os.path.abspath(ret_path), st.st_size, st.st_mtime_ns, tool)
 
     def rets_to_dict_list(
             self, tool_name: str, ret_path: str, cmd: str, argv: str) -> list:
@@ -1393,33 +1549,34 @@ class ExportXlsx(object):
             return False
         excel_file = excel_path + "/" + self.excel_name
         _ret_dict = ret_dict
-        wb = None
-        if os.path.isfile(excel_file):
-            wb = load_workbook(excel_file)
-        else:
+        wb = self._open_workbook(excel_file)
+        if wb is None:
             wb = Workbook()
             wb.remove(wb.active)
         if not self.tool_cls.ret_dict_to_excel(wb, _ret_dict):
             print("结果字典转excel失败!")
             return False
-        wb.save(excel_file)
+        self._save_workbook(wb, excel_file)
         return True
 
-    def export_env_to_xlsx(self, env_dict: dict, excel_path: str):
+    def export_env_to_xlsx(self, env_dict: dict, excel_path: str, blobs = None):
         wb = None
         sheet = None
         excel_file = excel_path + "/" + self.excel_name
         env_write = BenchMark()
-        if os.path.isfile(excel_file):
-            wb = load_workbook(excel_file)
+        env_write.blobs = blobs
+        wb = self._open_workbook(excel_file)
+        if wb is not None:
             if env_write.sheet_env_title in wb.sheetnames:
                 sheet = wb[env_write.sheet_env_title]
+            else:
+                sheet = wb.create_sheet(env_write.sheet_env_title, 0)
         else:
             wb = Workbook()
             sheet = wb.active
             sheet.title = env_write.sheet_env_title
         env_write.env_dict_to_excel(sheet, env_dict)
-        wb.save(excel_file)
+        self._save_workbook(wb, excel_file)
 
     def export_ret_to_xlsx(
             self, tool_name: str, ret_path: str,
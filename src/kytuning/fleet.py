@@ -0,0 +1,552 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import base64
+import itertools
+import shutil
+import socket
+import logging
+import threading
+import socketserver
+import http.server
+import urllib.error
+import urllib.request
+from collections import deque
+
+from .scheme import SchemeParser
+from .report import Report
+from .test import TestFactory
+from .config import KYConfig
+
+__all__ = ['WorkQueue', 'Controller', 'Agent']
+
+
+class WorkQueue(object):
+    """
+    测试用例的分发队列. 空闲的代理端每次领取一批相邻的测试用例(相邻测试用例间切换的参数少),
+    逐个从自己的队列头部取出运行; 全局队列取完后, 空闲的代理端从剩余最多的代理端队列尾部取走一半.
+        queue = WorkQueue(total, batch = 4, timeout = 600)
+        kind, index = queue.next('agent-1')        # ('index', 3) / ('wait', None) / ('done', None)
+        queue.complete('agent-1', index)
+    超过timeout秒没有联系的代理端, 其正在运行及尚未运行的测试用例放回全局队列.
+    """
+
+    def __init__(self, total, batch = 4, timeout = 600, retries = 1):
+        """
+        :param total: 测试用例总数
+        :param batch: 每次领取的测试用例数
+        :param timeout: 代理端失联的判定时间(秒)
+        :param retries: 测试用例失败后在其它代理端重试的次数
+        """
+        self.total = total
+        self.batch = max(batch, 1)
+        self.timeout = timeout
+        self.retries = retries
+        self.pending = deque(range(total))
+        self.local = {}        # 代理端 -> 已领取未运行的测试用例
+        self.running = {}      # 代理端 -> 正在运行的测试用例
+        self.seen = {}         # 代理端 -> 最近联系的时间
+        self.tries = {}
+        self.done = set()
+        self.failed = {}       # 测试用例 -> 错误信息
+
+    def touch(self, agent, now = None):
+        self.seen[agent] = now if now is not None else time.time()
+
+    def _closed(self, index):
+        return index in self.done or index in self.failed
+
+    def _requeue(self, agent):
+        items = list(self.local.pop(agent, []))
+        index = self.running.pop(agent, None)
+        if index is not None and not self._closed(index):
+            items.insert(0, index)
+        self.pending.extendleft(reversed(items))
+        return items
+
+    def expire(self, now = None):
+        now = now if now is not None else time.time()
+        for agent, seen in list(self.seen.items()):
+            if now - seen > self.timeout:
+                items = self._requeue(agent)
+                self.seen.pop(agent)
+                if len(items) > 0:
+                    logging.warning('agent {agent} lost, requeue testcases {items}'.format(agent=agent, items=items))
+
+    def _steal(self, agent):
+        victim = None
+        for other, items in self.local.items():
+            if other != agent and len(items) > 0 and (victim is None or len(items) > len(self.local[victim])):
+                victim = other
+        if victim is None:
+            return []
+        items = self.local[victim]
+        stolen = [items.pop() for _ in range((len(items) + 1) // 2)]
+        stolen.reverse()
+        logging.info('agent {agent} steals {items} from {victim}'.format(agent=agent, items=stolen, victim=victim))
+        return stolen
+
+    def next(self, agent, now = None):
+        self.touch(agent, now)
+        self.expire(now)
+        index = self.running.pop(agent, None)
+        if index is not None and not self._closed(index):
+            # 未报告结果即领取下一个, 视为该测试用例丢失
+            self.pending.appendleft(index)
+        own = self.local.setdefault(agent, deque())
+        if len(own) == 0:
+            while len(own) < self.batch and len(self.pending) > 0:
+                own.append(self.pending.popleft())
+        if len(own) == 0:
+            own.extend(self._steal(agent))
+        while len(own) > 0:
+            index = own.popleft()
+            if self._closed(index):
+                continue
+            self.running[agent] = index
+            self.tries[index] = self.tries.get(index, 0) + 1
+            return 'index', index
+        return ('done', None) if self.finished() else ('wait', None)
+
+    def complete(self, agent, index) -> bool:
+        """
+        :return: 是否为该测试用例的第一个结果, 重复的结果(如失联后又恢复的代理端)应丢弃
+        """
+        self.touch(agent)
+        if self.running.get(agent) == index:
+            self.running.pop(agent)
+        if self._closed(index):
+            return False
+        self.done.add(index)
+        return True
+
+    def fail(self, agent, index, error):
+        self.touch(agent)
+        if self.running.get(agent) == index:
+            self.running.pop(agent)
+        if self._closed(index):
+            return
+        if self.tries.get(index, 0) <= self.retries:
+            self.pending.append(index)
+        else:
+            self.failed[index] = error
+
+    def finished(self) -> bool:
+        return len(self.done) + len(self.failed) >= self.total
+
+    def status(self) -> dict:
+        return {'total': self.total, 'done': len(self.done), 'failed': self.failed, 'pending': len(self.pending),
+                'running': dict(self.running), 'local': {agent: list(items) for agent, items in self.local.items()}}
+
+
+class _FleetServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _FleetHandler(http.server.BaseHTTPRequestHandler):
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        controller = self.server.controller
+        if self.path == '/status':
+            self._reply(200, controller.status())
+        elif self.path.startswith('/tool'):
+            path = controller.tool_path()
+            if path is None:
+                self._reply(404, {'error': 'no tool archive'})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as fp:
+                shutil.copyfileobj(fp, self.wfile)
+        else:
+            self._reply(404, {'error': 'unknown path {path}'.format(path=self.path)})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length).decode('utf-8')) if length > 0 else {}
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+            return
+        code, ret = self.server.controller.handle(self.path, body)
+        self._reply(code, ret)
+
+    def log_message(self, format, *args):
+        logging.debug('fleet: {addr} {msg}'.format(addr=self.address_string(), msg=format % args))
+
+
+class Controller(object):
+    """
+    分发测试的控制端: 依次展开各方案的测试用例, 通过HTTP/JSON分发给空闲的代理端, 代理端每完成一个
+    测试用例即上报结果, 控制端汇总到同一个结果目录及表格中.
+        POST /join       {agent, host}                    -> {session, name, scheme, total, tool, tool_digest} 或 {finished}/{refused}
+        POST /next       {agent, session}                 -> {index} / {wait} / {done}
+        POST /heartbeat  {agent, session}                 -> {}
+        POST /result     {agent, session, index, results, env, blobs}
+        POST /fail       {agent, session, index, error}
+        GET  /status                                      -> 分发状态
+        GET  /tool                                        -> 测试工具压缩包
+    搜索调优(schemeflag: search、refine)及逐轮筛选的下一个测试用例依赖已有的结果, 不能分发.
+    同一主机上的代理端共用/proc/sys等参数, 方案设置参数(scheme或testcase中有configs)时每台主机只接受一个代理端,
+    即在本机用多个代理端(--base_path区分)测试时, 方案中不能有configs.
+    """
+
+    def __init__(self, paths, listen = ('0.0.0.0', 8765), batch = 4, timeout = 600, retries = 1, linger = 30):
+        """
+        :param paths: 方案文件
+        :param listen: 监听的地址及端口
+        :param linger: 全部方案完成后继续应答的时间(秒), 使代理端得知测试已结束
+        """
+        self.config = KYConfig()
+        self.paths = paths
+        self.listen = listen
+        self.batch = batch
+        self.timeout = timeout
+        self.retries = retries
+        self.linger = linger
+        self.cond = threading.Condition()
+        self.session = None
+        self.finished = False
+        self.server = None
+
+    def _load(self, path):
+        with open(path, 'r') as f:
+            text = f.read()
+        scheme = SchemeParser().parse(text)
+        if scheme is None:
+            raise ValueError('empty scheme: {path}'.format(path=path))
+        if scheme.get_screening() is not None:
+            raise ValueError('{path}: screening can not run on a fleet'.format(path=path))
+        total = 0
+        tunes = len(scheme.get_configs()) > 0
+        for tcase in scheme.testcases:
+            if tcase.trial is not None:
+                raise ValueError('{path}: search testcases can not run on a fleet'.format(path=path))
+            tunes = tunes or len(tcase.configs) > 0
+            total += 1
+        return scheme, text, total, tunes
+
+    def _open_session(self, sid, path):
+        scheme, text, total, tunes = self._load(path)
+        test = TestFactory().create(scheme)
+        test.report = Report(scheme.get_base_path())
+        test.report.path_init()
+        digest = scheme.extract_cache.digest(scheme.tool_tgz) if scheme.extract_cache else None
+        return {'id': sid, 'name': os.path.basename(path), 'text': text, 'scheme': scheme, 'test': test,
+                'queue': WorkQueue(total, self.batch, self.timeout, self.retries), 'agents': {},
+                'tunes': tunes, 'hosts': {}, 'names': {},
+                'tool': scheme.tool_tgz if digest is not None else None, 'tool_digest': digest}
+
+    @staticmethod
+    def _same_host(session, agent, host):
+        """
+        方案设置参数时, 同一主机上的多个代理端会把彼此设置的取值记录为原始值, 测试也在彼此的设置下运行
+        :return: 拒绝加入的原因, 可以加入时返回None
+        """
+        hosts = session['hosts']
+        if host is not None:
+            hosts[agent] = host
+        if not session['tunes'] or host is None:
+            return None
+        queue = session['queue']
+        queue.expire()
+        for other, other_host in hosts.items():
+            if other != agent and other_host == host and other in queue.seen:
+                return '{name} sets configs and agent {other} already runs it on the same host'.format(
+                    name=session['name'], other=other)
+        return None
+
+    def tool_path(self):
+        with self.cond:
+            return self.session['tool'] if self.session is not None else None
+
+    def status(self) -> dict:
+        with self.cond:
+            if self.session is None:
+                return {'finished': self.finished}
+            return dict(self.session['queue'].status(), session=self.session['id'], name=self.session['name'])
+
+    def handle(self, path, body):
+        agent = body.get('agent')
+        if not agent:
+            return 400, {'error': 'missing agent'}
+        with self.cond:
+            session = self.session
+            if path == '/join':
+                if session is None:
+                    return 200, {'finished': True} if self.finished else {'wait': True}
+                refused = self._same_host(session, agent, body.get('host'))
+                if refused is not None:
+                    logging.error('fleet: refuse {agent}: {err}'.format(agent=agent, err=refused))
+                    return 200, {'refused': refused}
+                session['queue'].touch(agent)
+                return 200, {'session': session['id'], 'name': session['name'], 'scheme': session['text'],
+                             'total': session['queue'].total, 'tool': os.path.basename(session['tool'] or ''),
+                             'tool_digest': session['tool_digest']}
+            if session is None or body.get('session') != session['id']:
+                # 方案已完成, 代理端结束本轮并重新加入
+                return 200, {'done': True}
+            queue = session['queue']
+            if path == '/next':
+                kind, index = queue.next(agent)
+                if kind == 'index':
+                    logging.info('fleet: testcase {index} -> {agent}'.format(index=index, agent=agent))
+                    return 200, {'index': index}
+                return 200, {kind: True}
+            if path == '/heartbeat':
+                queue.touch(agent)
+                return 200, {}
+            if path == '/result':
+                index = body.get('index')
+                if queue.complete(agent, index):
+                    self._save_results(session, agent, body)
+                    logging.info('fleet: testcase {index} done by {agent}, {done}/{total}'.format(
+                        index=index, agent=agent, done=len(queue.done), total=queue.total))
+                self.cond.notify_all()
+                return 200, {}
+            if path == '/fail':
+                queue.fail(agent, body.get('index'), body.get('error'))
+                logging.error('fleet: testcase {index} failed on {agent}: {err}'.format(
+                    index=body.get('index'), agent=agent, err=body.get('error')))
+                self.cond.notify_all()
+                return 200, {}
+        return 404, {'error': 'unknown path {path}'.format(path=path)}
+
+    def _save_results(self, session, agent, body):
+        test = session['test']
+        env = body.get('env')
+        if env is not None and agent not in session['agents']:
+            session['agents'][agent] = True
+            # 环境信息中大段文本的blob随结果一起上传
+            for data in body.get('blobs', {}).values():
+                test.report.blobs.put(base64.b64decode(data))
+            path = os.path.join(test.report.current_result_dir, 'agents', '{agent}-getenv.json'.format(agent=agent))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fp:
+                json.dump(env, fp)
+            if test.report_data['env'] is None:
+                test.report_data['env'] = env
+        index = body.get('index')
+        for item in body.get('results', []):
+            item['tinf']['agent'] = agent
+            # 不同代理端上同名的测试用例(如未命名的testcase)结果文件名相同, 附加测试用例序号
+            tname = item['tinf']['testcase'].get('name')
+            first = session['names'].setdefault(tname, index)
+            if first != index and item['name'].startswith(tname + '-'):
+                item['name'] = '{tname}.{index}{rest}'.format(tname=tname, index=index, rest=item['name'][len(tname):])
+            test._export_result(item)
+
+    def _run_session(self, sid, path):
+        session = self._open_session(sid, path)
+        queue = session['queue']
+        logging.info('fleet: serve {name}, {total} testcases'.format(name=session['name'], total=queue.total))
+        with self.cond:
+            self.session = session
+            while not queue.finished():
+                self.cond.wait(5)
+                queue.expire()
+            self.session = None
+        test = session['test']
+        test.report.flush()
+        test.export(self.config.report_path)
+        if len(queue.failed) > 0:
+            logging.error('fleet: {name} failed testcases: {failed}'.format(name=session['name'], failed=queue.failed))
+        logging.info('fleet: {name} done, results in {rdir}'.format(name=session['name'], rdir=test.report.current_result_dir))
+
+    def serve(self):
+        self.server = _FleetServer(self.listen, _FleetHandler)
+        self.server.controller = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logging.info('fleet: controller listening on {host}:{port}'.format(host=self.listen[0], port=self.server.server_address[1]))
+        try:
+            for sid, path in enumerate(self.paths):
+                try:
+                    self._run_session(sid, path)
+                except Exception as e:
+                    logging.error('fleet: {path}: {err}'.format(path=path, err=e))
+            with self.cond:
+                self.finished = True
+            time.sleep(self.linger)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _LeasedTestCases(object):
+    """
+    代理端运行的测试用例序列, 保留测试用例在方案中的序号(TestCaseList会按本机的运行顺序重新编号)
+    """
+    def __init__(self, total, factory):
+        self.total = total
+        self.factory = factory
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return iter(self.factory())
+
+
+class Agent(object):
+    """
+    分发测试的代理端: 加入控制端当前的方案, 在本机展开相同的测试用例, 按控制端分配的序号逐个运行
+    (沿用BaseTest的参数切换、编译缓存、还原等流程), 每完成一个测试用例即上报结果.
+        Agent('http://192.168.1.10:8765').run()
+    测试工具压缩包不存在或与控制端不一致时从控制端下载.
+    """
+
+    def __init__(self, url, name = None, poll = 5, heartbeat = 60, retries = 12):
+        """
+        :param name: 代理端名称, 默认为主机名及进程号
+        :param poll: 没有可运行的测试用例时重试的间隔(秒)
+        :param heartbeat: 运行测试用例期间向控制端报告的间隔(秒)
+        :param retries: 连接控制端失败时的重试次数
+        """
+        self.config = KYConfig()
+        self.url = url.rstrip('/')
+        self.name = name or '{host}-{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+        self.poll = poll
+        self.heartbeat = heartbeat
+        self.retries = retries
+        self.current = None
+        self.host = self._host_id()
+
+    @staticmethod
+    def _host_id():
+        """
+        同一内核(共用/proc/sys)的代理端取值相同, 容器中的代理端与宿主机相同
+        """
+        try:
+            with open('/proc/sys/kernel/random/boot_id', 'r') as fp:
+                return fp.read().strip()
+        except OSError:
+            return socket.gethostname()
+
+    def _call(self, path, body = None):
+        data = json.dumps(dict(body or {}, agent=self.name)).encode('utf-8')
+        for tries in range(self.retries + 1):
+            try:
+                req = urllib.request.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    return json.loads(resp.read().decode('utf-8'))
+            except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+                if tries >= self.retries:
+                    raise
+                logging.warning('fleet: {url}{path} error: {err}, retry'.format(url=self.url, path=path, err=e))
+                time.sleep(self.poll)
+
+    def _fetch_tool(self, info, tool_tgz, digest):
+        if info.get('tool_digest') is None or digest == info['tool_digest']:
+            return
+        logging.info('fleet: download {tool} from {url}'.format(tool=info['tool'], url=self.url))
+        os.makedirs(os.path.dirname(tool_tgz), exist_ok=True)
+        tmp = tool_tgz + '.part'
+        with urllib.request.urlopen(self.url + '/tool', timeout=60) as resp, open(tmp, 'wb') as fp:
+            shutil.copyfileobj(resp, fp)
+        os.replace(tmp, tool_tgz)
+
+    def _testcases(self, test, info, testcases):
+        """
+        按控制端分配的序号逐个生成测试用例, 上一个测试用例完成后先上报其结果.
+        测试用例不预先展开: 领取的序号通常递增, 沿同一个迭代器前进; 序号小于当前位置(放回的测试用例)时重新遍历
+        """
+        offset = 0
+        stream = iter(testcases)
+        pos = 0
+        while True:
+            if self.current is not None:
+                datas = test.report_data['datas']
+                body = {'session': info['session'], 'index': self.current, 'results': datas[offset:]}
+                if offset == 0 and test.report_data['env'] is not None:
+                    body['env'] = test.report_data['env']
+                    store = test.report.blobs
+                    body['blobs'] = {ref: store.get_base64(ref) for ref in store.refs(json.loads(body['env']))
+                                     if store.exists(ref)}
+                self._call('/result', body)
+                offset = len(datas)
+                self.current = None
+            reply = self._call('/next', {'session': info['session']})
+            if 'index' in reply:
+                self.current = reply['index']
+                if self.current < pos:
+                    stream = iter(testcases)
+                    pos = 0
+                tcase = next(itertools.islice(stream, self.current - pos, None))
+                pos = self.current + 1
+                yield tcase
+            elif reply.get('wait'):
+                time.sleep(self.poll)
+            else:
+                return
+
+    def _beat(self, info, stop):
+        while not stop.wait(self.heartbeat):
+            try:
+                self._call('/heartbeat', {'session': info['session']})
+            except Exception as e:
+                logging.warning('fleet: heartbeat error: {err}'.format(err=e))
+
+    def _session(self, info):
+        path = os.path.join(self.config.base_path, 'fleet', info['name'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(info['scheme'])
+        scheme = SchemeParser().parse(info['scheme'])
+        self._fetch_tool(info, scheme.tool_tgz, scheme.extract_cache.digest(scheme.tool_tgz))
+        cwd = os.getcwd()
+        test = TestFactory().get(path)
+        testcases = test.scheme.testcases
+        test.scheme.testcases = _LeasedTestCases(info['total'], lambda: self._testcases(test, info, testcases))
+        stop = threading.Event()
+        beat = threading.Thread(target=self._beat, args=(info, stop))
+        beat.daemon = True
+        beat.start()
+        try:
+            test.prepare()
+            test.do_test()
+        except Exception as e:
+            logging.error(e)
+            if self.current is not None:
+                self._call('/fail', {'session': info['session'], 'index': self.current, 'error': str(e)})
+                self.current = None
+        finally:
+            stop.set()
+            os.chdir(cwd)
+
+    def run(self):
+        while True:
+            info = self._call('/join', {'host': self.host})
+            if info.get('finished'):
+                logging.info('fleet: all schemes finished')
+                return
+            if info.get('refused'):
+                logging.error('fleet: {err}'.format(err=info['refused']))
+                return
+            if 'session' not in info:
+                time.sleep(self.poll)
+                continue
+            logging.info('fleet: join {name} as {agent}'.format(name=info['name'], agent=self.name))
+            self._session(info)
+            time.sleep(1)
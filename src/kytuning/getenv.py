@@ -8,15 +8,59 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import json
+import time
+import fcntl
+import glob
+import hashlib
+import shlex
+import socket
+import struct
+import signal
+import platform
+import threading
 import subprocess
+import queue
 import base64
 import logging
-from .exec_cmd import ExecCmd
+from concurrent import futures
 
 
 _mode = None
 _curenv = dict(os.environ, LC_ALL="C")
+# 以下两项由EnvManager设置, 为模块级状态, 同一时间只能有一个EnvManager在采集
+# 单个命令的超时时间(秒), None表示不超时
+_timeout = None
+# 大段文本信息的压缩存储(BlobStore), None表示直接base64编码
+_blobstore = None
+
+
+def run_shell_cmd(command, merge_stderr = False):
+    """
+    执行shell命令, 超过_timeout时杀掉整个进程组(包括管道中的子进程)
+    :param merge_stderr: 将stderr合并到stdout
+    :return: (returncode, stdout, stderr), 超时返回None
+    """
+    sp = subprocess.Popen(command,
+                          shell = True,
+                          stdout = subprocess.PIPE,
+                          stderr = subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+                          env = _curenv,
+                          start_new_session = True)
+    try:
+        stdout, stderr = sp.communicate(timeout = _timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(sp.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        sp.communicate()
+        logging.warning("cmd: [{0}] timeout after {1}s".format(command, _timeout))
+        return None
+    return (sp.returncode,
+            stdout.decode('utf-8', 'replace') if stdout else '',
+            stderr.decode('utf-8', 'replace') if stderr else '')
 
 
 def exec_shell_cmd(command):
@@ -25,50 +69,262 @@ def exec_shell_cmd(command):
     json-compatible str.
 
     On success, return the stdout msg with '\\n' and space striped.
-    On fails, return null.
+    On fails or timeout, return null.
     """
-    ret = subprocess.run(command,
-                         shell = True,
-                         stdout = subprocess.PIPE,
-                         stderr = subprocess.PIPE,
-                         env = _curenv)
-    if not ret.returncode:
-        return ret.stdout.decode().strip("\n").strip()
+    ret = run_shell_cmd(command)
+    if ret is None:
+        return None
+    if not ret[0]:
+        return ret[1].strip("\n").strip()
     else:
         # commit: 18460c76776d23f5415ef5a98b3838ec15e21914
-        if ret.returncode == 1 :
+        if ret[0] == 1 :
             return None
 
         logging.error("cmd: [{0}]  msg: {1}".format(
-            ret.args, ret.stderr))
+            command, ret[2]))
         return None
 
 
+def call_probes(probes: dict) -> dict:
+    """
+    依次调用探测函数表, 返回同结构的结果
+    """
+    return {k: call_probes(v) if isinstance(v, dict) else v() for k, v in probes.items()}
+
+
+def read_file(path, default = None) -> str:
+    """
+    读取/proc、/sys等文件内容, 去掉首尾空白, 读取失败返回default
+    """
+    try:
+        with open(path, 'r') as fp:
+            return fp.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return default
+
+
+def parse_colon_lines(text) -> dict:
+    """
+    解析"key: value"形式的多行文本(lscpu、/proc/meminfo等), 同名key取第一个
+    """
+    result = {}
+    if not text:
+        return result
+    for line in text.splitlines():
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        key = key.strip()
+        if key not in result:
+            result[key] = value.strip()
+    return result
+
+
+def parse_dmidecode(text) -> dict:
+    """
+    解析dmidecode输出, 返回{标题: [{key: value}, ...]}, 如
+    {"BIOS Information": [{"Vendor": "xx", "Version": "xx"}], "Memory Device": [...]}
+    """
+    result = {}
+    title = None
+    block = None
+    for line in (text or '').splitlines():
+        if line.startswith('Handle '):
+            title = None
+            block = None
+            continue
+        if block is None:
+            if title is None and len(line.strip()) > 0 and not line.startswith('\t'):
+                title = line.strip()
+                block = {}
+                result.setdefault(title, []).append(block)
+            continue
+        # 二级缩进为列表项, 不需要
+        if line.startswith('\t\t') or ':' not in line:
+            continue
+        key, value = line.strip().split(':', 1)
+        block[key.strip()] = value.strip()
+    return result
+
+
+def uniq(values) -> list:
+    """
+    去掉相邻的重复项, 同shell中的uniq
+    """
+    ret = []
+    for value in values:
+        if len(ret) == 0 or ret[-1] != value:
+            ret.append(value)
+    return ret
+
+
 def base64_encode(s: str) -> str:
     """ 
     Encode the input str with base64.
     """
     if _mode == "debug":
         return "-----"
+    if s is None:
+        s = ""
 
     encoded = base64.b64encode(s.encode('utf-8'))
     return str(encoded, 'utf-8')
 
 
+def blob_encode(s: str) -> str:
+    """
+    大段文本信息: 配置了_blobstore时压缩存放并返回引用, 否则base64编码
+    """
+    if _mode == "debug" or _blobstore is None:
+        return base64_encode(s)
+    return _blobstore.put(s)
+
+
 class HardwareInfo:
     """
     硬件信息
+    lscpu、dmidecode、df只执行一次, 内存和网卡信息直接读取/proc、/sys
     """
     def __init__(self) -> None:
+        # 各数据源按需加载一次, 可被多个探测线程共享
+        self._cache = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, func):
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._cache:
+                self._cache[key] = func()
+        return self._cache[key]
+
+    @property
+    def lsblk(self):
+        def load():
+            try:
+            # -J: export json
+            # -o List: specify custom column
+                return json.loads(exec_shell_cmd(
+                "lsblk -d -J -o NAME,TYPE,VENDOR,MODEL,SIZE,ROTA,SCHED,RQ-SIZE,TRAN"))
+            except:
+                return ''
+        return self._cached('lsblk', load)
+
+    @property
+    def lshw(self):
+        # 与lshw -json相同结构的网卡信息树, 供get_hardwarelist_by_class使用
+        return self._cached('lshw', lambda: {"class": "system", "children": self._scan_nics()})
+
+    @property
+    def _lscpu(self) -> dict:
+        return self._cached('lscpu', lambda: parse_colon_lines(exec_shell_cmd('lscpu')))
+
+    @property
+    def _dmi(self) -> dict:
+        # 0:bios 1:system 4:processor 17:memory device
+        return self._cached('dmi', lambda: parse_dmidecode(exec_shell_cmd('dmidecode -t 0,1,4,17')))
+
+    @property
+    def _meminfo(self) -> dict:
+        def load():
+            info = {}
+            for key, value in parse_colon_lines(read_file('/proc/meminfo', '')).items():
+                try:
+                    info[key] = int(value.split()[0])
+                except (ValueError, IndexError):
+                    continue
+            return info
+        return self._cached('meminfo', load)
+
+    @property
+    def _df(self) -> list:
+        def load():
+            res = exec_shell_cmd('df -Th')
+            return [line.split() for line in res.splitlines()[1:]] if res else []
+        return self._cached('df', load)
+
+    def _dmi_value(self, title, key):
+        for block in self._dmi.get(title, []):
+            if key in block:
+                return block[key]
+        return None
+
+    def _dmi_values(self, title, key) -> list:
+        return [block[key] for block in self._dmi.get(title, []) if key in block]
+
+    def _lscpu_value(self, key) -> str:
+        if len(self._lscpu) == 0:
+            return "nil"
+        return self._lscpu.get(key, "")
+
+    def _scan_nics(self) -> list:
+        """
+        扫描/sys/class/net下的物理网卡, 生成lshw格式的network节点
+        """
+        nics = []
+        products = self._pci_products()
         try:
-            self.lshw = json.loads(exec_shell_cmd("lshw -json -quiet"))
-        # -J: export json
-        # -o List: specify custom column
-            self.lsblk = json.loads(exec_shell_cmd(
-            "lsblk -d -J -o NAME,TYPE,VENDOR,MODEL,SIZE,ROTA,SCHED,RQ-SIZE,TRAN"))
-        except:
-            self.lshw = ''
-            self.lsblk = ''
+            names = sorted(os.listdir('/sys/class/net'))
+        except OSError:
+            return nics
+        for name in names:
+            path = '/sys/class/net/' + name
+            if not os.path.exists(path + '/device'):
+                continue
+            nic = {"class": "network", "logicalname": name,
+                   "serial": read_file(path + '/address'), "configuration": {}}
+            product = self._nic_product(path, products)
+            if product:
+                nic["product"] = product
+            speed = read_file(path + '/speed')
+            if speed and speed.lstrip('-').isdigit() and int(speed) > 0:
+                speed = int(speed)
+                nic["configuration"]["speed"] = ("%dGbit/s" % (speed // 1000)) if speed % 1000 == 0 else ("%dMbit/s" % speed)
+            ip = self._nic_ip(name)
+            if ip:
+                nic["configuration"]["ip"] = ip
+            nics.append(nic)
+        return nics
+
+    def _pci_products(self) -> dict:
+        products = {}
+        res = exec_shell_cmd('lspci -mmD')
+        for line in (res or '').splitlines():
+            try:
+                fields = shlex.split(line)
+            except ValueError:
+                continue
+            if len(fields) >= 4:
+                products[fields[0]] = fields[3]
+        return products
+
+    def _nic_product(self, path, products):
+        # virtio等网卡的device指向子设备, 向上查找所属的PCI设备
+        dev = os.path.realpath(path + '/device')
+        while dev and dev != '/':
+            slot = os.path.basename(dev)
+            if re.match(r'^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$', slot):
+                if slot in products:
+                    return products[slot]
+                vendor = read_file(dev + '/vendor')
+                device = read_file(dev + '/device')
+                return "%s:%s" % (vendor, device) if vendor and device else None
+            dev = os.path.dirname(dev)
+        return None
+
+    def _nic_ip(self, name):
+        # SIOCGIFADDR
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            ifreq = fcntl.ioctl(sock.fileno(), 0x8915, struct.pack('256s', name[:15].encode('utf-8')))
+            return socket.inet_ntoa(ifreq[20:24])
+        except OSError:
+            return None
+        finally:
+            sock.close()
+
     def _dfs(self, root, hwclass, ret):
         if "class" not in root:
             return
@@ -89,16 +345,13 @@ class HardwareInfo:
 
 
     def get_manufacturer(self) -> str:
-        res = exec_shell_cmd("dmidecode -t system | grep 'Manufacturer'")
-        return res.split(':')[1].strip()
+        return self._dmi_value("System Information", "Manufacturer")
 
     def get_product(self) -> str:
-        res = exec_shell_cmd("dmidecode -t system | grep 'Product Name'")
-        return res.split(':')[1].strip()
+        return self._dmi_value("System Information", "Product Name")
 
     def get_serialnum(self) -> str:
-        res = exec_shell_cmd("dmidecode -t system | grep 'Serial Number'")
-        return res.split(':')[1].strip()
+        return self._dmi_value("System Information", "Serial Number")
 
     # 整机信息
     def get_machineinfo(self) -> dict:
@@ -112,8 +365,8 @@ class HardwareInfo:
 
     def get_bios(self) -> str:
         val = {
-            "vendor":  exec_shell_cmd("dmidecode -s bios-vendor"),
-            "version": exec_shell_cmd("dmidecode -s bios-version")
+            "vendor":  self._dmi_value("BIOS Information", "Vendor"),
+            "version": self._dmi_value("BIOS Information", "Version")
         }
         return val
 
@@ -131,44 +384,57 @@ class HardwareInfo:
         }
         return result
 
+    def _join(self, values):
+        return "\n".join(values) if len(values) > 0 else None
 
     #获取内存品牌
     def _get_mem_manufacture(self) -> str:
-        return exec_shell_cmd("dmidecode -t memory | grep 'Manufacturer:'|grep -v 'Not'|awk -F: '{print $2}'")
+        return self._join([v for v in self._dmi_values("Memory Device", "Manufacturer") if 'Not' not in v])
 
     #获取内存类型
     def _get_mem_type(self) -> str:
-        return exec_shell_cmd("dmidecode -t memory | grep -v 'Unknown' | grep 'Type:' | sed 's/^[\t]*//' | grep -e '^Type:*' | awk -F: '{print $2}' | uniq")
+        return self._join(uniq([v for v in self._dmi_values("Memory Device", "Type") if v != 'Unknown']))
+
+    def _mebibytes(self, kbytes) -> str:
+        return "%d mebibytes" % (kbytes // 1024)
 
     #获取内存总容量
     def _get_mem_total(self) -> str:
-        return exec_shell_cmd("free -m | grep 'Mem:' | awk '{print $2}'") + " mebibytes"
+        return self._mebibytes(self._meminfo.get('MemTotal', 0))
 
-    # 获取已使用的内存
+    # 获取已使用的内存, 与free的used计算方式一致
     def _get_mem_used(self) ->str:
-        return exec_shell_cmd("free -m | grep Mem: | awk '{print $3}'") + " mebibytes"
+        m = self._meminfo
+        used = m.get('MemTotal', 0) - m.get('MemFree', 0) - m.get('Buffers', 0) - m.get('Cached', 0) - m.get('SReclaimable', 0)
+        return self._mebibytes(max(used, 0))
 
 
     # 获取空闲的内存
     def _get_mem_free(self) ->str:
-        return exec_shell_cmd("free -m | grep Mem: | awk '{print $4}'") + " mebibytes"
+        return self._mebibytes(self._meminfo.get('MemFree', 0))
 
     #获取内存数量
     def _get_mem_count(self) -> str:
-        return exec_shell_cmd('dmidecode -t memory | grep Size: |grep MB | awk -F: "{print $2}" | wc -l')
+        sizes = self._dmi_values("Memory Device", "Size")
+        return str(len([v for v in sizes if v.endswith('MB') or v.endswith('GB')]))
 
     #获取内存频率
     def _get_mem_freq(self) -> str:
-        return exec_shell_cmd("dmidecode -t memory |grep 'Configured .* Speed:'|awk -F: '{print $2}' | uniq")
+        freqs = []
+        for block in self._dmi.get("Memory Device", []):
+            for key in ("Configured Memory Speed", "Configured Clock Speed"):
+                if key in block:
+                    freqs.append(block[key])
+                    break
+        return self._join(uniq(freqs))
 
     #获取swap分区大小信息
     def _get_mem_swap(self) -> str:
-        return exec_shell_cmd("free -m | grep 'Swap:' | awk '{print $2}'") + " mebibytes"
+        return self._mebibytes(self._meminfo.get('SwapTotal', 0))
 
 
     def get_numa_info(self) -> str:
-        return exec_shell_cmd(
-            "lscpu | grep NUMA | grep -v - | awk -F: '{print $2}'")
+        return self._lscpu_value("NUMA node(s)")
 
     # centos8 上的lsblk版本较低不支持获取分区表类型
     def get_parttable_type(self, dev) -> str:
@@ -179,13 +445,11 @@ class HardwareInfo:
         return res[1].strip()
 
     def get_fs_type(self, dev) -> str:
-        res = exec_shell_cmd("df -Th | grep -E '%s$'" % dev)
-        if res == None:
-            return None
-
-        res = res.split()
-        result = ("%-6s %-6s %-6s %-6s %-6s") % (res[6], res[1], res[2], res[5], res[0])
-        return result
+        for res in self._df:
+            if len(res) >= 7 and res[6] == dev:
+                result = ("%-6s %-6s %-6s %-6s %-6s") % (res[6], res[1], res[2], res[5], res[0])
+                return result
+        return None
 
 
     def get_disk(self) -> dict:
@@ -254,7 +518,7 @@ class HardwareInfo:
                'CPU MHz':       self._get_cpu_freq(),
                'CPU(s)':        self._get_cpu_phycount(),
                'Thread(s) per core':  self._get_cpu_cores_per(),
-               'CPU Arch':      exec_shell_cmd('uname -p'),
+               'CPU Arch':      os.uname().machine,
                'CPU op-mode':   self._get_cpu_op_mode(),
                'Byte Order':    self._get_cpu_byte_order(),
                'On-line CPU(s) list': self._get_cpu_online_cpulist(),
@@ -270,84 +534,73 @@ class HardwareInfo:
 
 
     def _get_cpu_vendor(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^Vendor ID" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("Vendor ID")
 
     def _get_cpu_family(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^CPU family" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("CPU family")
 
     #获取cpu型号
     def _get_cpu_type(self) -> str:
-        return exec_shell_cmd("dmidecode -s processor-version | head -n 1")
+        return self._dmi_value("Processor Information", "Version")
 
 
     #获取cpu主频
     def _get_cpu_freq(self) -> str:
-        return  exec_shell_cmd("cat /proc/cpuinfo |grep MHz|uniq | cut -d : -f 2");
+        freqs = [v for k, v in (line.split(':', 1) for line in read_file('/proc/cpuinfo', '').splitlines() if ':' in line)
+                 if 'MHz' in k]
+        return "\n".join(uniq([v.strip() for v in freqs]))
 
     #获取物理cpu个数
     def _get_cpu_phycount(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^CPU(s)" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("CPU(s)")
 
     #获取逻辑cpu个数
     def _get_cpu_cores_per(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "Thread(s) per core" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("Thread(s) per core")
 
     def _get_cpu_op_mode(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "CPU op-mode" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("CPU op-mode(s)")
 
     def _get_cpu_byte_order(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "Byte Order" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("Byte Order")
 
     def _get_cpu_online_cpulist(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "On-line CPU(s) list" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("On-line CPU(s) list")
 
     def _get_cpu_virtual(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^Virtualization:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("Virtualization")
 
     def _get_cpu_virtual_type(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^Virtualization type:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("Virtualization type")
 
     def _get_cpu_l1dcache(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^L1d cache:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("L1d cache")
 
     def _get_cpu_l1icache(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^L1i cache:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("L1i cache")
 
     def _get_cpu_l2cache(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^L2 cache:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("L2 cache")
 
     def _get_cpu_l3cache(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^L3 cache:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
+        return self._lscpu_value("L3 cache")
 
     def _get_cpu_flags(self) -> str:
-        result = ExecCmd(command = 'lscpu  | grep "^Flags:" | awk -F: \'{print $2}\'', env = _curenv, shell=True).run()
-        return result.stdout.lstrip() if result.exit_status == 0 else "nil"
-
-    def get_hardware_info(self) -> dict:
-        val = {
-            "machineinfo":   self.get_machineinfo(),
-            "bios":          self.get_bios(),
-            "cpu":           self.get_cpu(),
-            "memory":        self.get_memory(),
-            #"numainfo":      self.get_numa_info(),
-            "disk":          self.get_disk(),
-            "nicinfo":       self.get_nic_info(),
+        return self._lscpu_value("Flags")
+
+    def probes(self) -> dict:
+        return {
+            "machineinfo":   self.get_machineinfo,
+            "bios":          self.get_bios,
+            "cpu":           self.get_cpu,
+            "memory":        self.get_memory,
+            #"numainfo":      self.get_numa_info,
+            "disk":          self.get_disk,
+            "nicinfo":       self.get_nic_info,
         }
 
-        return val
+    def get_hardware_info(self) -> dict:
+        return call_probes(self.probes())
 
 
 class SoftwareInfo:
@@ -355,207 +608,463 @@ class SoftwareInfo:
     软件信息
     """
     def _get_curr_utctime(self) -> str:
-        result = ExecCmd(command = "date --utc", env = _curenv).run()
-        return result.stdout if result.exit_status == 0 else result.stderr
+        return time.strftime("%a %b %e %H:%M:%S UTC %Y", time.gmtime())
+
+    def _get_os_release(self) -> dict:
+        release = {}
+        for line in read_file('/etc/os-release', '').splitlines():
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            release[key.strip()] = value.strip().strip('"').strip("'")
+        return release
 
     def _get_os_id(self) -> str:
-        res = exec_shell_cmd('sed -n -e "/^ID=/p" /etc/os-release')
-        result = res.replace('=', ' ').split()
-        return result[1][1:-1]
+        return self._get_os_release().get('ID')
 
     def _get_os_version(self) -> str:
         if self._get_os_id() == "kylin":
-            release_file = '/etc/.productinfo'
-            cmd = "sed -n -e '2p' %s" % release_file
-            result = exec_shell_cmd(cmd)
+            lines = read_file('/etc/.productinfo', '').splitlines()
+            result = lines[1].strip() if len(lines) > 1 else None
         else:
-            release_file = '/etc/os-release'
-            cmd = "sed -n -e '/^VERSION=/p' %s" % release_file
-            res = exec_shell_cmd(cmd)
-            result = res.split('VERSION="')[1][:-1]
+            result = self._get_os_release().get('VERSION')
         return result
 
     def _get_os_info(self) -> dict:
         val = {
             'curr UTC time':   self._get_curr_utctime(),
             "os_id":       self._get_os_id(),
-            "os_arch":     exec_shell_cmd('uname -i'),
+            "os_arch":     os.uname().machine,
             "osversion":   self._get_os_version(),
-            "kernel":      exec_shell_cmd('cat /proc/version'),
-            "grub":        exec_shell_cmd('cat /proc/cmdline'),
+            "kernel":      read_file('/proc/version'),
+            "grub":        read_file('/proc/cmdline'),
         }
         return val
 
     def _get_sw_list(self) -> str:
         res = exec_shell_cmd('rpm -qa')
-        return base64_encode(res)
+        return blob_encode(res)
 
     def _get_ipc_list(self) -> str:
-        result = ExecCmd(command = "lsipc", env = _curenv).run()
-        output = result.stdout if result.exit_status == 0 else result.stderr
-        return base64_encode(output)
+        result = run_shell_cmd("lsipc", merge_stderr = True)
+        return blob_encode(result[1] if result else None)
 
     def _get_conf_all(self) -> str:
         res = exec_shell_cmd('getconf -a')
-        return base64_encode(res)
+        return blob_encode(res)
 
     def _get_sysctl_all(self) -> str:
         res = exec_shell_cmd("sysctl -a")
-        return base64_encode(res)
+        return blob_encode(res)
 
     def _get_systemctl_info(self) -> str:
         res = exec_shell_cmd("systemctl list-unit-files  | tail -n +2")
-        return base64_encode(res)
+        return blob_encode(res)
 
     def _get_driverinfo(self) -> str:
-        res = exec_shell_cmd("cat /proc/modules | awk '{print $1}'")
-        return base64_encode(res)
+        res = "\n".join(line.split()[0] for line in read_file('/proc/modules', '').splitlines() if line.strip())
+        return blob_encode(res)
 
     def _get_gcc_ver(self) -> str:
-        result = ExecCmd(command = "gcc --version | sed -n '1p' ", env = _curenv, shell=True).run()
-        return result.stdout if result.exit_status == 0 else result.stderr
+        result = run_shell_cmd("gcc --version | sed -n '1p' ")
+        if result is None:
+            return None
+        return result[1] if result[0] == 0 else result[2]
 
     def _get_glibc_ver(self) -> str:
-        flag = exec_shell_cmd("rpm -qa | grep glibc")
-        if flag == "":
-            return flag
-        else:
-            str = exec_shell_cmd('rpm -qi glibc')
-            glibc_version = str.split()
-            return glibc_version[5]
+        try:
+            # "glibc 2.28"
+            return os.confstr('CS_GNU_LIBC_VERSION').split()[1]
+        except (ValueError, OSError, AttributeError, IndexError):
+            return ""
 
     def _get_java_ver(self) -> str:
-        result = ExecCmd(command = 'java -version', env = _curenv, shell=True).run()
-        return result.stdout if result.exit_status == 0 else "nil"
+        result = run_shell_cmd('java -version', merge_stderr = True)
+        return result[1] if result and result[0] == 0 else "nil"
 
 
     def _get_goo_ver(self) -> str:
-        result = ExecCmd(command = 'g++ --version | sed -n "1p" ', env = _curenv, shell=True).run()
-        return result.stdout if result.exit_status == 0 else result.stderr
+        result = run_shell_cmd('g++ --version | sed -n "1p" ')
+        if result is None:
+            return None
+        return result[1] if result[0] == 0 else result[2]
 
     def _get_gfortran_ver(self) -> str:
-        result = ExecCmd(command = 'gfortran --version | sed -n "1p"', env = _curenv, shell=True).run()
-        return result.stdout if result.exit_status == 0 else "nil"
+        result = run_shell_cmd('gfortran --version | sed -n "1p"')
+        return result[1] if result and result[0] == 0 else "nil"
 
 
     def _get_python_ver(self) -> str:
-        flag = exec_shell_cmd("rpm -qa | grep python")
-        if flag == "":
-            return flag
-        else:
-            return exec_shell_cmd('python3 --version')
+        return "Python " + platform.python_version()
 
-    #获取selinux状态
+    #获取selinux状态, 与getenforce输出一致
     def _get_selinux_status(self) -> str:
-        return exec_shell_cmd('getenforce')
+        enforce = read_file('/sys/fs/selinux/enforce')
+        if enforce is None:
+            return "Disabled"
+        return "Enforcing" if enforce == "1" else "Permissive"
 
     #获取电源管理状态
     def _get_power_status(self) -> str:
-        return exec_shell_cmd('cat /sys/power/state')
+        return read_file('/sys/power/state')
 
     #获取cpu调度策略
     def _get_cpu_sched(self) -> str:
-        str = exec_shell_cmd('chrt -p 1|grep -i sched')
-        cpu_sched = str.split()
-        return cpu_sched[5]
+        names = {}
+        for name in ("SCHED_OTHER", "SCHED_FIFO", "SCHED_RR", "SCHED_BATCH", "SCHED_IDLE"):
+            if hasattr(os, name):
+                names[getattr(os, name)] = name
+        try:
+            return names.get(os.sched_getscheduler(1))
+        except OSError:
+            return None
+
 
+    def _sw_ver_probes(self) -> dict:
+        return {
+            "gccversion":       self._get_gcc_ver,
+            "glibcversion":     self._get_glibc_ver,
+            "javaversion":      self._get_java_ver,
+            "g++version":       self._get_goo_ver,
+            "gfortranversion":  self._get_gfortran_ver,
+            "pythonversion":    self._get_python_ver,
+        }
 
     # 重要软件版本信息
     def _get_sw_ver_info(self) -> dict:
-        result = {
-            "gccversion":       self._get_gcc_ver(),
-            "glibcversion":     self._get_glibc_ver(),
-            "javaversion":      self._get_java_ver(),
-            "g++version":       self._get_goo_ver(),
-            "gfortranversion":  self._get_gfortran_ver(),
-            "pythonversion":    self._get_python_ver(),
-        }
-        return result
+        return call_probes(self._sw_ver_probes())
     def _get_loadavg(self) -> str:
-        result = ExecCmd(command = 'cat /proc/loadavg', env = _curenv).run()
-        return result.stdout if result.exit_status == 0 else result.stderr
+        return read_file('/proc/loadavg')
 
     def _get_uptime(self) -> str:
-        result = ExecCmd(command = "uptime  | awk  '{print $3 $4 $5}'", env = _curenv, shell=True).run()
-        return result.stdout if result.exit_status == 0 else result.stderr
-
+        result = run_shell_cmd("uptime  | awk  '{print $3 $4 $5}'")
+        if result is None:
+            return None
+        return result[1] if result[0] == 0 else result[2]
+
+
+    def _runtime_probes(self) -> dict:
+        return {
+            "sysconf":         self._get_conf_all,
+            "sysctl":          self._get_sysctl_all,
+            "systemctlinfo":   self._get_systemctl_info,
+            "driverinfo":      self._get_driverinfo,
+            "rpmlist":         self._get_sw_list,
+            "ipclist":         self._get_ipc_list,
+            "selinux_status":  self._get_selinux_status,
+            "power_status":    self._get_power_status,
+            "cpu_sched":       self._get_cpu_sched,
+            'loadavg':         self._get_loadavg,
+            'uptime':          self._get_uptime
+        }
 
     def _get_runtime_env(self) -> dict:
-        val = {
-            "sysconf":         self._get_conf_all(),
-            "sysctl":          self._get_sysctl_all(),
-            "systemctlinfo":   self._get_systemctl_info(),
-            "driverinfo":      self._get_driverinfo(),
-            "rpmlist":         self._get_sw_list(),
-            "ipclist":         self._get_ipc_list(),
-            "selinux_status":  self._get_selinux_status(),
-            "power_status":    self._get_power_status(),
-            "cpu_sched":       self._get_cpu_sched(),
-            'loadavg':         self._get_loadavg(),
-            'uptime':          self._get_uptime()
+        return call_probes(self._runtime_probes())
+
+    def probes(self) -> dict:
+        return {
+            'os':              self._get_os_info,
+            'runtime':         self._runtime_probes(),
+            'software_ver':    self._sw_ver_probes(),
         }
-        return val
 
     def get_software_info(self) -> dict:
-        val = {
-            'os':              self._get_os_info(),
-            'runtime':         self._get_runtime_env(),
-            'software_ver':    self._get_sw_ver_info(),
-        }
-        return val
+        return call_probes(self.probes())
 
 
 class NetworkInfo:
     def __init__(self, hw: HardwareInfo) -> None:
         self.hw = hw
 
+    def _get_gateways(self) -> dict:
+        """
+        从/proc/net/route读取各网卡的默认网关
+        """
+        gateways = {}
+        for line in read_file('/proc/net/route', '').splitlines()[1:]:
+            fields = line.split()
+            if len(fields) < 3 or fields[1] != '00000000':
+                continue
+            try:
+                gateways.setdefault(fields[0], socket.inet_ntoa(struct.pack('<L', int(fields[2], 16))))
+            except ValueError:
+                continue
+        return gateways
+
     def get_network_info(self) -> dict:
         ret = []
         networklist = self.hw.get_hardwarelist_by_class("network")
+        gateways = self._get_gateways()
 
         for network in networklist:
             if self.hw.is_valid_nic(network):
                 nicname = network["logicalname"]
-                fields = {
-                    "IP4.GATEWAY": "gateway",
-                    "GENERAL.MTU": "mtu",
-                }
-                nmcli_info = {}
-                for key in fields.keys():
-                    nmcli_info[fields[key]] = exec_shell_cmd(
-                        "nmcli -g {0} device show {1}".format(key, nicname))
-
                 val = {
                     "nicname": network["logicalname"],
                     "ip":      network["configuration"]["ip"],
                     "hwaddr":  network["serial"],
-                    "gateway": nmcli_info["gateway"],
-                    "mtu":     nmcli_info["mtu"],
+                    "gateway": gateways.get(nicname, ""),
+                    "mtu":     read_file('/sys/class/net/%s/mtu' % nicname),
                 }
                 ret.append(val)
 
         return ret if ret else  {"nic":[]}
 
+    def probes(self) -> dict:
+        return {
+            'nic': self.get_network_info
+        }
+
     def get_network(self) ->dict:
-        val = {
-            'nic': self.get_network_info()
+        return call_probes(self.probes())
+
+
+# 计算主机指纹时忽略的sysctl项, 这些值随系统运行不断变化
+_volatile_sysctl = (
+    'fs.aio-nr', 'fs.dentry-state', 'fs.file-nr', 'fs.inode-nr', 'fs.inode-state',
+    'fs.quota.', 'kernel.ns_last_pid', 'kernel.perf_event_max_sample_rate',
+    'kernel.pty.nr', 'kernel.random.', 'net.netfilter.nf_conntrack_count',
+)
+
+# 软件包数据库, 安装/卸载软件包时会被修改
+_pkgdb_paths = ('/var/lib/rpm/*', '/usr/lib/sysimage/rpm/*', '/var/lib/dpkg/status')
+
+
+def _pkgdb_mtime() -> int:
+    mtime = 0
+    for pattern in _pkgdb_paths:
+        for path in glob.glob(pattern):
+            try:
+                mtime = max(mtime, os.stat(path).st_mtime_ns)
+            except OSError:
+                pass
+    return mtime
+
+
+def _sysctl_digest() -> str:
+    lines = [line for line in (exec_shell_cmd('sysctl -a') or '').splitlines()
+             if not line.startswith(_volatile_sysctl)]
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def host_fingerprint(with_boot = True) -> dict:
+    """
+    主机指纹, 用于判断环境信息是否可以复用
+    :param with_boot: 是否包含boot_id, 为True时重启后指纹改变
+    :return: {'digest': 指纹, 'parts': 组成指纹的各项}
+    """
+    parts = {
+        'hostname': os.uname().nodename,
+        'kernel':   read_file('/proc/version'),
+        'cmdline':  read_file('/proc/cmdline'),
+        'pkgdb':    _pkgdb_mtime(),
+        'sysctl':   _sysctl_digest(),
+    }
+    if with_boot:
+        parts['boot_id'] = read_file('/proc/sys/kernel/random/boot_id')
+    digest = hashlib.sha256(json.dumps(parts, sort_keys = True).encode('utf-8')).hexdigest()
+    return {'digest': digest, 'parts': parts}
+
+
+class EnvCache(object):
+    """
+    环境信息快照缓存, 主机指纹一致且未超过ttl时复用上次采集的环境信息
+    """
+    def __init__(self, path, ttl = 86400):
+        """
+        :param path: 缓存文件路径
+        :param ttl: 缓存有效期(秒), 0表示不复用缓存, 但仍写入缓存文件以记录各探测项耗时
+        """
+        self.path = path
+        self.ttl = ttl or 0
+
+    def load(self, fingerprint: dict):
+        if self.ttl <= 0 or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding = 'utf-8') as fp:
+                cache = json.load(fp)
+        except (OSError, ValueError):
+            logging.warning('env cache {path} is broken, ignore it.'.format(path = self.path))
+            return None
+        if cache.get('fingerprint') != fingerprint['digest']:
+            logging.info('host fingerprint changed, env cache is stale.')
+            return None
+        if time.time() - cache.get('time', 0) > self.ttl:
+            logging.info('env cache expired.')
+            return None
+        return cache.get('envinfo')
+
+    def save(self, fingerprint: dict, env_info: dict, durations = None):
+        """
+        :param durations: 各探测项耗时(秒), 键为"hwinfo.cpu"形式的路径, 超时或失败的为None
+        """
+        cache = {
+            'fingerprint':     fingerprint['digest'],
+            'parts':           fingerprint['parts'],
+            'time':            time.time(),
+            'envinfo':         env_info,
+            'probe_durations': durations or {},
         }
-        return val
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding = 'utf-8') as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            logging.warning('save env cache failed: {err}'.format(err = e))
 
 
 class EnvManager(object):
-    def __init__(self, ctrl = None):
+    """
+    并发采集环境信息. timeout及blobs设置到模块级的_timeout、_blobstore(exec_shell_cmd等
+    探测函数共用), 因此同一时间只能有一个EnvManager, 后创建的会覆盖先前的设置
+    """
+    def __init__(self, ctrl = None, timeout = None, workers = 8, cache = None, blobs = None):
+        """
+        :param timeout: 单个探测项的超时时间(秒), 超时的探测项结果为null
+        :param workers: 并发执行探测项的线程数
+        :param cache: EnvCache, 为None时每次都完整采集
+        :param blobs: BlobStore, rpmlist/sysctl等大段信息压缩存放, 结果中只保留引用
+        """
+        global _timeout, _blobstore
+        _timeout = timeout
+        _blobstore = blobs
         self.ctrl = None
+        self.timeout = timeout
+        self.workers = workers if workers and workers > 0 else 1
+        # 各探测项耗时, 键为"hwinfo.cpu"形式的路径, 超时的记为None
+        self.durations = {}
         self.hwinfo = HardwareInfo()
         self.swinfo = SoftwareInfo()
         self.nwinfo = NetworkInfo(self.hwinfo)
+        self.cache = cache
 
-    def get_env_info(self):
-        env_info = {
-            'hwinfo': self.hwinfo.get_hardware_info(),
-            'swinfo': self.swinfo.get_software_info(),
-            'nwinfo': self.nwinfo.get_network(),
+    def probes(self) -> dict:
+        return {
+            'hwinfo': self.hwinfo.probes(),
+            'swinfo': self.swinfo.probes(),
+            'nwinfo': self.nwinfo.probes(),
         }
+
+    def volatile_probes(self) -> dict:
+        """
+        复用缓存时需要重新采集的易变项
+        """
+        return {
+            'hwinfo': {
+                'memory': {
+                    'mem_used': self.hwinfo._get_mem_used,
+                    'mem_free': self.hwinfo._get_mem_free,
+                },
+            },
+            'swinfo': {
+                'os':      {'curr UTC time': self.swinfo._get_curr_utctime},
+                'runtime': {
+                    'loadavg': self.swinfo._get_loadavg,
+                    'uptime':  self.swinfo._get_uptime,
+                },
+            },
+        }
+
+    def _merge(self, dst, src):
+        for k, v in src.items():
+            if isinstance(v, dict) and isinstance(dst.get(k), dict):
+                self._merge(dst[k], v)
+            else:
+                dst[k] = v
+        return dst
+
+    def _flatten(self, probes, prefix, ret):
+        for k, v in probes.items():
+            if isinstance(v, dict):
+                self._flatten(v, prefix + (k,), ret)
+            else:
+                ret.append((prefix + (k,), v))
+        return ret
+
+    def _timed(self, func, started):
+        started.append(time.time())
+        func_ret = func()
+        return (func_ret, time.time() - started[0])
+
+    def _worker(self, tasks):
+        while True:
+            try:
+                fut, func, started = tasks.get_nowait()
+            except queue.Empty:
+                return
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(self._timed(func, started))
+            except Exception as e:
+                fut.set_exception(e)
+
+    def run_probes(self, probes: dict) -> dict:
+        """
+        在守护线程中并发执行探测项, 每个探测项从开始执行起计时,
+        超过timeout未完成的结果记为None, 不再等待; 不使用ThreadPoolExecutor,
+        其工作线程在解释器退出时会被join, 卡住的探测项会阻塞kytuning退出
+        """
+        items = self._flatten(probes, (), [])
+        tasks = queue.Queue()
+        pending = {}
+        for path, func in items:
+            started = []
+            fut = futures.Future()
+            tasks.put((fut, func, started))
+            pending[fut] = (path, started)
+        for _ in range(min(self.workers, len(items))):
+            worker = threading.Thread(target = self._worker, args = (tasks,))
+            worker.daemon = True
+            worker.start()
+
+        results = {}
+        while len(pending) > 0:
+            done, _ = futures.wait(list(pending.keys()), timeout = 0.1, return_when = futures.FIRST_COMPLETED)
+            for fut in done:
+                path, _ = pending.pop(fut)
+                name = '.'.join(path)
+                try:
+                    results[path], self.durations[name] = fut.result()
+                    logging.debug("env probe {name} done in {sec:.3f}s".format(name=name, sec=self.durations[name]))
+                except Exception as e:
+                    results[path], self.durations[name] = None, None
+                    logging.warning("env probe {name} failed: {err}".format(name=name, err=e))
+            if self.timeout is None:
+                continue
+            now = time.time()
+            for fut, (path, started) in list(pending.items()):
+                if len(started) > 0 and now - started[0] > self.timeout:
+                    pending.pop(fut)
+                    name = '.'.join(path)
+                    results[path], self.durations[name] = None, None
+                    logging.warning("env probe {name} timeout after {sec}s".format(name=name, sec=self.timeout))
+
+        env_info = {}
+        for path, _ in items:
+            node = env_info
+            for k in path[:-1]:
+                node = node.setdefault(k, {})
+            node[path[-1]] = results.get(path)
+        return env_info
+
+    def get_env_info(self):
+        if self.cache is None:
+            return self.run_probes(self.probes())
+
+        fingerprint = host_fingerprint()
+        env_info = self.cache.load(fingerprint)
+        if env_info is not None and _blobstore is not None and len(_blobstore.missing(env_info)) > 0:
+            logging.info('env cache refers to missing blobs, collect again.')
+            env_info = None
+        if env_info is not None:
+            logging.info('reuse env cache {path}'.format(path = self.cache.path))
+            return self._merge(env_info, self.run_probes(self.volatile_probes()))
+
+        env_info = self.run_probes(self.probes())
+        self.cache.save(fingerprint, env_info, self.durations)
         return env_info
 
     # 将环境信息导出为字典
@@ -0,0 +1,71 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+
+__all__ = ['JsonlJournal']
+
+
+class JsonlJournal(object):
+    """
+    追加写的JSON Lines日志, 每条记录占一行.
+        journal = JsonlJournal('/root/kytuning/all_json_file.jsonl', fsync_batch = 16)
+        journal.append({'name': 'xx', 'data': {}})
+        journal.close()
+    每写入fsync_batch条记录fsync一次, close()/sync()时将剩余记录落盘.
+    """
+
+    def __init__(self, path, fsync_batch = 1):
+        self.path = path
+        self.fsync_batch = fsync_batch if fsync_batch and fsync_batch > 0 else 1
+        self.fp = None
+        self.pending = 0
+
+    def append(self, record: dict):
+        if self.fp is None:
+            self.fp = open(self.path, 'a', encoding='utf-8')
+        self.fp.write(json.dumps(record) + '\n')
+        self.pending += 1
+        if self.pending >= self.fsync_batch:
+            self.sync()
+
+    def sync(self):
+        if self.fp is None or self.pending == 0:
+            return
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self.fp is None:
+            return
+        self.sync()
+        self.fp.close()
+        self.fp = None
+
+    @staticmethod
+    def load(path) -> list:
+        """
+        读取全部记录, 跳过异常中断时写了一半的行
+        """
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, 'r', encoding='utf-8') as fp:
+            for line in fp:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logging.warning('skip broken journal line in {path}'.format(path=path))
+        return records
@@ -1,3 +1,4 @@
+import os
 import logging
 import json
 import datetime
@@ -7,6 +8,7 @@ from copy import copy
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter ,column_index_from_string
 from exportexcel import BenchMark
+from blobstore import BlobStore
 from logger   import log_init
 
 current_date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
@@ -34,6 +36,7 @@ class ExporttoExcel():
         self.if_need_xlsx = False
         self.tool_name = []  #unixbench需要合并单线程多线程数据
         self.benchmark = BenchMark()  #benchmark 依赖了exportexcel内的对象 ,
+        self.benchmark.blobs = BlobStore(os.path.join(os.path.dirname(os.path.abspath(json_file_path)), "blobs"))  #环境信息中的blob引用
         self.report_path = report_folder + rf"\kytuning{current_date}.xlsx"  #excel文件导出的路径
         self.json_path = json_file_path  #json文件路径
         self.results = {}  #用来存放测试结果的数据 , 数组成员为dict 或者 其他
@@ -30,6 +30,12 @@ def log_init(path='kytuning.log', levelname='info'):
     logger = logging.getLogger()
     logger.setLevel(level)
 
+    # 再次初始化(如依次运行多个方案)时替换上次添加的处理器, 避免重复输出
+    for handler in list(logger.handlers):
+        if getattr(handler, 'kytuning', False):
+            logger.removeHandler(handler)
+            handler.close()
+
     # 文件日志处理器
     file_handler = logging.FileHandler(path, mode='w')
     file_handler.setLevel(level)
@@ -41,6 +47,8 @@ def log_init(path='kytuning.log', levelname='info'):
     console_handler.setFormatter(logging.Formatter(Format))
     
     # 添加处理器到日志器
+    file_handler.kytuning = True
+    console_handler.kytuning = True
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
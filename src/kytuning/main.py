@@ -10,33 +10,88 @@ __all__ = [ 'Main' ]
 import sys, getopt, os, time
 
 from .logger import *
-from .scheme import subproc_call, SchemeError, SchemeParserError, TestCaseError
+from .scheme import subproc_call, SchemeParser, SchemeError, SchemeParserError, TestCaseError
 from .test import *
 from .error import *
 from .config import *
+from .report import compact_all_json
+from .rollback import RollbackJournal
+from .timing import TimingHistory
+from .plan import SchemePlan, parse_duration
+from .fleet import Controller, Agent
 
 class Main(object):
     def __init__(self):
         # 载入配置文件
         self.config = KYConfig().load()
+        self.plan = False
+        self.budget = None
+        self.serve = None
+        self.agent = None
 
     def __parse_argv(self):
         if len(sys.argv) < 2: 
             logging.error('input scheme path.') 
             sys.exit()
 
-        opts, args = getopt.getopt(sys.argv[1:], "hf:", ["help", "report_path="])
+        opts, args = getopt.getopt(sys.argv[1:], "hf:", ["help", "report_path=", "compact", "rebuild", "resume=", "fresh", "plan", "budget=", "serve=", "agent=", "base_path="])
         for o, a in opts:
             if o in ("-h", "--help"):
                 sys.exit()
             elif o in ("-f", "--report_path"):
                 self.config.add({'main':{'report_path': a}})
+            elif o == "--rebuild":
+                # 忽略编译缓存, 强制重新编译测试工具
+                self.config.add({'main':{'rebuild': True}})
+            elif o == "--fresh":
+                # 不复用缓存中的测试结果, 全部重新测试
+                self.config.add({'main':{'fresh': True}})
+            elif o == "--resume":
+                # 在中断的结果目录中继续测试, 跳过已完成的迭代
+                self.config.add({'main':{'resume': os.path.abspath(a)}})
+            elif o == "--plan":
+                # 只展开方案并估算运行时间, 不运行测试
+                self.plan = True
+            elif o == "--budget":
+                # --plan的时间预算, 如 8h, 1h30m, 3600
+                try:
+                    self.budget = parse_duration(a)
+                except ValueError as e:
+                    logging.error(e)
+                    sys.exit()
+            elif o == "--serve":
+                # 分发测试的控制端, 监听 [HOST:]PORT
+                host, _, port = a.rpartition(':')
+                try:
+                    self.serve = (host or '0.0.0.0', int(port))
+                except ValueError:
+                    logging.error('invalid listen address: %s' % a)
+                    sys.exit()
+            elif o == "--agent":
+                # 分发测试的代理端, 连接控制端 http://HOST:PORT
+                self.agent = a if '://' in a else 'http://' + a
+            elif o == "--base_path":
+                # 覆盖配置文件中的base_path, 如同一主机上运行多个代理端
+                self.config.add({'main':{'base_path': os.path.abspath(a)}})
+            elif o == "--compact":
+                # 合并异常退出时遗留的结果日志
+                compact_all_json(os.path.join(self.config.base_path, "all_json_file.json"))
+                sys.exit()
             pass
 
+        if self.agent is not None:
+            return args
+
         if len(args) == 0:
             logging.error('input scheme path.')
             sys.exit()
 
+        if args == ['restore'] and not os.path.exists('restore'):
+            # 还原异常退出时未还原的参数
+            log_init(os.path.join(self.config.base_path, 'kytuning-restore.log'))
+            self.__restore()
+            sys.exit()
+
         for file in args:
             if file is None or len(file) == 0:
                 logging.error('invalid scheme path : "%s"' % file)
@@ -47,9 +102,45 @@ class Main(object):
 
         return args
 
+    def __restore(self):
+        journal = RollbackJournal(self.config.base_path)
+        if not journal.unclean():
+            logging.info('no tunables to restore.')
+            return
+        if not journal.restore():
+            logging.error('restore tunables failed, see {path}'.format(path=journal.path))
+
+    def __plan(self, paths):
+        history = TimingHistory(self.config.base_path)
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    scheme = SchemeParser().parse(f)
+                if scheme is None:
+                    logging.error('empty scheme: "%s"' % path)
+                    continue
+                print(SchemePlan(scheme, history, self.budget).report())
+            except SchemeParserError as e:
+                logging.error(e)
+
     def run(self): 
         # 解析参数
         paths = self.__parse_argv()
+        if self.plan:
+            self.__plan(paths)
+            return
+        if self.agent is not None:
+            os.makedirs(self.config.base_path, exist_ok=True)
+            log_init(os.path.join(self.config.base_path, 'kytuning-agent.log'))
+            Agent(self.agent).run()
+            return
+        if self.serve is not None:
+            os.makedirs(self.config.base_path, exist_ok=True)
+            log_init(os.path.join(self.config.base_path, 'kytuning-controller.log'))
+            Controller([os.path.abspath(path) for path in paths], self.serve,
+                       self.config.get_main('fleet_batch') or 4,
+                       self.config.get_main('fleet_timeout') or 600).serve()
+            return
         # do test
         cpaths = len(paths)
         for idx in range(cpaths):
@@ -0,0 +1,214 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import math
+
+__all__ = ['SchemePlan', 'parse_duration', 'format_duration']
+
+
+_duration_part = re.compile(r'(\d+(?:\.\d+)?)([dhms]?)')
+_duration_unit = {'d': 86400, 'h': 3600, 'm': 60, 's': 1, '': 1}
+
+
+def parse_duration(text) -> float:
+    """
+    解析时长, 如 3600, 90m, 8h, 1h30m, 1d
+    :return: 秒数
+    :raise ValueError: 格式错误
+    """
+    text = str(text).strip().lower()
+    pos = 0
+    seconds = 0.0
+    for m in _duration_part.finditer(text):
+        if m.start() != pos:
+            break
+        seconds += float(m.group(1)) * _duration_unit[m.group(2)]
+        pos = m.end()
+    if pos == 0 or pos != len(text):
+        raise ValueError('invalid duration: {text}'.format(text = text))
+    return seconds
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return 'unknown'
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours > 0:
+        return '{h}h{m:02d}m{s:02d}s'.format(h = hours, m = minutes, s = seconds)
+    if minutes > 0:
+        return '{m}m{s:02d}s'.format(m = minutes, s = seconds)
+    return '{s}s'.format(s = seconds)
+
+
+class SchemePlan(object):
+    """
+    不运行测试, 按SchemeParser展开的测试用例估算方案的测试次数及耗时:
+        plan = SchemePlan(SchemeParser().parse(f), TimingHistory(base_path), budget = 8 * 3600)
+        print(plan.report())
+    参数切换按测试用例顺序模拟(只计取值变化的参数), 编译按编译/清理命令变化计数(未计编译缓存),
+    各阶段耗时取自TimingHistory; 给定时间预算时给出预算内可完成的迭代次数及测试用例数.
+    """
+
+    def __init__(self, scheme, history, budget = None):
+        """
+        :param scheme: SchemeParser.parse()的结果, 无需prepare()
+        :param history: TimingHistory
+        :param budget: 时间预算(秒)
+        """
+        self.scheme = scheme
+        self.history = history
+        self.budget = budget
+        self.test_type = scheme.get_test_type()
+
+    def _iterations(self):
+        adaptive = self.scheme.get_adaptive()
+        if adaptive is not None:
+            low = max(adaptive.get('min_iterations', 3), 1)
+            return low, max(adaptive.get('max_iterations', 10), low)
+        maxit = self.scheme.get_maxiterations()
+        return maxit, maxit
+
+    def _estimate(self, tcase, phase, fidelity = None):
+        seconds, _ = self.history.estimate(self.test_type, tcase, phase, fidelity)
+        if seconds is None and phase == 'warmup':
+            seconds, _ = self.history.estimate(self.test_type, tcase, 'run', fidelity)
+        return seconds
+
+    def _walk(self, tcases, fidelity):
+        """
+        按顺序模拟一遍测试用例
+        :return: 统计信息, 其中run为每个测试用例一次迭代的耗时之和
+        """
+        ret = {'count': 0, 'switches': 0, 'builds': 0, 'warmups': 0, 'run': 0.0, 'warmup': 0.0,
+               'setup': 0.0, 'build': 0.0, 'unknown': 0}
+        applied = {}
+        build = None
+        for tcase in tcases:
+            ret['count'] += 1
+            names = set(item.name for item in tcase.configs)
+            drop = [name for name in applied if name not in names]
+            for name in drop:
+                applied.pop(name)
+            change = [item for item in tcase.configs if not item.same_as(applied.get(item.name))]
+            for item in change:
+                applied[item.name] = item
+            switches = len(drop) + len(change)
+            ret['switches'] += switches
+            if switches > 0:
+                ret['setup'] += switches * (self._estimate(tcase, 'setup') or 0)
+            if (tcase.build_cmd, tcase.clean_cmd) != build:
+                build = (tcase.build_cmd, tcase.clean_cmd)
+                ret['builds'] += 1
+                ret['build'] += self._estimate(tcase, 'build') or 0
+            run = self._estimate(tcase, 'run', fidelity)
+            if run is None:
+                ret['unknown'] += 1
+                continue
+            ret['run'] += run
+            warmup = self.scheme.get_warmup(tcase)
+            ret['warmups'] += warmup
+            if warmup > 0:
+                ret['warmup'] += warmup * (self._estimate(tcase, 'warmup', fidelity) or run)
+        return ret
+
+    def _screening(self, tcases):
+        """
+        逐轮筛选的测试用例数及耗时, 每轮保留的测试用例未知, 按全部候选测试用例的均值估算
+        :return: ([(fidelity, 测试用例数, 耗时), ...], 最终测试用例数)
+        """
+        screening = self.scheme.get_screening()
+        rungs = []
+        count = len(tcases)
+        for fidelity in screening['fidelity']:
+            if count <= 1:
+                break
+            walk = self._walk(tcases, fidelity)
+            known = walk['count'] - walk['unknown']
+            per = (walk['run'] + walk['build'] + walk['setup']) / known if known > 0 else None
+            rungs.append((fidelity, count, per * count if per is not None else None))
+            count = max(1, int(math.ceil(count * screening['keep'])))
+        return rungs, count
+
+    def summary(self) -> dict:
+        fidelity = self.scheme.get_fidelity()
+        low, high = self._iterations()
+        ret = {'project': self.scheme.get_project(), 'test_type': self.test_type,
+               'declared': len(self.scheme.testcases), 'iterations': (low, high), 'fidelity': fidelity,
+               'screening': None, 'history': not self.history.empty()}
+        if self.scheme.get_screening() is not None:
+            tcases = list(self.scheme.testcases)
+            rungs, final = self._screening(tcases)
+            ret['screening'] = rungs
+        else:
+            tcases = self.scheme.testcases
+            final = None
+        walk = self._walk(tcases, fidelity)
+        ret.update(walk)
+        ret['final'] = walk['count'] if final is None else final
+        # 没有耗时记录的测试用例及筛选后保留的测试用例均按已知测试用例的均值估算
+        known = walk['count'] - walk['unknown']
+        scale = ret['final'] / known if known > 0 else 0
+        ret['per_iteration'] = walk['run'] * scale if known > 0 else None
+        overhead = walk['build'] + walk['setup'] + walk['warmup'] * scale
+        if ret['screening']:
+            overhead += sum(cost or 0 for _, _, cost in ret['screening'])
+        ret['overhead'] = overhead
+        if ret['per_iteration'] is not None:
+            ret['estimate'] = (overhead + ret['per_iteration'] * low, overhead + ret['per_iteration'] * high)
+        else:
+            ret['estimate'] = None
+        if self.budget is not None and ret['per_iteration']:
+            ret['fit_iterations'] = max(0, int((self.budget - overhead) // ret['per_iteration']))
+            per_testcase = ret['estimate'][1] / ret['final']
+            ret['fit_testcases'] = min(ret['final'], max(0, int(self.budget // per_testcase)))
+        return ret
+
+    def report(self) -> str:
+        info = self.summary()
+        low, high = info['iterations']
+        lines = ['scheme: {project} ({test_type})'.format(project=info['project'], test_type=info['test_type'])]
+        lines.append('  testcases    : {count} (declared {declared})'.format(count=info['count'], declared=info['declared']))
+        if info['screening']:
+            for rung, (fidelity, count, cost) in enumerate(info['screening']):
+                lines.append('  screening {rung}  : {count} testcases at fidelity {fidelity}, {cost}'.format(
+                    rung=rung, count=count, fidelity=fidelity, cost=format_duration(cost)))
+            lines.append('  after screening: {final} testcases'.format(final=info['final']))
+        lines.append('  iterations   : {low}'.format(low=low) if low == high else
+                     '  iterations   : {low}-{high} (adaptive)'.format(low=low, high=high))
+        parallel = self.scheme.get_parallel()
+        if parallel is not None:
+            lines.append('  parallel     : {copies} copies per iteration, pinned by {pin}'.format(
+                copies=parallel['copies'] or 'auto', pin=parallel['pin']))
+        if info['fidelity'] is not None:
+            lines.append('  fidelity     : {fidelity}'.format(fidelity=info['fidelity']))
+        lines.append('  warmups      : {n}'.format(n=info['warmups']))
+        lines.append('  config switches: {n}'.format(n=info['switches']))
+        lines.append('  builds       : up to {n}'.format(n=info['builds']))
+        if not info['history']:
+            lines.append('  estimate     : unknown, no timings recorded yet')
+            return '\n'.join(lines)
+        if info['unknown'] > 0:
+            lines.append('  no timings   : {n} testcases'.format(n=info['unknown']))
+        if info['estimate'] is None:
+            lines.append('  estimate     : unknown')
+            return '\n'.join(lines)
+        est_low, est_high = info['estimate']
+        lines.append('  per iteration: {t} for all testcases'.format(t=format_duration(info['per_iteration'])))
+        lines.append('  overhead     : {t} (build, config, warmup, screening)'.format(t=format_duration(info['overhead'])))
+        lines.append('  estimate     : {t}'.format(t=format_duration(est_high)) if low == high else
+                     '  estimate     : {a} - {b}'.format(a=format_duration(est_low), b=format_duration(est_high)))
+        if self.budget is not None:
+            lines.append('  budget       : {t}'.format(t=format_duration(self.budget)))
+            lines.append('  fits         : {n} iterations per testcase'.format(n=info['fit_iterations']))
+            lines.append('  fits         : {n} of {total} testcases at {it} iterations'.format(
+                n=info['fit_testcases'], total=info['final'], it=high))
+        return '\n'.join(lines)
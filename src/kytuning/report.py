@@ -13,11 +13,45 @@
 import time
 import json
 import os
+import logging
 from .exportexcel import *
+from .config import KYConfig
+from .journal import JsonlJournal
+from .blobstore import BlobStore
+
+
+__all__ = ['Report', 'compact_all_json']
+
+
+def compact_all_json(all_json_file):
+    """
+    将追加写的结果日志(all_json_file.jsonl)合并到all_json_file.json,
+    生成send.py与run.sh使用的汇总json, 合并完成后删除日志
+    :param all_json_file: all_json_file.json文件路径
+    :return: all_json_file.json文件路径
+    """
+    journal_file = all_json_file + 'l'
+    records = JsonlJournal.load(journal_file)
+    if len(records) == 0:
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+        return all_json_file
+    content = {}
+    if os.path.exists(all_json_file):
+        with open(all_json_file, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    for record in records:
+        content[record['name']] = record['data']
+    tmp_file = all_json_file + '.tmp'
+    with open(tmp_file, 'w+', encoding='utf-8') as f_new:
+        json.dump(content, f_new)
+        f_new.flush()
+        os.fsync(f_new.fileno())
+    os.replace(tmp_file, all_json_file)
+    os.remove(journal_file)
+    return all_json_file
 
 
-__all__ = ['Report']
-
 class Report(object):
 
     def __init__(self,basepath):
@@ -31,28 +65,63 @@ class Report(object):
         self.current_env_file = None
         self.current_report_file = None
         self.exportxlsx = ExportXlsx()
+        # deferred: 整个方案期间在内存中汇总表格, 结束时(或每report_checkpoint个结果)写盘
+        self.exportxlsx.set_deferred(KYConfig().get_main('report_mode') != 'immediate',
+                                     KYConfig().get_main('report_checkpoint') or 0)
         self.all_json_file = os.path.abspath(os.path.join(self.basepath, "../../", "all_json_file.json"))
+        # 环境信息中的大段文本压缩存放在all_json_file.json同级的blobs目录
+        self.blobs = BlobStore(os.path.join(os.path.dirname(self.all_json_file), "blobs"))
+        # 测试结果先追加写到all_json_file.jsonl, flush()时再合并到all_json_file.json
+        self.all_json_journal = JsonlJournal(self.all_json_file + 'l', KYConfig().get_main('journal_fsync_batch') or 1)
         self.save_json_data = False
+        self.resumed = False
 
     def path_init(self):
         """
         临时文件存放路径初始化
         """
-        self.current_result_dir = self.resultspath + "/" +time.strftime("%Y-%m-%d-%H-%M-%S", time.localtime())
-        os.makedirs(self.current_result_dir,exist_ok=False)
+        resume = KYConfig().get_main('resume')
+        if resume and os.path.dirname(os.path.abspath(resume)) == os.path.abspath(self.resultspath) \
+                and os.path.isdir(resume):
+            # 继续中断的测试: 沿用原结果目录, 表格由已完成的结果重新生成
+            self.resumed = True
+            self.current_result_dir = os.path.abspath(resume)
+            excel_file = os.path.join(self.current_result_dir, self.exportxlsx.excel_name)
+            if os.path.exists(excel_file):
+                os.remove(excel_file)
+            logging.info('resume test in {rdir}'.format(rdir=self.current_result_dir))
+        else:
+            if resume:
+                logging.warning('{rdir} is not a result dir of {rpath}, start a new test'.format(
+                    rdir=resume, rpath=self.resultspath))
+            self.current_result_dir = self.resultspath + "/" +time.strftime("%Y-%m-%d-%H-%M-%S", time.localtime())
+            os.makedirs(self.current_result_dir,exist_ok=False)
 
         self.current_env_file = self.current_result_dir + "/getenv.json"
 
         self.current_log_dir = self.current_result_dir + "/logs"
-        os.makedirs(self.current_log_dir,exist_ok=False)
+        os.makedirs(self.current_log_dir,exist_ok=self.resumed)
         self.current_opmodify_dir = self.current_result_dir + "/opmodify"
-        os.makedirs(self.current_opmodify_dir,exist_ok=False)
+        os.makedirs(self.current_opmodify_dir,exist_ok=self.resumed)
         self.current_testcases_dir = self.current_result_dir + "/testcases"
-        os.makedirs(self.current_testcases_dir,exist_ok=False)
+        os.makedirs(self.current_testcases_dir,exist_ok=self.resumed)
         self.current_raw_result_dir = self.current_result_dir + "/result"
-        os.makedirs(self.current_raw_result_dir,exist_ok=False)
+        os.makedirs(self.current_raw_result_dir,exist_ok=self.resumed)
+        self.current_warmup_dir = self.current_result_dir + "/warmup"
+        self.current_screening_dir = self.current_result_dir + "/screening"
         self.current_report_file = self.current_result_dir     # +  "/kytuning-result.xlsx"
 
+    def flush(self):
+        """
+        将内存中汇总的结果写盘, 并合并all_json_file.jsonl
+        :return 返回表格文件路径
+        """
+        self.all_json_journal.close()
+        compact_all_json(self.all_json_file)
+        logging.info('result parse cache: hit {hit}, miss {miss}'.format(
+            hit=self.exportxlsx.parse_hit, miss=self.exportxlsx.parse_miss))
+        return self.exportxlsx.flush()
+
     def get_log_save_dir(self):
         """
         获取日志保存路径
@@ -75,7 +144,7 @@ class Report(object):
         file.close()
 
         # 保存环境信息到 xlsx 表格中
-        self.exportxlsx.export_env_to_xlsx(json.loads(env_data),self.current_report_file)
+        self.exportxlsx.export_env_to_xlsx(json.loads(env_data),self.current_report_file,self.blobs)
 
         return self.current_env_file
 
@@ -110,6 +179,29 @@ class Report(object):
         file.close()
         return file_path
 
+    def save_adaptive_data(self, name, decision):
+        '''
+        保存自适应迭代次数的停止判定
+        :param name          测试用例名称
+        :param decision      判定信息(迭代次数、各次主指标、变异系数、停止原因等)
+        :return              返回判定信息文件保存路径
+        '''
+        file_path=self.current_testcases_dir + "/adaptive-" + name + ".json"
+        with open(file_path, 'w+') as file:
+            file.write(json.dumps(decision))
+        return file_path
+
+    def metric_value(self, testinfo, path, metric = None):
+        '''
+        解析结果文件并取指标数值(结果解析有缓存, 不会重复解析)
+        :param testinfo      测试清单信息
+        :param path          结果文件路径
+        :param metric        指标的键路径, 为空时取工具的主指标
+        '''
+        tool_name = testinfo["test_type"]
+        ret = self.exportxlsx.ret_to_dict(tool_name, path, testinfo["testcase"]["run"], self.dumps_configs(testinfo))
+        return self.exportxlsx.metric_value(tool_name, ret, metric)
+
     def save_result_data(self, name, data):
         # 保存中间结果文件
         file_path=self.current_raw_result_dir + "/" + name
@@ -139,6 +231,65 @@ class Report(object):
             dumps_str = dumps_str + t_config["setup"] +'\r\n'
         return dumps_str
 
+    def save_search_data(self, name, trials, best):
+        '''
+        保存搜索调优的全部尝试及当前最优组合, 每次尝试后整体重写
+        :param name          搜索名称
+        :param trials        各次尝试的记录(测试用例、参数取值、目标指标)
+        :param best          当前最优的尝试
+        :return              返回搜索记录文件保存路径
+        '''
+        file_path = self.current_testcases_dir + "/search-" + name + ".json"
+        with open(file_path + ".tmp", 'w+') as file:
+            file.write(json.dumps({"trials": trials, "best": best}))
+        os.replace(file_path + ".tmp", file_path)
+        return file_path
+
+    def save_screening(self, name, testinfo, data):
+        '''
+        保存筛选阶段(低精度)的结果, 仅归档到screening目录, 不计入表格及all_json_file.json
+        :param name          测试名称
+        :param testinfo      测试清单信息
+        :param data          测试结果数据
+        :return              返回结果文件保存路径
+        '''
+        os.makedirs(self.current_screening_dir, exist_ok=True)
+        file_path = self.current_screening_dir + "/" + name
+        with open(file_path, 'w+') as file:
+            file.write(data if data else '')
+        with open(self.current_screening_dir + "/testcase-" + name + ".json", 'w+') as file:
+            file.write(json.dumps(testinfo))
+        return file_path
+
+    def save_screening_data(self, rung, data):
+        '''
+        保存一轮筛选的结果
+        :param rung          筛选轮次
+        :param data          本轮的精度、各测试用例的指标及保留的测试用例
+        :return              返回筛选记录文件保存路径
+        '''
+        file_path = self.current_screening_dir + "/rung-" + str(rung) + ".json"
+        with open(file_path, 'w+') as file:
+            file.write(json.dumps(data))
+        return file_path
+
+    def save_warmup(self, name, testinfo, data):
+        '''
+        保存预热迭代的结果, 仅归档到warmup目录, 不计入表格及all_json_file.json
+        :param name          测试名称
+        :param testinfo      测试清单信息
+        :param data          测试结果数据
+        :return              返回结果文件保存路径
+        '''
+        os.makedirs(self.current_warmup_dir, exist_ok=True)
+        file_path = self.current_warmup_dir + "/" + name
+        with open(file_path, 'w+') as file:
+            file.write(data if data else '')
+        testinfo = dict(testinfo, warmup=True)
+        with open(self.current_warmup_dir + "/testcase-" + name + ".json", 'w+') as file:
+            file.write(json.dumps(testinfo))
+        return file_path
+
     def save_result(self,name,testinfo,data, only_xlsx = False):
         '''
         测试结果保存接口
@@ -327,20 +478,15 @@ class Report(object):
     def save_test_data_to_all_json(self, name, data):
         """
         :负责人       wqz
-        :message    保存测试数据到all_json_file.json
+        :message    保存测试数据到all_json_file.jsonl, flush()时合并到all_json_file.json
         :param      name: 原始文件名称,区分是什么类型的数据.
         :param      data: json数据
-        :return:    all_json_file.json文件路径
+        :return:    all_json_file.jsonl文件路径
         """
-        all_json_file = os.path.abspath(os.path.join(self.basepath, "../../", "all_json_file.json"))
         time = self.current_result_dir.split('/')[-1]
         data['time'] = time
-        with open(all_json_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
-        content[name] = data
-        with open(all_json_file, 'w+', encoding='utf-8') as f_new:
-            json.dump(content, f_new)
-        return all_json_file
+        self.all_json_journal.append({'name': name, 'data': data})
+        return self.all_json_journal.path
 
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import subprocess
+from .journal import JsonlJournal
+from .tunable import TunableError, write_tunables
+
+__all__ = ['RollbackJournal']
+
+
+class RollbackJournal(object):
+    """
+    参数还原日志, 保存在<base_path>/rollback.jsonl中, 与结果目录无关, 进程被杀或主机重启后仍可还原:
+        {"type": "save", "owner": name, "items": [{"name", "path", "value", "cmd"}, ...]}    设置参数前
+        {"type": "done", "owner": name}                                                    参数已还原
+    没有"done"记录的"save"即未还原的参数, 由`kytuning restore`按保存的逆序还原.
+        journal = RollbackJournal('/root/kytuning')
+        journal.record(tcase.name, tcase.configs)
+        tcase.setup_config() ... tcase.reset_config()
+        journal.release(tcase.name)
+    """
+    FILE_NAME = 'rollback.jsonl'
+
+    def __init__(self, base_path):
+        self.path = os.path.join(base_path, self.FILE_NAME)
+        self.journal = None
+
+    def _open(self):
+        if self.journal is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            self.journal = JsonlJournal(self.path, 1)
+        return self.journal
+
+    def pending(self) -> list:
+        """
+        未还原的参数, 按保存顺序排列; 同一owner未还原时再次保存, 各参数保留最早保存的原始值
+        :return: [(owner, [item, ...]), ...]
+        """
+        owners = {}
+        for record in JsonlJournal.load(self.path):
+            owner = record.get('owner')
+            if record.get('type') == 'save':
+                items = owners.setdefault(owner, [])
+                names = set(item.get('name') for item in items)
+                items.extend(item for item in record.get('items', []) if item.get('name') not in names)
+            elif record.get('type') == 'done':
+                owners.pop(owner, None)
+        return list(owners.items())
+
+    def unclean(self) -> bool:
+        return len(self.pending()) > 0
+
+    def record(self, owner, configs):
+        """
+        记录参数的原始值, 须在TestConfig.save()之后、setup()之前调用
+        """
+        items = []
+        for item in configs:
+            if item.reset_cmd is None and item.saved is None:
+                continue
+            items.append({'name': item.name, 'path': item.path, 'value': item.saved, 'cmd': item.reset_cmd})
+        if len(items) > 0:
+            self._open().append({'type': 'save', 'owner': owner, 'items': items})
+
+    def release(self, owner):
+        """
+        参数已还原, 全部还原后清空日志
+        """
+        if self.journal is None:
+            return
+        self.journal.append({'type': 'done', 'owner': owner})
+        if not self.unclean():
+            self.clear()
+
+    def clear(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _restore_item(self, item) -> bool:
+        if item.get('path') and item.get('value') is not None:
+            try:
+                write_tunables([(item['path'], item['value'])])
+                return True
+            except TunableError as e:
+                logging.error(e)
+                return False
+        if item.get('cmd'):
+            r = subprocess.run(item['cmd'], shell = True)
+            if r.returncode:
+                logging.error('restore ({cmd}) error[{code}]'.format(cmd = item['cmd'], code = r.returncode))
+            return r.returncode == 0
+        return True
+
+    def restore(self) -> bool:
+        """
+        按保存的逆序还原全部未还原的参数, 全部成功后清空日志, 否则保留日志以便再次还原
+        """
+        ok = True
+        for owner, items in reversed(self.pending()):
+            for item in reversed(items):
+                if self._restore_item(item):
+                    logging.info('restore {owner}: {name} done'.format(owner = owner, name = item.get('name')))
+                else:
+                    ok = False
+        if ok:
+            self.clear()
+        return ok
@@ -7,13 +7,17 @@
 """
 import os
 import yaml
+import shlex
+import shutil
 import logging
-import itertools
 import subprocess
 from subprocess import SubprocessError
 
 from .logger import log_init
 from .func import *
+from .cache import ExtractCache
+from .tunable import *
+from .search import Tuner, Refiner
 
 __doc__ = """
 """
@@ -38,12 +42,52 @@ class SchemeParserError(Exception):
         Exception.__init__(self, *args, **kwargs)
 
 def subproc_call(command, timeout=None, check=False, hide=False):
+    # hide: 不输出到终端, 通过返回值的stdout/stderr取得输出
+    pipe = subprocess.PIPE if hide else None
     return subprocess.run(command, shell=True,  
-            stdout=None, stderr=None,
+            stdout=pipe, stderr=pipe,
             encoding='utf-8', timeout=timeout, check=check)
 
 
+def apply_tunables(items):
+    """
+    直接写入一组/proc/sys、/sys参数并读回校验
+    :param items: [(path, value), ...]
+    """
+    try:
+        write_tunables(items)
+    except TunableError as e:
+        logging.error(e)
+        raise TestConfigError(-1, str(e))
+
+
+def gray_product(lists):
+    """
+    按混合进制的反射格雷码顺序遍历笛卡尔积, 相邻两项只有一个位置的取值不同, 第0个位置变化最频繁
+        list(gray_product([[1, 2], ['a', 'b']])) == [(1, 'a'), (2, 'a'), (2, 'b'), (1, 'b')]
+    """
+    if any(len(values) == 0 for values in lists):
+        return
+    idx = [0] * len(lists)
+    step = [1] * len(lists)
+    while True:
+        yield tuple(values[i] for values, i in zip(lists, idx))
+        for pos in range(len(lists)):
+            nxt = idx[pos] + step[pos]
+            if 0 <= nxt < len(lists[pos]):
+                idx[pos] = nxt
+                break
+            step[pos] = -step[pos]
+        else:
+            return
+
+
 class TestCmd(object):
+    # 运行时才能确定取值的模板变量, 解析阶段原样保留, 由render()替换
+    # ret_dir: 每次迭代独立的结果目录
+    # fidelity: 测试精度(如fio的-runtime), 筛选阶段取较低的值, 完整测试时取方案的fidelity
+    RUNTIME_VARS = ['ret_dir', 'fidelity']
+
     def __init__(self, cmd, exfmt = None):
         self._cmd = None
         self._cmd_str = None
@@ -51,26 +95,46 @@ class TestCmd(object):
         self.__set(cmd, exfmt)
 
     def __set(self, cmd, exfmt):
+        keep = {k: '{%s}' % k for k in self.RUNTIME_VARS}
         if cmd is not None:
             if type(cmd) == dict:
                 if "c_param" in cmd:
                     rdict = FUNC().call(cmd["c_param"])
+                    rdict.update(keep)
                     if exfmt is not None:
                         rdict.update(exfmt)
                     self._cmd_str = cmd["command"].format(**rdict)
                 else:
                     self._cmd_str = cmd["command"]
                 if "pre_cmd" in cmd:
-                    self._cmd_str = cmd["pre_cmd"].format(command = self._cmd_str)
+                    self._cmd_str = cmd["pre_cmd"].format(command = self._cmd_str, **keep)
                 self._cmd_raw = cmd["command"]
             else:
                 if exfmt is not None:
-                    self._cmd_str = self._cmd_raw = cmd.format(**exfmt)
+                    self._cmd_str = self._cmd_raw = cmd.format(**dict(keep, **exfmt))
                 else:
                     self._cmd_str = self._cmd_raw = cmd
             self._cmd = cmd
         pass
 
+    def uses(self, key):
+        """
+        命令中是否引用了运行时模板变量key
+        """
+        return self._cmd_str is not None and ('{%s}' % key) in self._cmd_str
+
+    def render(self, **kwargs):
+        """
+        替换运行时模板变量, 命令中的其它'{}'(如shell的${VAR})保持不变
+        """
+        cmd = self._cmd_str
+        if cmd is None:
+            return cmd
+        for k, v in kwargs.items():
+            if v is not None:
+                cmd = cmd.replace('{%s}' % k, str(v))
+        return cmd
+
     @property
     def cmd(self):
         return self._cmd_str
@@ -81,17 +145,50 @@ class TestCmd(object):
 
 
 class TestConfig(object):
-    def __init__(self, name, desc, get_cmd, set_cmd, value):
+    def __init__(self, name, desc, get_cmd, set_cmd, value, path = None):
+        """
+        :param path: 参数在/proc/sys或/sys下的文件路径, 设置后直接读写该文件, 不再调用get/set命令
+        """
         self.name = name 
         self.desc = desc 
         self.get_cmd = get_cmd 
         self.set_cmd = set_cmd
         self.value = value
-        self.setup_cmd = self.set_cmd.format(value=value)
+        self.path = path
+        self.setup_cmd = self.format_set(value)
         self.reset_cmd = None
+        self.saved = None
+        self.cost = 1                      # 切换该参数的代价, 组合测试时代价高的参数尽量少切换
+        self.refine = None                 # 连续参数由粗到细搜索的配置, 取值为粗粒度网格
+
+    def same_as(self, other):
+        """
+        是否与other设置同一参数的同一取值
+        """
+        return other is not None and self.name == other.name and self.path == other.path \
+            and self.setup_cmd == other.setup_cmd
+
+    def keep_saved(self, other):
+        """
+        沿用other保存的原始值
+        """
+        self.saved = other.saved
+        self.reset_cmd = other.reset_cmd
+
+    def format_set(self, value):
+        if self.set_cmd:
+            return self.set_cmd.format(value=value)
+        return shell_write_cmd(self.path, value)
 
     def save(self):
-        if self.get_cmd:
+        if self.path:
+            try:
+                self.saved = read_tunable(self.path)
+                self.reset_cmd = self.format_set(self.saved)
+            except OSError as e:
+                logging.error('read {path} error: {err}'.format(path=self.path, err=e))
+                raise TestConfigError(e.errno or -1)
+        elif self.get_cmd:
             try:
                 r = subproc_call(self.get_cmd, hide=True)
                 if r.returncode:
@@ -103,7 +200,9 @@ class TestConfig(object):
 
 
     def setup(self):
-        if self.setup_cmd:
+        if self.path:
+            apply_tunables([(self.path, self.value)])
+        elif self.setup_cmd:
             try:
                 r = subproc_call(self.setup_cmd)
                 if r.returncode:
@@ -112,7 +211,10 @@ class TestConfig(object):
                 raise TestConfigError(-1)
 
     def reset(self):
-        if self.reset_cmd: 
+        if self.path:
+            if self.saved is not None:
+                apply_tunables([(self.path, self.saved)])
+        elif self.reset_cmd: 
             try:
                 r = subproc_call(self.reset_cmd)
                 if r.returncode:
@@ -121,8 +223,11 @@ class TestConfig(object):
                 raise TestConfigError(-1)
 
     def to_data(self):
-        return { 'name' : self.name, 'desc' : self.desc, 
+        data = { 'name' : self.name, 'desc' : self.desc, 
                 'setup' : self.setup_cmd, 'reset': self.reset_cmd }
+        if self.path:
+            data['path'] = self.path
+        return data
 
     def __str__(self):
         return "TestConfig: (name:%s,desc:%s,setup:%s,reset:%s)" % (self.name, self.desc, self.setup_cmd, self.reset_cmd)
@@ -130,10 +235,15 @@ class TestConfig(object):
 class TestCase(object):
     def __init__(self, name, clean_cmd, build_cmd, test_cmd):
         self.name = name 
-        self._test_cmd = TestCmd(test_cmd)
+        # 同一testcase配置展开的测试用例共用一个TestCmd, 模板函数只调用一次
+        self._test_cmd = test_cmd if isinstance(test_cmd, TestCmd) else TestCmd(test_cmd)
         self.build_cmd = build_cmd
         self.clean_cmd = clean_cmd
         self.configs = []
+        self.warmup = None                 # 预热迭代次数, 为None时使用方案的warmup
+        self.parallel = None               # 并行运行副本的配置, 为None时使用方案的parallel
+        self.trial = None                  # 搜索调优的一次尝试: (Tuner, 各参数取值下标) 或 (Refiner, 取值)
+        self.ordinal = None                # 在方案测试用例序列中的序号, 测试用例名称可能重复
 
     @property
     def test_cmd(self):
@@ -143,22 +253,54 @@ class TestCase(object):
     def test_cmd_raw(self):
         return self._test_cmd.raw
 
+    @property
+    def uses_ret_dir(self):
+        return self._test_cmd.uses('ret_dir')
+
+    @property
+    def uses_fidelity(self):
+        return self._test_cmd.uses('fidelity')
+
     def add_config(self, data):
         if isinstance(data, TestConfig):
             self.configs.append(data)
 
-    def save_config(self):
-        for item in self.configs:
+    def save_config(self, configs = None):
+        """
+        :param configs: 只处理其中的参数, 为None时处理全部参数; setup_config/reset_config同
+        """
+        for item in (self.configs if configs is None else configs):
+            cmd = item.path or item.get_cmd
             try:
                 item.save()
-                logging.info('testcase({name}->save({cmd})) done'.format(name=self.name, cmd=item.get_cmd))
+                logging.info('testcase({name}->save({cmd})) done'.format(name=self.name, cmd=cmd))
             except TestConfigError as e:
-                logging.error('testcase({name}->save({cmd})) error[{code}]'.format(name=self.name, cmd=item.get_cmd, code=e))
-                raise TestCaseError('testcase({name}->save({cmd})) error[{code}]'.format(name=self.name, cmd=item.get_cmd, code=e))
+                logging.error('testcase({name}->save({cmd})) error[{code}]'.format(name=self.name, cmd=cmd, code=e))
+                raise TestCaseError('testcase({name}->save({cmd})) error[{code}]'.format(name=self.name, cmd=cmd, code=e))
 
 
-    def setup_config(self):
-        for item in self.configs:
+    def _apply_native(self, action, items):
+        """
+        一次写入本测试用例全部直接读写的参数
+        :param items: [(TestConfig, value), ...]
+        """
+        if len(items) == 0:
+            return
+        try:
+            apply_tunables([(item.path, value) for item, value in items])
+            for item, value in items:
+                logging.info("testcase({name})->{action}({path}={value}) done".format(
+                    name=self.name, action=action, path=item.path, value=value))
+        except TestConfigError as e:
+            raise TestCaseError("testcase({name})->{action}({paths}) error[{code}]".format(
+                name=self.name, action=action, paths=','.join(item.path for item, _ in items), code=e.code))
+
+    def setup_config(self, configs = None):
+        configs = self.configs if configs is None else configs
+        self._apply_native('setup', [(item, item.value) for item in configs if item.path])
+        for item in configs:
+            if item.path:
+                continue
             try:
                 item.setup()
                 logging.info("testcase({name})->setup({cmd}) done".format(
@@ -169,8 +311,12 @@ class TestCase(object):
                 raise TestCaseError("testcase({name})->setup({cmd}) error[{code}]".format(
                     name=self.name, cmd=item.setup_cmd, code=e.code))
 
-    def reset_config(self):
-        for item in self.configs:
+    def reset_config(self, configs = None):
+        configs = self.configs if configs is None else configs
+        self._apply_native('reset', [(item, item.saved) for item in configs if item.path and item.saved is not None])
+        for item in configs:
+            if item.path:
+                continue
             try:
                 item.reset()
                 logging.info("testcase({name})->reset({cmd}) done".format(
@@ -211,23 +357,43 @@ class TestCase(object):
             logging.info('testcase({name})->clean({clean_cmd}) done'.format(
                 name=self.name, clean_cmd=self.clean_cmd))
 
-    def run(self): 
-        if self.test_cmd and len(self.test_cmd) > 0:
+    def run(self, ret_dir = None, fidelity = None): 
+        test_cmd = self._test_cmd.render(ret_dir = ret_dir, fidelity = fidelity)
+        if test_cmd and len(test_cmd) > 0:
             try:
-                logging.info("testcase({name})->run({test_cmd}) ...".format(name=self.name, test_cmd=self.test_cmd))
-                r = subproc_call(self.test_cmd)
+                logging.info("testcase({name})->run({test_cmd}) ...".format(name=self.name, test_cmd=test_cmd))
+                r = subproc_call(test_cmd)
                 if r.returncode:
                     if r.stdout:
                         logging.error(r.stderr)
                     if r.stderr:
                         logging.error(r.stderr)
                     raise TestCaseError("testcase({name})->run({test_cmd}) error {code}.".format(
-                        name=self.name, test_cmd=self.test_cmd, code=r))
-                logging.info("testcase({name})->run({test_cmd}) done".format(name=self.name, test_cmd=self.test_cmd))
+                        name=self.name, test_cmd=test_cmd, code=r))
+                logging.info("testcase({name})->run({test_cmd}) done".format(name=self.name, test_cmd=test_cmd))
                 return r.stdout
             except SubprocessError as e:
                 raise TestCaseError("testcase({name})->run({test_cmd}) error {code}.".format(
-                    name=self.name, test_cmd=self.test_cmd, code=e))
+                    name=self.name, test_cmd=test_cmd, code=e))
+
+    def spawn(self, cwd, prefix = '', ret_dir = None, fidelity = None, stdout = None):
+        """
+        在cwd中启动一个测试副本, 不等待结束
+        :param prefix: 命令前缀, 如绑定CPU的"taskset -c 3"
+        :param stdout: 保存输出的文件
+        :return: subprocess.Popen
+        """
+        test_cmd = self._test_cmd.render(ret_dir = ret_dir, fidelity = fidelity)
+        if prefix:
+            # 整条命令(可能含管道、重定向)在绑定后的shell中运行
+            test_cmd = '{prefix} sh -c {cmd}'.format(prefix=prefix, cmd=shlex.quote(test_cmd))
+        logging.info("testcase({name})->spawn({test_cmd}) in {cwd}".format(name=self.name, test_cmd=test_cmd, cwd=cwd))
+        try:
+            return subprocess.Popen(test_cmd, shell=True, cwd=cwd, stdout=stdout, stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+        except (OSError, SubprocessError) as e:
+            raise TestCaseError("testcase({name})->spawn({test_cmd}) error {code}.".format(
+                name=self.name, test_cmd=test_cmd, code=e))
 
     def __str__(self):
         data = "testcase(name:%s)\n" % self.name
@@ -240,6 +406,10 @@ class TestCase(object):
 
     def to_data(self):
         data = { 'name' : self.name, 'build' : self.build_cmd, 'clean' : self.clean_cmd, 'run' : self.test_cmd_raw }
+        if self.warmup is not None:
+            data['warmup'] = self.warmup
+        if self.parallel is not None:
+            data['parallel'] = self.parallel
         configs = []
         for e in self.configs:
             configs.append(e.to_data())
@@ -247,6 +417,57 @@ class TestCase(object):
         return data
 
 
+class TestCaseGroup(object):
+    """
+    一个testcase配置展开的测试用例, 遍历时才调用factory逐个生成
+    """
+    def __init__(self, count, factory):
+        """
+        :param count: 测试用例数量
+        :param factory: 返回测试用例迭代器(或列表)的函数
+        """
+        self.count = count
+        self.factory = factory
+        self.warmup = None
+        self.parallel = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for tcase in self.factory():
+            tcase.warmup = self.warmup
+            tcase.parallel = self.parallel
+            yield tcase
+
+
+class TestCaseList(object):
+    """
+    方案的测试用例序列. 全组合展开的测试用例数量可能很大, 只保存各组的生成方法:
+        len(testcases)              测试用例总数, 无需展开
+        for tcase in testcases:     逐个生成, 内存占用与测试用例总数无关
+    """
+    def __init__(self):
+        self.groups = []
+
+    def append(self, tcase):
+        self.groups.append(TestCaseGroup(1, lambda: [tcase]))
+
+    def extend_lazy(self, count, factory):
+        self.groups.append(TestCaseGroup(count, factory))
+
+    def __len__(self):
+        return sum(len(group) for group in self.groups)
+
+    def __iter__(self):
+        ordinal = 0
+        for group in self.groups:
+            for tcase in group:
+                tcase.ordinal = ordinal
+                ordinal += 1
+                yield tcase
+
+
 class Scheme(object):
     def __init__(self):
         self.project = ''                 # 项目名称 
@@ -259,12 +480,18 @@ class Scheme(object):
         self.tool_tgz = ''
         self.tool_dir = ''
         self.tool_decompression = ''
+        self.extract_cache = None          # 解压缓存(ExtractCache)
         self.log_level = 'info'                # 日志级别
         self.log_file = 'kytuning.log'
         self.rpm_list = []
         self.configs = []
         self.maxiterations = 1
-        self.testcases = []
+        self.adaptive = None               # 自适应迭代次数: {min_iterations, max_iterations, cv, ci, metric}
+        self.warmup = 0                    # 预热迭代次数, 结果不计入统计
+        self.parallel = None               # 并行运行副本: {copies, pin, cpus}, 用于单线程测试
+        self.fidelity = None               # 测试命令中{fidelity}的取值(完整测试)
+        self.screening = None              # 逐轮筛选: {fidelity: [...], keep, metric, goal}
+        self.testcases = TestCaseList()
 
     def to_data(self):
         data = { 'project': self.project, 'test_type' : self.test_type, 'rpm_list' : self.rpm_list }
@@ -274,7 +501,10 @@ class Scheme(object):
         data['configs'] = configs
         return data
 
-    def prepare(self):
+    def prepare(self, exclude = ()):
+        """
+        :param exclude: 测试工具目录中的测试结果目录, 判断目录是否被修改时不计入
+        """
         for k, v in {"base_path": self.base_path, "run_path": self.run_path, "ret_raw_path": self.ret_raw_path, "src_path": self.src_path}.items():
             if len(v) == 0:
                 continue
@@ -290,7 +520,13 @@ class Scheme(object):
         log_init(self.log_file, self.log_level)
 
         if self.tool_dir:
-            if not os.path.exists(self.tool_dir):
+            cache = self.extract_cache
+            if cache is not None and os.path.exists(self.tool_dir) and cache.stale(self.tool_tgz, self.tool_dir):
+                logging.info('{tool_tgz} changed, remove {tool_dir}'.format(tool_tgz=self.tool_tgz, tool_dir=self.tool_dir))
+                shutil.rmtree(self.tool_dir)
+            if cache is not None and cache.restore(self.tool_tgz, self.tool_dir, exclude):
+                logging.info('extract cache: {tool_dir} ready'.format(tool_dir=self.tool_dir))
+            elif not os.path.exists(self.tool_dir):
                 if self.tool_decompression:
                     logging.info('exec({tool_dec}) ...'.format(tool_dec=self.tool_decompression))
                     try:
@@ -298,6 +534,8 @@ class Scheme(object):
                         if r.returncode:
                             raise SchemeError("exec({tool_dec}) error {code}.".format(tool_dec=self.tool_decompression, code=r))
                         logging.info('exec({tool_dec}) done'.format(tool_dec=self.tool_decompression))
+                        if cache is not None:
+                            cache.extracted(self.tool_tgz, self.tool_dir)
                     except SubprocessError as e:
                         raise SchemeError("exec({tool_dec}) error {code}.".format(tool_dec=self.tool_decompression, code=e))
             try:
@@ -312,6 +550,9 @@ class Scheme(object):
     def get_test_type(self):
         return self.test_type
 
+    def get_adaptive(self):
+        return self.adaptive
+
     def get_base_path(self):
         return self.base_path
 
@@ -348,6 +589,22 @@ class Scheme(object):
     def get_maxiterations(self):
         return self.maxiterations
 
+    def get_fidelity(self):
+        return self.fidelity
+
+    def get_screening(self):
+        return self.screening
+
+    def get_warmup(self, tcase = None):
+        if tcase is not None and tcase.warmup is not None:
+            return tcase.warmup
+        return self.warmup
+
+    def get_parallel(self, tcase = None):
+        if tcase is not None and tcase.parallel is not None:
+            return tcase.parallel or None
+        return self.parallel
+
     def get_testcases(self):
         return self.testcases
 
@@ -363,6 +620,7 @@ class Scheme(object):
         data += "\ttool_dir    : {value}\n".format(value=self.tool_dir) 
         data += "\ttool_decompression   : {value}\n".format(value=self.tool_decompression)
         data += "\tmaxiterations        : {value}\n".format(value=self.maxiterations)
+        data += "\twarmup               : {value}\n".format(value=self.warmup)
         data += "\trpm_list    : {rpm_list}\n".format(rpm_list=str(self.rpm_list))
         data += "configs:\n"
         for item in self.configs:
@@ -419,6 +677,8 @@ class SchemeParser(object):
             if value is None:
                 raise SchemeParserError("missing 'tool_decompression'")
 
+            scheme.extract_cache = ExtractCache(self.config.base_path, self.config.get_main('extract_pristine'))
+
             scheme.tool_decompression = TestCmd(value, {"tool_tgz": scheme.tool_tgz, "tool_dir": scheme.tool_dir,
                         "base_path": scheme.base_path, "src_path": scheme.src_path}).cmd
 
@@ -432,6 +692,22 @@ class SchemeParser(object):
 
             scheme.maxiterations = data.get('maxiterations', 1)
 
+            scheme.warmup = self.parse_warmup(data)
+
+            scheme.parallel = self.parse_parallel(data)
+
+            scheme.fidelity = data.get('fidelity')
+
+            value = data.get('screening')
+            if value is not None:
+                scheme.screening = self.parse_screening(scheme, value)
+
+            value = data.get('adaptive')
+            if value is not None:
+                if not isinstance(value, dict):
+                    raise SchemeParserError("invalid 'adaptive': {value}".format(value=value))
+                scheme.adaptive = value
+
             scheme.rpm_list = data.get('rpm_list', [])
 
             value = data.get('configs')
@@ -450,23 +726,90 @@ class SchemeParser(object):
             logging.error(e)
             raise SchemeParserError(str(e))
 
+    def parse_tunable_path(self, conf):
+        """
+        参数的直接读写路径: 配置了path(文件路径或sysctl参数名)时使用path;
+        tunable_native开启时, 单条"sysctl -w key={value}"的设置命令也改为直接读写/proc/sys,
+        vm.drop_caches等只写(不可读回校验)的参数仍使用设置命令
+        """
+        try:
+            value = conf.get('path')
+            if value:
+                return tunable_path(str(value))
+            key = sysctl_key(conf.get('set'))
+            if key and self.config.get_main('tunable_native') is not False:
+                path = tunable_path(key)
+                if os.access(path, os.R_OK | os.W_OK):
+                    return path
+        except TunableError as e:
+            raise SchemeParserError(str(e))
+        return None
+
     def parse_global_config(self, scheme, data):
         for item in data:
             name = item.get('name')
             if name is None:
                 continue
             desc = item.get('desc', '')
+            path = self.parse_tunable_path(item)
             get_cmd = item.get('get')
-            if get_cmd is None: 
+            if get_cmd is None and path is None: 
                 continue
             set_cmd = item.get('set')
-            if set_cmd is None:
+            if set_cmd is None and path is None:
                 continue
             value = item.get('value')
             if value is None:
                 continue
-            scheme.configs.append(TestConfig(name, desc, get_cmd, set_cmd, value))
-
+            scheme.configs.append(TestConfig(name, desc, get_cmd, set_cmd, value, path))
+
+
+    def parse_screening(self, scheme, data):
+        if not isinstance(data, dict):
+            raise SchemeParserError("invalid 'screening': {value}".format(value=data))
+        if scheme.fidelity is None:
+            raise SchemeParserError("'screening' requires 'fidelity'")
+        fidelity = data.get('fidelity')
+        if not isinstance(fidelity, list) or len(fidelity) == 0:
+            raise SchemeParserError("invalid 'fidelity' in screening: {value}".format(value=fidelity))
+        keep = data.get('keep', 0.5)
+        if not isinstance(keep, (int, float)) or not 0 < keep < 1:
+            raise SchemeParserError("invalid 'keep' in screening: {value}".format(value=keep))
+        goal = data.get('goal', 'max')
+        if goal not in ('max', 'min'):
+            raise SchemeParserError("invalid 'goal' in screening: {value}".format(value=goal))
+        return {'fidelity': fidelity, 'keep': keep, 'goal': goal, 'metric': data.get('metric')}
+
+    def parse_warmup(self, data, default = 0):
+        value = data.get('warmup')
+        if value is None:
+            return default
+        if type(value) != int or value < 0:
+            raise SchemeParserError("invalid 'warmup': {value}".format(value=value))
+        return value
+
+    def parse_parallel(self, data, default = None):
+        """
+        parallel: {copies: 副本数(0为每个物理核/NUMA节点一个), pin: core/numa/none, cpus: 可用的CPU列表}
+        testcase中为false时不并行运行
+        """
+        value = data.get('parallel')
+        if value is None:
+            return default
+        if value is False:
+            return {}
+        if not isinstance(value, dict):
+            raise SchemeParserError("invalid 'parallel': {value}".format(value=value))
+        copies = value.get('copies', 0)
+        if type(copies) != int or copies < 0:
+            raise SchemeParserError("invalid 'copies' in parallel: {value}".format(value=copies))
+        pin = value.get('pin', 'core')
+        if pin not in ('core', 'numa', 'none'):
+            raise SchemeParserError("invalid 'pin' in parallel: {value}".format(value=pin))
+        if pin == 'none' and copies == 0:
+            raise SchemeParserError("'parallel' with pin 'none' requires 'copies'")
+        cpus = value.get('cpus')
+        return {'copies': copies, 'pin': pin, 'cpus': None if cpus is None else str(cpus)}
 
     def parse_testcases(self, scheme, datas):
         if datas is None or len(datas) == 0:
@@ -488,7 +831,11 @@ class SchemeParser(object):
                 logging.error('missing \'run\' in testcase: {data}'.format(data=data))
                 raise SchemeParserError("missing 'run' in testcase")
 
+            testcmd = TestCmd(testcmd)
+            if testcmd.uses('fidelity') and scheme.fidelity is None:
+                raise SchemeParserError("missing 'fidelity' for {fidelity} in testcase")
             tname = data.get('name')
+            count = len(scheme.testcases.groups)
 
             value = data.get('configs')
             if value is None or len(value) == 0:
@@ -496,10 +843,18 @@ class SchemeParser(object):
             else:
                 configs = self.parse_testcase_config(value)
                 flag = data.get('schemeflag') 
-                if flag:
+                if flag == 'search':
+                    self.parse_testcase_search(scheme, tname, clean, build, testcmd, configs, data.get('search'))
+                elif flag:
                     self.parse_testcase_asm(scheme, tname, clean, build, testcmd, configs)
                 else:
                     self.parse_testcase_sum(scheme, tname, clean, build, testcmd, configs)
+
+            warmup = self.parse_warmup(data, None)
+            parallel = self.parse_parallel(data, None)
+            for group in scheme.testcases.groups[count:]:
+                group.warmup = warmup
+                group.parallel = parallel
         pass
 
     def parse_testcase_config(self, confs):
@@ -510,11 +865,12 @@ class SchemeParser(object):
             if name is None:
                 continue
 
+            path = self.parse_tunable_path(conf)
             get_cmd = conf.get('get') 
-            if get_cmd is None:
+            if get_cmd is None and path is None:
                 continue
             set_cmd = conf.get('set')
-            if set_cmd is None: 
+            if set_cmd is None and path is None: 
                 continue
             desc = conf.get('desc', '')
 
@@ -526,19 +882,30 @@ class SchemeParser(object):
                 if values is None:
                     continue
                 for value in values:
-                    test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value))
+                    test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value, path))
             elif typ == 'continuous':
                 values = conf.get('values') 
                 if values and (len(values) == 2 or len(values) == 3):
                     for value in range(*values):
-                        test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value))
+                        test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value, path))
                 items = conf.get('items')
                 if items:
                     for value in items:
-                        test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value))
+                        test_config.append(TestConfig(name, desc, get_cmd, set_cmd, value, path))
             else:
                 continue
 
+            refine = conf.get('refine')
+            if refine is not None and (typ != 'continuous' or not isinstance(refine, dict)):
+                raise SchemeParserError("invalid 'refine' of config {name}: {value}".format(name=name, value=refine))
+
+            cost = conf.get('cost', 1)
+            if not isinstance(cost, (int, float)) or cost < 0:
+                raise SchemeParserError("invalid 'cost' of config {name}: {cost}".format(name=name, cost=cost))
+            for tc in test_config:
+                tc.cost = cost
+                tc.refine = refine
+
             if len(test_config) > 0:
                 data[name] = test_config
 
@@ -547,6 +914,9 @@ class SchemeParser(object):
     def parse_testcase_sum(self, scheme, tname, clean, build, testcmd, data):
         for key in data.keys():
             configs = data[key]
+            if configs[0].refine is not None:
+                self.parse_testcase_refine(scheme, tname, clean, build, testcmd, key, configs)
+                continue
             for idx in range(len(configs)):
                 name = "{project}-{config}-{index}".format(
                         project=(scheme.project if tname is None else "{}-{}".format(scheme.project, tname)), config=key, index=idx)
@@ -555,22 +925,85 @@ class SchemeParser(object):
                 scheme.testcases.append(testcase)
 
     def parse_testcase_asm(self, scheme, tname, clean, build, testcmd, data):
-        result = [] 
-        for item in data.values(): 
-            if len(result) == 0: 
-                result = item
-                continue
-            it = itertools.product(item, result)
-            result.clear()
-            for m, n in it:
-                if isinstance(n, tuple):
-                    result.append((m, *n))
-                else:
-                    result.append((m, n))
-
-        for idx in range(len(result)):
-            name = "{project}-assemble-{index}".format(project=(scheme.project if tname is None else "{project}-{tname}".format(scheme.project, tname)), index=idx)
-            testcase = TestCase(name, clean, build, testcmd)
-            for tc in result[idx]:
+        # 格雷码顺序下相邻测试用例只有一个参数取值不同; 按切换代价排序, 代价低的参数变化最频繁
+        names = list(data.keys())
+        keys = sorted(names, key = lambda key: max(tc.cost for tc in data[key]))
+        values = [data[key] for key in keys]
+        project = scheme.project if tname is None else "{project}-{tname}".format(project=scheme.project, tname=tname)
+
+        def expand():
+            for idx, configs in enumerate(gray_product(values)):
+                name = "{project}-assemble-{index}".format(project=project, index=idx)
+                testcase = TestCase(name, clean, build, testcmd)
+                for tc in sorted(configs, key = lambda tc: names.index(tc.name)):
+                    testcase.add_config(tc)
+                yield testcase
+
+        count = 1
+        for item in values:
+            count *= len(item)
+        scheme.testcases.extend_lazy(count, expand)
+
+    def parse_testcase_search(self, scheme, tname, clean, build, testcmd, data, conf):
+        if scheme.screening is not None:
+            raise SchemeParserError("'screening' can not be used with schemeflag 'search'")
+        if conf is None:
+            conf = {}
+        if not isinstance(conf, dict):
+            raise SchemeParserError("invalid 'search': {value}".format(value=conf))
+        names = list(data.keys())
+        project = scheme.project if tname is None else "{project}-{tname}".format(project=scheme.project, tname=tname)
+        try:
+            tuner = Tuner([len(data[key]) for key in names], conf.get('strategy', 'random'), conf.get('budget', 20),
+                          conf.get('goal', 'max'), conf.get('seed', 0), conf.get('startup'),
+                          "{project}-search".format(project=project), conf.get('metric'))
+        except (ValueError, TypeError) as e:
+            raise SchemeParserError("invalid 'search': {err}".format(err=e))
+
+        def expand():
+            # 下一组取值依赖上一次的测试结果, 须在上一个测试用例完成后再生成
+            for idx in range(tuner.budget):
+                point = tuner.propose()
+                if point is None:
+                    return
+                testcase = TestCase("{project}-search-{index}".format(project=project, index=idx), clean, build, testcmd)
+                for key, value in zip(names, point):
+                    testcase.add_config(data[key][value])
+                testcase.trial = (tuner, point)
+                yield testcase
+
+        scheme.testcases.extend_lazy(tuner.budget, expand)
+
+    def parse_testcase_refine(self, scheme, tname, clean, build, testcmd, key, configs):
+        """
+        连续参数由粗到细搜索: 先测试粗粒度网格(values/items), 再在最优点附近细分,
+        每个取值都是一个普通的测试用例
+        """
+        if scheme.screening is not None:
+            # 筛选须先展开全部测试用例, 细分的取值会在没有任何测试结果时盲目生成
+            raise SchemeParserError("'screening' can not be used with 'refine' of config {name}".format(name=key))
+        conf = configs[0].refine
+        project = scheme.project if tname is None else "{}-{}".format(scheme.project, tname)
+        first = configs[0]
+        try:
+            refiner = Refiner([tc.value for tc in configs], conf.get('resolution'), conf.get('budget', 20),
+                              conf.get('goal', 'max'), "{project}-{config}-refine".format(project=project, config=key),
+                              conf.get('metric'))
+        except (ValueError, TypeError) as e:
+            raise SchemeParserError("invalid 'refine' of config {name}: {err}".format(name=key, err=e))
+
+        def expand():
+            # 下一个取值依赖已有的测试结果, 须在上一个测试用例完成后再生成
+            for idx in range(refiner.budget):
+                value = refiner.propose()
+                if value is None:
+                    return
+                tc = TestConfig(first.name, first.desc, first.get_cmd, first.set_cmd, value, first.path)
+                tc.cost = first.cost
+                name = "{project}-{config}-{index}".format(project=project, config=key, index=idx)
+                testcase = TestCase(name, clean, build, testcmd)
                 testcase.add_config(tc)
-            scheme.testcases.append(testcase)
+                testcase.trial = (refiner, value)
+                yield testcase
+
+        scheme.testcases.extend_lazy(refiner.budget, expand)
@@ -0,0 +1,283 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import itertools
+
+__all__ = ['Tuner', 'Refiner']
+
+
+class Tuner(object):
+    """
+    搜索调优: 在各参数取值组成的空间中按策略选取下一组取值, 按目标指标找出最优组合.
+        tuner = Tuner([2, 3], 'tpe', budget = 20, goal = 'max')
+        while True:
+            point = tuner.propose()        # 各参数取值的下标, 搜索结束时返回None
+            if point is None:
+                break
+            tuner.observe(point, run(point))
+        tuner.best
+    策略:
+        random  在未测试过的组合中随机选取
+        hill    坐标爬山: 依次尝试当前最优点各参数的相邻取值, 有改进即移动, 邻域测完后随机重启
+        tpe     Tree-structured Parzen Estimator: 前startup次随机, 之后按目标值将已测组合分为
+                好/差两组, 按各参数取值在两组中的频率比选取最可能改进的组合
+    """
+    STRATEGIES = ('random', 'hill', 'tpe')
+
+    def __init__(self, sizes, strategy = 'random', budget = 20, goal = 'max', seed = 0, startup = None,
+                 name = None, metric = None):
+        """
+        :param sizes: 各参数的取值个数
+        :param budget: 最多测试的组合数
+        :param goal: max/min, 目标指标越大/越小越好
+        :param seed: 随机数种子, 相同种子与测试结果下选取的组合相同(--resume时可重现)
+        :param startup: tpe策略开始建模前随机测试的次数, 默认为预算的1/4(至少3次)
+        :param name: 名称, 用于保存搜索记录
+        :param metric: 目标指标的键路径, 为空时取测试工具的主指标
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError('unknown search strategy: {strategy}'.format(strategy = strategy))
+        if goal not in ('max', 'min'):
+            raise ValueError('unknown search goal: {goal}'.format(goal = goal))
+        self.name = name
+        self.metric = metric
+        self.sizes = list(sizes)
+        self.space = 1
+        for size in self.sizes:
+            self.space *= size
+        self.strategy = strategy
+        self.budget = min(budget, self.space)
+        self.goal = goal
+        self.startup = startup if startup is not None else max(3, self.budget // 4)
+        self.rand = random.Random(seed)
+        self.proposed = 0
+        self.seen = set()
+        self.history = []          # [(point, value, info), ...]
+        self.best = None           # {'trial', 'point', 'objective', ...}
+        # hill
+        self.incumbent = None
+        self.incumbent_value = None
+        self.neighbors = []
+
+    def better(self, a, b) -> bool:
+        """
+        目标值a是否优于b, 无法取得的目标值(None)最差
+        """
+        if a is None:
+            return False
+        if b is None:
+            return True
+        return a > b if self.goal == 'max' else a < b
+
+    def propose(self):
+        if self.proposed >= self.budget or len(self.seen) >= self.space:
+            return None
+        if self.strategy == 'hill':
+            point = self._propose_hill()
+        elif self.strategy == 'tpe' and len(self.history) >= self.startup:
+            point = self._propose_tpe()
+        else:
+            point = self._random_point()
+        self.seen.add(point)
+        self.proposed += 1
+        return point
+
+    def observe(self, point, value, info = None) -> dict:
+        """
+        记录一次测试结果
+        :param info: 随记录保存的附加信息, 如测试用例名称及参数取值
+        :return: 本次测试及当前最优组合的记录
+        """
+        record = dict(info or {})
+        record.update({'trial': len(self.history), 'point': list(point), 'objective': value})
+        self.history.append((point, value, record))
+        if self.best is None or self.better(value, self.best['objective']):
+            self.best = record
+        if self.strategy == 'hill' and (self.incumbent is None or self.better(value, self.incumbent_value)):
+            self.incumbent = point
+            self.incumbent_value = value
+            self.neighbors = self._neighbors(point)
+        return dict(record, best = self.best)
+
+    def records(self) -> list:
+        return [record for _, _, record in self.history]
+
+    def _random_point(self):
+        for _ in range(64):
+            point = tuple(self.rand.randrange(size) for size in self.sizes)
+            if point not in self.seen:
+                return point
+        # 空间中大部分组合已测试过, 逐个查找
+        rest = [point for point in itertools.product(*[range(size) for size in self.sizes]) if point not in self.seen]
+        return self.rand.choice(rest)
+
+    def _neighbors(self, point) -> list:
+        ret = []
+        for dim, size in enumerate(self.sizes):
+            for step in (-1, 1):
+                idx = point[dim] + step
+                if 0 <= idx < size:
+                    ret.append(point[:dim] + (idx,) + point[dim + 1:])
+        self.rand.shuffle(ret)
+        return ret
+
+    def _propose_hill(self):
+        if self.incumbent is None:
+            return self._random_point()
+        while len(self.neighbors) > 0:
+            point = self.neighbors.pop(0)
+            if point not in self.seen:
+                return point
+        # 局部最优, 随机重启
+        self.incumbent = None
+        self.incumbent_value = None
+        return self._random_point()
+
+    def _propose_tpe(self, gamma = 0.25, candidates = 24):
+        order = sorted(self.history, key = self._sort_key)
+        ngood = max(1, int(math.ceil(gamma * len(order))))
+        good = [point for point, _, _ in order[:ngood]]
+        bad = [point for point, _, _ in order[ngood:]]
+        # 各参数取值在好/差两组中的频率(加1平滑)
+        lgood = [[1.0] * size for size in self.sizes]
+        lbad = [[1.0] * size for size in self.sizes]
+        for point in good:
+            for dim, idx in enumerate(point):
+                lgood[dim][idx] += 1
+        for point in bad:
+            for dim, idx in enumerate(point):
+                lbad[dim][idx] += 1
+        best = None
+        for _ in range(candidates):
+            point = tuple(self.rand.choices(range(size), weights = lgood[dim])[0]
+                          for dim, size in enumerate(self.sizes))
+            if point in self.seen:
+                continue
+            score = sum(math.log(lgood[dim][idx] / sum(lgood[dim])) - math.log(lbad[dim][idx] / sum(lbad[dim]))
+                        for dim, idx in enumerate(point))
+            if best is None or score > best[0]:
+                best = (score, point)
+        return best[1] if best is not None else self._random_point()
+
+    def _sort_key(self, item):
+        value = item[1]
+        if value is None:
+            return (1, 0)
+        return (0, -value if self.goal == 'max' else value)
+
+
+class Refiner(object):
+    """
+    连续参数的由粗到细搜索: 先测试粗粒度网格上的取值, 再在最优网格点两侧的区间内
+    按黄金分割法缩小区间, 直到区间宽度不大于resolution或达到测试次数上限.
+        refiner = Refiner([0, 500000, 1000000], resolution = 10000, budget = 20)
+        while True:
+            value = refiner.propose()      # 下一个要测试的取值, 搜索结束时返回None
+            if value is None:
+                break
+            refiner.observe(value, run(value))
+    接口与Tuner相同, 测试结果同样保存为搜索记录.
+    """
+    RATIO = (3 - math.sqrt(5)) / 2         # 黄金分割比 0.382
+
+    def __init__(self, grid, resolution = None, budget = 20, goal = 'max', name = None, metric = None):
+        """
+        :param grid: 粗粒度网格上的取值
+        :param resolution: 目标精度, 默认为整数取值时1, 否则为网格间距的1/100
+        :param budget: 最多测试的取值个数(包括网格)
+        :param goal: max/min, 目标指标越大/越小越好
+        """
+        if goal not in ('max', 'min'):
+            raise ValueError('unknown search goal: {goal}'.format(goal = goal))
+        if len(grid) == 0:
+            raise ValueError('empty grid')
+        self.grid = sorted(grid)
+        self.integer = all(isinstance(v, int) for v in self.grid)
+        if resolution is None:
+            step = (self.grid[-1] - self.grid[0]) / max(len(self.grid) - 1, 1)
+            resolution = 1 if self.integer else step / 100
+        self.resolution = resolution
+        self.budget = max(budget, len(self.grid))
+        self.goal = goal
+        self.name = name
+        self.metric = metric
+        self.proposed = 0
+        self.values = {}           # 取值 -> 目标值
+        self.history = []
+        self.best = None
+        self.steps = self._search()
+
+    def better(self, a, b) -> bool:
+        if a is None:
+            return False
+        if b is None:
+            return True
+        return a > b if self.goal == 'max' else a < b
+
+    def propose(self):
+        if self.proposed >= self.budget:
+            return None
+        try:
+            value = next(self.steps)
+        except StopIteration:
+            return None
+        self.proposed += 1
+        return value
+
+    def observe(self, point, value, info = None) -> dict:
+        record = dict(info or {})
+        record.update({'trial': len(self.history), 'point': point, 'objective': value})
+        self.values[point] = value
+        self.history.append(record)
+        if self.best is None or self.better(value, self.best['objective']):
+            self.best = record
+        return dict(record, best = self.best)
+
+    def records(self) -> list:
+        return list(self.history)
+
+    def _round(self, value):
+        return int(round(value)) if self.integer else value
+
+    def _better_point(self, a, b):
+        return a if not self.better(self.values.get(b), self.values.get(a)) else b
+
+    def _search(self):
+        for value in self.grid:
+            yield value
+        # 最优网格点两侧的网格点构成初始区间
+        best = self.grid[0]
+        for value in self.grid:
+            best = self._better_point(best, value)
+        idx = self.grid.index(best)
+        a = self.grid[max(idx - 1, 0)]
+        b = self.grid[min(idx + 1, len(self.grid) - 1)]
+        c = self._round(a + self.RATIO * (b - a))
+        d = self._round(b - self.RATIO * (b - a))
+        while b - a > self.resolution:
+            if c >= d:
+                # 整数区间已不能再分割, 测试剩余的取值
+                for value in (range(a, b + 1) if self.integer else []):
+                    if value not in self.values:
+                        yield value
+                return
+            for value in (c, d):
+                if value not in self.values:
+                    yield value
+            # 保留的内点沿用, 每次只需测试一个新的取值
+            if self._better_point(c, d) == c:
+                b, d = d, c
+                c = self._round(a + self.RATIO * (b - a))
+            else:
+                a, c = c, d
+                d = self._round(b - self.RATIO * (b - a))
+            if c > d:
+                c, d = d, c
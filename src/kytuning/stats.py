@@ -0,0 +1,114 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+__all__ = ['mean', 'stdev', 'cv', 'ci_halfwidth', 'StopRule']
+
+
+# 双侧95%置信度的t分布临界值, 下标为自由度, 自由度大于30时取1.96
+_T95 = [None,
+        12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def mean(values) -> float:
+    return sum(values) / len(values)
+
+
+def stdev(values) -> float:
+    """
+    样本标准差
+    """
+    if len(values) < 2:
+        return 0.0
+    m = mean(values)
+    return math.sqrt(sum((v - m) ** 2 for v in values) / (len(values) - 1))
+
+
+def cv(values) -> float:
+    """
+    变异系数(标准差/均值)
+    """
+    m = mean(values)
+    return stdev(values) / abs(m) if m else float('inf')
+
+
+def ci_halfwidth(values) -> float:
+    """
+    均值95%置信区间的半宽
+    """
+    n = len(values)
+    if n < 2:
+        return float('inf')
+    t = _T95[n - 1] if n - 1 < len(_T95) else 1.96
+    return t * stdev(values) / math.sqrt(n)
+
+
+class StopRule(object):
+    """
+    自适应迭代次数的停止规则: 至少运行min_iterations次, 之后主指标的变异系数
+    不大于cv, 或95%置信区间半宽与均值之比不大于ci时停止, 最多运行max_iterations次.
+        rule = StopRule(3, 10, cv = 0.02)
+        while not rule.done():
+            rule.add(run_once())
+        rule.decision()
+    """
+
+    def __init__(self, min_iterations = 3, max_iterations = 10, cv = None, ci = None):
+        self.min_iterations = max(min_iterations, 1)
+        self.max_iterations = max(max_iterations, self.min_iterations)
+        self.cv = cv
+        self.ci = ci
+        self.iterations = 0
+        self.samples = []
+        self.reason = None
+
+    def add(self, value):
+        """
+        :param value: 本次迭代的主指标, 无法解析时为None
+        """
+        self.iterations += 1
+        if value is not None:
+            self.samples.append(value)
+
+    def _check(self):
+        if self.iterations >= self.max_iterations:
+            return 'max_iterations'
+        if self.iterations < self.min_iterations or len(self.samples) < 2:
+            return None
+        m = mean(self.samples)
+        if self.cv is not None and cv(self.samples) <= self.cv:
+            return 'cv'
+        if self.ci is not None and m and ci_halfwidth(self.samples) / abs(m) <= self.ci:
+            return 'ci'
+        return None
+
+    def done(self) -> bool:
+        self.reason = self._check()
+        return self.reason is not None
+
+    def decision(self) -> dict:
+        ret = {
+            'iterations':     self.iterations,
+            'min_iterations': self.min_iterations,
+            'max_iterations': self.max_iterations,
+            'target_cv':      self.cv,
+            'target_ci':      self.ci,
+            'samples':        self.samples,
+            'reason':         self.reason or self._check() or 'stopped',
+        }
+        if len(self.samples) > 0:
+            m = mean(self.samples)
+            ret['mean'] = m
+            ret['stdev'] = stdev(self.samples)
+            ret['cv'] = cv(self.samples) if len(self.samples) > 1 else None
+            ret['ci'] = ci_halfwidth(self.samples) / abs(m) if len(self.samples) > 1 and m else None
+        return ret
@@ -6,12 +6,23 @@
  * Date: Fri Dec 8 17:18:33 2023 +0800
 """
 import os
+import sys
 import json
+import math
+import time
+import shutil
 import logging
 from .scheme import *
 from .error import *
 from .report import *
-from .getenv import EnvManager 
+from .getenv import EnvManager, EnvCache, host_fingerprint
+from .cache import BuildCache, ResultCache, tree_manifest
+from .affinity import AffinityError, allocate_slots
+from .checkpoint import Checkpoint
+from .rollback import RollbackJournal
+from .transition import ConfigTransition
+from .timing import TimingHistory
+from .stats import StopRule, mean
 from .dependency import DependencyManager 
 from .scheme import subproc_call 
 from .config import KYConfig
@@ -27,6 +38,16 @@ class BaseTest(object):
         self.config = KYConfig()
         self.scheme = scheme
         self.depmgr = None
+        self.buildcache = None
+        self.resultcache = None
+        self.host_digest = None
+        self.checkpoint = None
+        self.rollback = None
+        self.transition = None
+        self.timings = None
+        self.parallel_slots = {}            # parallel配置 -> 各副本绑定的CPU
+        self.parallel_copies = {}           # 副本工作目录 -> 复制时工具目录的文件清单
+        self.result_names = {}              # 测试用例名称 -> 第一个使用该名称的测试用例序号
         self.report = None
         self.result = None
         self.result_folder = [] # ["./results", "./result"]
@@ -39,10 +60,27 @@ class BaseTest(object):
         self.depmgr = DependencyManager(self.scheme.get_rpm_list())
         self.report = Report(self.scheme.get_base_path())
         self.report.path_init()
+        self.buildcache = BuildCache(self.scheme.get_tool_dir(), self.result_folder,
+                                     self.config.get_main('build_cache') is not False,
+                                     self.config.get_main('rebuild') is True)
+        # 环境信息及复用的测试结果与结果表格共用同一个blob目录
+        self.resultcache = ResultCache(os.path.join(self.config.base_path, 'result_cache'),
+                                       self.report.blobs,
+                                       self.config.get_main('result_cache_ttl'),
+                                       self.config.get_main('fresh') is True)
+        self.checkpoint = Checkpoint(self.report.current_result_dir)
+        self.rollback = RollbackJournal(self.config.base_path)
+        self.transition = ConfigTransition(self.rollback)
+        self.timings = TimingHistory(self.config.base_path)
 
     def _collect_env(self):
         try:
-            data = EnvManager().collect()
+            cache = EnvCache(os.path.join(self.config.base_path, 'env_cache.json'),
+                             self.config.get_main('env_cache_ttl'))
+            data = EnvManager(timeout = self.config.get_main('env_probe_timeout'),
+                              workers = self.config.get_main('env_probe_workers') or 8,
+                              cache = cache,
+                              blobs = self.report.blobs).collect()
             if data:
                 self.report_data["env"] = data
         except:
@@ -63,9 +101,16 @@ class BaseTest(object):
             logging.warning('uninstall dependent rpms failed.')
         pass
 
+    def _scheme_owner(self):
+        return 'scheme:{project}'.format(project=self.scheme.get_project())
+
     def _setup_config(self):
         try:
-            for item in self.scheme.get_configs():
+            configs = self.scheme.get_configs()
+            for item in configs:
+                item.save()
+            self.rollback.record(self._scheme_owner(), configs)
+            for item in configs:
                 item.setup()
         except:
             logging.warning('setup config failed.')
@@ -75,27 +120,329 @@ class BaseTest(object):
         try:
             for item in self.scheme.get_configs():
                 item.reset()
+            self.rollback.release(self._scheme_owner())
         except:
             logging.warning('reset config failed.')
         pass
 
+    def _record_timing(self, tcase, phase, start, fidelity = None, count = 1):
+        """
+        记录本阶段的耗时, 供--plan估算运行时间
+        """
+        if count > 0:
+            self.timings.record(self.scheme.get_test_type(), tcase, phase, (time.monotonic() - start) / count, fidelity)
+
+    def _switch_config(self, tcase):
+        """
+        切换到测试用例的参数取值
+        """
+        start = time.monotonic()
+        drop, change = self.transition.plan(tcase)
+        self.transition.apply(tcase, drop, change)
+        self._record_timing(tcase, 'setup', start, count = len(drop) + len(change))
+
+    def _restore_testcase_config(self):
+        """
+        测试用例之间只切换变化的参数, 全部测试结束后统一还原
+        """
+        try:
+            self.transition.restore()
+        except:
+            logging.warning('restore testcase config failed.')
+        pass
+
+    def _build(self, tcase):
+        """
+        编译测试工具, 编译命令与工具链未变且目录未被修改时复用上次的编译结果
+        """
+        if self.buildcache.hit(tcase):
+            logging.info("testcase({name})->build skipped, reuse cached build".format(name=tcase.name))
+            return
+        if self.buildcache.built():
+            # 上一个测试用例的编译产物与本用例不符, 先清理
+            tcase.clean()
+            self.buildcache.invalidate()
+        start = time.monotonic()
+        tcase.build()
+        self._record_timing(tcase, 'build', start)
+        self.buildcache.record(tcase)
+
+    def _clean(self, tcase, built):
+        if built and self.buildcache.enable:
+            # 保留编译产物供后续测试用例复用
+            self.buildcache.record(tcase)
+            return
+        self.buildcache.invalidate()
+        tcase.clean()
+
+    def _check_rollback(self):
+        """
+        检查上次测试异常退出时未还原的参数, --resume时直接还原, 否则询问是否还原;
+        未还原时不开始测试, 否则本次测试会把仍被修改的取值当作原始值记录, 测试结束后无法还原
+        """
+        pending = self.rollback.pending()
+        if len(pending) == 0:
+            return
+        names = [item.get('name') for _, items in pending for item in items]
+        logging.warning('tunables left modified by an interrupted test: {names}'.format(names=', '.join(names)))
+        restore = self.config.get_main('resume') is not None
+        if not restore and sys.stdin.isatty():
+            restore = input('restore them now? [Y/n] ').strip().lower() in ('', 'y', 'yes')
+        if not restore:
+            raise KyTuningError("tunables left modified by an interrupted test, run 'kytuning restore' first.")
+        if not self.rollback.restore():
+            raise KyTuningError('restore tunables failed, see {path}'.format(path=self.rollback.path))
+
+    def _result_name(self, tcase):
+        """
+        结果文件使用的测试用例名称, 名称重复的测试用例(如未命名的testcase)附加序号, 不覆盖同名测试用例的结果
+        """
+        first = self.result_names.setdefault(tcase.name, tcase.ordinal)
+        if first == tcase.ordinal:
+            return tcase.name
+        return '{name}.{ordinal}'.format(name=tcase.name, ordinal=tcase.ordinal)
+
+    def _resume_iteration(self, tcase, idx, maxit):
+        """
+        --resume时导出中断前已完成的迭代结果
+        :return 结果文件路径, 该次迭代未完成或未继续中断的测试时返回None
+        """
+        if not self.report.resumed:
+            return None
+        path = self.checkpoint.iteration_result(tcase, idx)
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, 'r') as fp:
+            data = fp.read()
+        tinf = self.scheme.to_data()
+        tinf['testcase'] = tcase.to_data()
+        self._export_result({"name": os.path.basename(path), "tinf": tinf, "data": data})
+        logging.info("###### resume: testcase\'s {idx}/{maxit} times already done".format(idx=idx+1, maxit=maxit))
+        return path
+
+    def _warmup(self, tcase):
+        """
+        运行预热迭代, 结果只归档到warmup目录, 不计入表格及统计
+        """
+        count = self.scheme.get_warmup(tcase)
+        for idx in range(count):
+            logging.info("###### warmup testcase\'s {idx}/{count} times...".format(idx=idx+1, count=count))
+            name = '{name}-warmup-{idx}'.format(name=self._result_name(tcase), idx=idx)
+            ret_dir = self._result_dir(tcase, name)
+            start = time.monotonic()
+            self.result = tcase.run(ret_dir, self.scheme.get_fidelity())
+            self._record_timing(tcase, 'warmup', start, self.scheme.get_fidelity())
+            tinf = self.scheme.to_data()
+            tinf['testcase'] = tcase.to_data()
+            self.report.save_warmup(name, tinf, self.find_and_read_result(ret_dir))
+            logging.info("###### warmup testcase\'s {idx}/{count} times done".format(idx=idx+1, count=count))
+
+    def _result_key(self, tcase):
+        """
+        测试结果复用的键: 测试命令、精度、测试用例及方案的参数取值、编译缓存键、工具压缩包及主机指纹
+        测试命令取c_param替换及pre_cmd包装后的命令(运行时模板变量保留占位符), 仅c_param不同的测试用例
+        (如unixbench的single/multi)不会共用结果
+        """
+        if not self.resultcache.enable or self.host_digest is None:
+            return None
+        return self.resultcache.key({
+            'test_type': self.scheme.get_test_type(),
+            'run':       tcase.test_cmd,
+            'fidelity':  self.scheme.get_fidelity(),
+            'configs':   [(item.name, item.path, item.setup_cmd) for item in tcase.configs],
+            'scheme':    [(item.name, item.path, item.setup_cmd) for item in self.scheme.get_configs()],
+            'rpm_list':  self.scheme.get_rpm_list(),
+            'build':     self.buildcache.key(tcase),
+            'tool':      self.scheme.extract_cache.digest(self.scheme.tool_tgz) if self.scheme.extract_cache else None,
+            'host':      self.host_digest,
+            'parallel':  self.scheme.get_parallel(tcase),
+        })
+
+    def _reuse_iteration(self, tcase, idx, maxit, data):
+        """
+        导出缓存中的测试结果, 代替运行测试
+        """
+        name = '{name}-{idx}'.format(name=self._result_name(tcase), idx=idx)
+        tinf = self.scheme.to_data()
+        tinf['testcase'] = tcase.to_data()
+        path = self._export_result({"name": name, "tinf": tinf, "data": data})
+        self.checkpoint.save_iteration(tcase, idx, path)
+        logging.info("###### reuse: testcase\'s {idx}/{maxit} times from result cache".format(idx=idx+1, maxit=maxit))
+        return path
+
+    def _stop_rule(self):
+        """
+        方案配置了adaptive时, 按主指标的稳定程度决定迭代次数
+        """
+        adaptive = self.scheme.get_adaptive()
+        if adaptive is None:
+            return None
+        cv = adaptive.get('cv')
+        ci = adaptive.get('ci')
+        if cv is None and ci is None:
+            cv = 0.02
+        return StopRule(adaptive.get('min_iterations', 3), adaptive.get('max_iterations', 10), cv, ci)
+
+    def _run_iteration(self, tcase, idx, maxit):
+        logging.info("###### run testcase\'s {idx}/{maxit} times...".format(idx=idx+1, maxit=maxit))
+        name = '{name}-{idx}'.format(name=self._result_name(tcase), idx=idx)
+        ret_dir = self._result_dir(tcase, name)
+        start = time.monotonic()
+        self.result = tcase.run(ret_dir, self.scheme.get_fidelity())
+        self._record_timing(tcase, 'run', start, self.scheme.get_fidelity())
+        tinf = self.scheme.to_data()
+        tinf['testcase'] = tcase.to_data()
+        data = self.find_and_read_result(ret_dir)
+        path = self._export_result({"name": name, "tinf": tinf, "data": data})
+        self.checkpoint.save_iteration(tcase, idx, path)
+        logging.info("###### run testcase\'s {idx}/{maxit} times done".format(idx=idx+1, maxit=maxit))
+        return path
+
+    def _parallel_slots(self, tcase):
+        """
+        测试用例配置了parallel时, 各副本绑定的CPU
+        :return 不并行运行时返回None
+        """
+        conf = self.scheme.get_parallel(tcase)
+        if conf is None:
+            return None
+        key = json.dumps(conf, sort_keys=True)
+        if key not in self.parallel_slots:
+            try:
+                slots = allocate_slots(conf['copies'], conf['pin'], conf['cpus'])
+            except AffinityError as e:
+                raise TestCaseError('testcase({name}) parallel: {err}'.format(name=tcase.name, err=e))
+            logging.info('parallel: {count} copies pinned by {pin}: {slots}'.format(
+                count=len(slots), pin=conf['pin'], slots=', '.join(slot['prefix'] or '-' for slot in slots)))
+            self.parallel_slots[key] = slots
+        return self.parallel_slots[key]
+
+    def _copy_dir(self, cidx):
+        return os.path.join(self.scheme.get_run_path(), 'parallel', 'copy{cidx}'.format(cidx=cidx))
+
+    def _prepare_copies(self, count):
+        """
+        各副本使用独立的工作目录: 编译后的工具目录的副本, 工具目录改变后重新复制
+        """
+        tool_dir = os.path.abspath(self.scheme.get_tool_dir())
+        exclude = set(os.path.normpath(p) for p in self.result_folder)
+        manifest = tree_manifest(tool_dir, exclude | {BuildCache.STAMP})
+
+        def ignore(path, names):
+            # 不复制结果目录
+            return [n for n in names if os.path.relpath(os.path.join(path, n), tool_dir) in exclude]
+
+        for cidx in range(count):
+            cdir = self._copy_dir(cidx)
+            if self.parallel_copies.get(cdir) == manifest and os.path.isdir(cdir):
+                continue
+            logging.info('parallel: copy {tool_dir} to {cdir}'.format(tool_dir=tool_dir, cdir=cdir))
+            if os.path.exists(cdir):
+                shutil.rmtree(cdir)
+            shutil.copytree(tool_dir, cdir, symlinks=True, ignore=ignore)
+            self.parallel_copies[cdir] = manifest
+
+    def _run_copies(self, tcase, idxs, slots, maxit):
+        """
+        同时运行多个副本, 每个副本绑定到不同的CPU、在独立的工作目录中运行, 结果各作为一次迭代
+        :param idxs: 各副本对应的迭代序号
+        :return {迭代序号: 结果文件路径}
+        """
+        logging.info("###### run testcase\'s {first}-{last}/{maxit} times in {count} copies...".format(
+            first=idxs[0]+1, last=idxs[-1]+1, maxit=maxit, count=len(idxs)))
+        self._check_ret_dir(tcase)
+        folder = os.path.normpath(self.result_folder[0]) if len(self.result_folder) > 0 else None
+        procs = []
+        start = time.monotonic()
+        try:
+            for cidx, idx in enumerate(idxs):
+                cdir = self._copy_dir(cidx)
+                name = '{name}-{idx}'.format(name=self._result_name(tcase), idx=idx)
+                ret_dir = None
+                if folder is not None:
+                    if tcase.uses_ret_dir:
+                        ret_dir = os.path.join(cdir, folder, name)
+                        if os.path.exists(ret_dir):
+                            shutil.rmtree(ret_dir)
+                    os.makedirs(ret_dir or os.path.join(cdir, folder), exist_ok=True)
+                out = open(os.path.join(cdir, '.kytuning-stdout'), 'w')
+                procs.append((idx, name, cdir, ret_dir, out,
+                              tcase.spawn(cdir, slots[cidx]['prefix'], ret_dir, self.scheme.get_fidelity(), out)))
+        finally:
+            failed = []
+            for idx, name, cdir, ret_dir, out, proc in procs:
+                if proc.wait():
+                    failed.append('{name}({code})'.format(name=name, code=proc.returncode))
+                out.close()
+        if len(failed) > 0:
+            raise TestCaseError("testcase({name})->run copies error: {failed}".format(name=tcase.name, failed=', '.join(failed)))
+        self._record_timing(tcase, 'run', start, self.scheme.get_fidelity())
+
+        ret = {}
+        tinf = self.scheme.to_data()
+        tinf['testcase'] = tcase.to_data()
+        for idx, name, cdir, ret_dir, out, proc in procs:
+            with open(out.name, 'r') as fp:
+                self.result = fp.read()
+            tdir = ret_dir or (os.path.join(cdir, folder) if folder is not None else None)
+            data = self.find_and_read_result(tdir)
+            ret[idx] = self._export_result({"name": name, "tinf": tinf, "data": data})
+            self.checkpoint.save_iteration(tcase, idx, ret[idx])
+        logging.info("###### run testcase\'s {first}-{last}/{maxit} times done".format(
+            first=idxs[0]+1, last=idxs[-1]+1, maxit=maxit))
+        return ret
+
     def _do_testcase(self, tcase):
+        """
+        逐轮运行测试用例, 每轮一次迭代; 配置了parallel时每轮同时运行多个副本, 每个副本的结果各为一次迭代
+        """
+        rule = self._stop_rule()
+        slots = self._parallel_slots(tcase)
+        copies = len(slots) if slots is not None else 1
+        if rule is not None:
+            maxit = rule.max_iterations
+            rounds = (maxit + copies - 1) // copies
+        else:
+            rounds = self.scheme.get_maxiterations()
+            maxit = rounds * copies
+        metric = self.scheme.get_adaptive().get('metric') if rule is not None else None
+        prepared = False
+        built = False
+        paths = []
+        key = self._result_key(tcase)
+        cached = self.resultcache.load(key) if key is not None else None
         try:
-            tcase.save_config()
-            tcase.setup_config()
-            tcase.build()
-            maxit = self.scheme.get_maxiterations()
-            for idx in range(maxit):
-                logging.info("###### run testcase\'s {idx}/{maxit} times...".format(idx=idx+1, maxit=maxit))
-
-                self.result = tcase.run()
-                name = '{name}-{idx}'.format(name=tcase.name, idx=idx)
+            for rnd in range(rounds):
+                if rule is not None and rule.done():
+                    break
+                idxs = list(range(rnd * copies, min((rnd + 1) * copies, maxit)))
+                got = {}
+                for idx in idxs:
+                    path = self._resume_iteration(tcase, idx, maxit)
+                    if path is None and cached is not None and idx < len(cached):
+                        path = self._reuse_iteration(tcase, idx, maxit, cached[idx])
+                    if path is not None:
+                        got[idx] = path
+                missing = [idx for idx in idxs if idx not in got]
+                if len(missing) > 0:
+                    if not prepared:
+                        prepared = True
+                        self._switch_config(tcase)
+                        self._build(tcase)
+                        built = True
+                        self._warmup(tcase)
+                        if slots is not None:
+                            self._prepare_copies(copies)
+                    if slots is not None:
+                        got.update(self._run_copies(tcase, missing, slots, maxit))
+                    else:
+                        got[missing[0]] = self._run_iteration(tcase, missing[0], maxit)
                 tinf = self.scheme.to_data()
                 tinf['testcase'] = tcase.to_data()
-                data = self.find_and_read_result()
-                self._export_result({"name": name, "tinf": tinf, "data": data})
-
-                logging.info("###### run testcase\'s {idx}/{maxit} times done".format(idx=idx+1, maxit=maxit))
+                for idx in idxs:
+                    paths.append(got[idx])
+                    if rule is not None:
+                        rule.add(self.report.metric_value(tinf, got[idx], metric))
         except TestCaseError as e:
             logging.error(e)
             raise e
@@ -103,27 +450,120 @@ class BaseTest(object):
             logging.error(e)
             raise e
         finally:
-            tcase.clean()
-            tcase.reset_config()
-        pass
+            if prepared:
+                self._clean(tcase, built)
+        if rule is not None:
+            decision = rule.decision()
+            logging.info("#### testcase({name}) stop after {n} times: {reason}, cv={cv}".format(
+                name=tcase.name, n=decision['iterations'], reason=decision['reason'], cv=decision.get('cv')))
+            self.report.save_adaptive_data(self._result_name(tcase), decision)
+        if key is not None and prepared:
+            # 有迭代实际运行过时更新缓存, 完全复用的结果不刷新时间
+            datas = []
+            for path in paths:
+                with open(path, 'r') as fp:
+                    datas.append(fp.read())
+            self.resultcache.save(key, datas, {'testcase': tcase.name, 'result': self.report.current_result_dir})
+        if not self.checkpoint.testcase_done(tcase):
+            self.checkpoint.save_testcase(tcase)
+        return paths
+
+    def _observe_trial(self, tcase, paths):
+        """
+        搜索调优: 以各次迭代目标指标的均值作为本组参数取值的结果, 供选取下一组取值
+        """
+        tuner, point = tcase.trial
+        tinf = self.scheme.to_data()
+        tinf['testcase'] = tcase.to_data()
+        values = [self.report.metric_value(tinf, path, tuner.metric) for path in paths]
+        values = [value for value in values if value is not None]
+        value = mean(values) if len(values) > 0 else None
+        record = tuner.observe(point, value, {'testcase': tcase.name,
+                                              'configs': {item.name: item.value for item in tcase.configs}})
+        self.report.save_search_data(tuner.name, tuner.records(), tuner.best)
+        logging.info("#### search trial {trial}: {name} objective={value}, best={best}({bname})".format(
+            trial=record['trial'], name=tcase.name, value=value,
+            best=tuner.best['objective'], bname=tuner.best['testcase']))
 
     def _check_testcase(self, tcase):
         return True
 
+    def _screen_testcase(self, tcase, rung, fidelity, metric):
+        """
+        以较低的精度运行一次测试用例, 结果只归档到screening目录
+        :return 目标指标, 无法取得时返回None
+        """
+        name = '{name}-screen{rung}'.format(name=self._result_name(tcase), rung=rung)
+        built = False
+        try:
+            self._switch_config(tcase)
+            self._build(tcase)
+            built = True
+            ret_dir = self._result_dir(tcase, name)
+            start = time.monotonic()
+            self.result = tcase.run(ret_dir, fidelity)
+            self._record_timing(tcase, 'run', start, fidelity)
+            tinf = self.scheme.to_data()
+            tinf['testcase'] = tcase.to_data()
+            path = self.report.save_screening(name, tinf, self.find_and_read_result(ret_dir))
+            return self.report.metric_value(tinf, path, metric)
+        finally:
+            self._clean(tcase, built)
+
+    def _screen(self, tcases):
+        """
+        逐轮筛选: 每轮以screening.fidelity中的精度运行全部候选测试用例, 按目标指标保留前keep比例,
+        最后保留的测试用例再以方案的fidelity及迭代次数完整测试
+        """
+        screening = self.scheme.get_screening()
+        better = (lambda v: -v) if screening['goal'] == 'max' else (lambda v: v)
+        for rung, fidelity in enumerate(screening['fidelity']):
+            if len(tcases) <= 1:
+                break
+            keep = self.checkpoint.screening_result(rung)
+            if keep is None:
+                scores = {}
+                for tidx, tcase in enumerate(tcases):
+                    logging.info("#### screening rung {rung}({fidelity}): {tidx}/{total} {name}".format(
+                        rung=rung, fidelity=fidelity, tidx=tidx+1, total=len(tcases), name=tcase.name))
+                    scores[tcase.name] = self._screen_testcase(tcase, rung, fidelity, screening['metric'])
+                count = max(1, int(math.ceil(len(tcases) * screening['keep'])))
+                ranked = sorted(tcases, key=lambda t: (scores[t.name] is None, better(scores[t.name] or 0)))
+                keep = [t.name for t in ranked[:count]]
+                self.report.save_screening_data(rung, {'fidelity': fidelity, 'scores': scores, 'keep': keep})
+                self.checkpoint.save_screening(rung, keep)
+            # 保持原有顺序, 相邻测试用例间切换的参数较少
+            tcases = [t for t in tcases if t.name in keep]
+            logging.info("#### screening rung {rung}({fidelity}) keep {count}: {names}".format(
+                rung=rung, fidelity=fidelity, count=len(tcases), names=', '.join(keep)))
+        return tcases
+
     def _do_testcases(self):
-        total = len(self.scheme.testcases)
-        for tidx in range(total):
-            if self._check_testcase(self.scheme.testcases[tidx]) is not True:
+        if self.scheme.get_screening() is not None:
+            # 筛选需要比较全部候选测试用例, 须先展开
+            testcases = self._screen(list(self.scheme.testcases))
+        else:
+            # 测试用例逐个生成, 不预先展开
+            testcases = self.scheme.testcases
+        total = len(testcases)
+        for tidx, tcase in enumerate(testcases):
+            if self._check_testcase(tcase) is not True:
                 continue
 
             logging.info("#### run {tidx}/{total} testcase start".format(tidx=tidx+1, total=total))
 
-            self._do_testcase(self.scheme.testcases[tidx])
+            paths = self._do_testcase(tcase)
+            if tcase.trial is not None:
+                self._observe_trial(tcase, paths)
 
             logging.info("#### run {tidx}/{total} testcase done".format(tidx=tidx+1, total=total))
         pass
 
     def do_test(self):
+        self._check_rollback()
+        if self.resultcache.enable:
+            # 在设置任何参数之前取主机指纹
+            self.host_digest = host_fingerprint(with_boot = False)['digest']
         self._collect_env()
         self._install_dependent_rpms()
         self._setup_config()
@@ -132,12 +572,39 @@ class BaseTest(object):
         except Exception as e:
             raise e
         finally:
+            self._restore_testcase_config()
+            self.report.flush()
+            self.checkpoint.close()
+            self.timings.close()
             self._backup_result()
             self._reset_config()
             self._remove_dependent_rpms()
         pass
 
-    def find_and_read_result(self):
+    def _result_dir(self, tcase, name):
+        """
+        为本次迭代创建独立的结果目录, 通过模板变量{ret_dir}传给测试命令,
+        结果路径事先确定, 无需在公共结果目录中按mtime查找
+        :return 测试命令未引用{ret_dir}时返回None, 沿用原有的查找方式
+        """
+        if not tcase.uses_ret_dir:
+            return None
+        self._check_ret_dir(tcase)
+        path = os.path.abspath(os.path.join(self.result_folder[0], name))
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        return path
+
+    def _check_ret_dir(self, tcase):
+        """
+        没有结果目录的测试(如netperf, 结果取自标准输出)不能使用{ret_dir}, 否则命令中留下字面的{ret_dir}
+        """
+        if tcase.uses_ret_dir and len(self.result_folder) == 0:
+            raise TestCaseError("testcase({name}) uses {{ret_dir}}, but {test_type} test has no result folder".format(
+                name=tcase.name, test_type=self.scheme.get_test_type()))
+
+    def find_and_read_result(self, tdir = None):
         if self.result:
             return self.result 
         return ''
@@ -161,8 +628,9 @@ class BaseTest(object):
         if self.report_data["env"] is not None and self.report_data["env_export"] == False:
             self.report.save_env_data(self.report_data["env"])
             self.report_data["env_export"] = True
-        self.report.save_result(data["name"], data["tinf"], data["data"])
+        path = self.report.save_result(data["name"], data["tinf"], data["data"])
         self.report_data["datas"].append(data)
+        return path
 
     def export(self, rpath = None):
         if rpath is not None:
@@ -172,6 +640,7 @@ class BaseTest(object):
             if len(self.report_data["datas"]) > 0:
                 for data in self.report_data["datas"]:
                     self.report.save_result(data["name"], data["tinf"], data["data"], only_xlsx = True)
+            self.report.flush()
         pass
 
 
@@ -180,10 +649,10 @@ class UnixbenchTest(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./results"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
-        tdir = './results'
+        tdir = tdir or './results'
 
         for item in os.listdir(tdir):
             if item.endswith('.html') or item.endswith('.log'):
@@ -216,10 +685,10 @@ class StreamTest(BaseTest):
         else:
             return b
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         s_save = None
         m_save = None
-        tdir = './results'
+        tdir = tdir or './results'
         for item in os.listdir(tdir):
             path = '{tdir}/{item}'.format(tdir=tdir, item=item)
             stat = os.stat('{tdir}/{item}'.format(tdir=tdir, item=item))
@@ -243,9 +712,9 @@ class LmbenchTest(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./results_last"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = ''
-        tres = './results/summary.out'
+        tres = '{tdir}/summary.out'.format(tdir=tdir or './results')
 
         if os.access(tres, os.R_OK):
             with open(tres, 'r') as fp:
@@ -258,10 +727,10 @@ class FioTest(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./results"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
-        tdir = './results'
+        tdir = tdir or './results'
         for item in os.listdir(tdir):
             path = '{tdir}/{item}'.format(tdir=tdir, item=item)
             stat = os.stat('{tdir}/{item}'.format(tdir=tdir, item=item))
@@ -292,10 +761,10 @@ class IoZoneTest(BaseTest):
                 return False
         return True
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
-        tdir = './result'
+        tdir = tdir or './result'
         for item in os.listdir(tdir):
             if item.endswith('.log') is False:
                 continue
@@ -322,10 +791,10 @@ class SpecJVM2008Test(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./results"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
-        tdir = './results'
+        tdir = tdir or './results'
 
         for item in os.listdir(tdir):
             path = '{tdir}/{item}'.format(tdir=tdir, item=item)
@@ -351,11 +820,14 @@ class SpecCPU2006Test(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./result"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
         fileseq = None
-        tdir = './result'
+        # runcpu --output_root={ret_dir} 时结果位于{ret_dir}/result
+        if tdir and os.path.isdir(os.path.join(tdir, 'result')):
+            tdir = os.path.join(tdir, 'result')
+        tdir = tdir or './result'
 
         for item in os.listdir(tdir):
             if item.endswith('.txt') is False:
@@ -394,11 +866,14 @@ class SpecCPU2017Test(BaseTest):
         BaseTest.__init__(self, scheme)
         self.result_folder = ["./result"]
 
-    def find_and_read_result(self):
+    def find_and_read_result(self, tdir = None):
         data = None
         save = None
         fileseq = None
-        tdir = './result'
+        # runcpu --output_root={ret_dir} 时结果位于{ret_dir}/result
+        if tdir and os.path.isdir(os.path.join(tdir, 'result')):
+            tdir = os.path.join(tdir, 'result')
+        tdir = tdir or './result'
         for item in os.listdir(tdir):
             if item.endswith('.txt') is False:
                 continue
@@ -457,13 +932,19 @@ class TestFactory(object):
     def get(self, path):
         with open(path, 'r') as f: 
             scheme = SchemeParser().parse(f) 
-            scheme.prepare()
-
-            key = scheme.get_test_type()
-            if key:
-                test = self.__data.get(key.lower())
-                if test is not None:
-                    return test(scheme)
-            raise TestNotFound("no test named \'%s\'" % key)
+            test = self.create(scheme)
+            scheme.prepare(test.result_folder)
+            return test
         raise TestNotFound("file open failed \'%s\'" % path)
 
+    def create(self, scheme):
+        """
+        按测试类型创建测试对象, 不准备方案的运行目录(如分发测试的控制端只汇总结果)
+        """
+        key = scheme.get_test_type()
+        if key:
+            test = self.__data.get(key.lower())
+            if test is not None:
+                return test(scheme)
+        raise TestNotFound("no test named \'%s\'" % key)
+
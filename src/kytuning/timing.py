@@ -0,0 +1,112 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+from .journal import JsonlJournal
+
+__all__ = ['TimingHistory']
+
+
+class TimingHistory(object):
+    """
+    各阶段耗时的历史记录, 保存在<base_path>/timings.jsonl中, 用于估算方案的运行时间:
+        {"time", "test_type", "testcase", "phase", "seconds", "fidelity", "case", "cmd"}
+    phase:
+        setup   切换一个参数的耗时
+        build   编译测试工具(未复用编译缓存)
+        warmup  一次预热迭代
+        run     一次测试迭代(包括筛选时的低精度运行)
+    估算时依次查找同一测试用例(测试命令及参数取值相同)、同一测试命令、同一测试类型的记录,
+    测试命令取c_param替换后的命令(如unixbench的single/multi分别估算),
+    取最近若干条的均值; 测试命令引用{fidelity}时按精度的比例换算.
+        history = TimingHistory('/root/kytuning')
+        history.record('fio', tcase, 'run', 61.2, fidelity = 60)
+        seconds, source = history.estimate('fio', tcase, 'run', fidelity = 30)
+    """
+    FILE_NAME = 'timings.jsonl'
+    RECENT = 10
+
+    def __init__(self, base_path):
+        self.path = os.path.join(base_path, self.FILE_NAME)
+        self.journal = None
+        self.index = None
+
+    @staticmethod
+    def _digest(parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def cmd_key(cls, test_type, tcase) -> str:
+        return cls._digest([test_type, tcase.test_cmd])
+
+    @classmethod
+    def case_key(cls, test_type, tcase) -> str:
+        return cls._digest([test_type, tcase.test_cmd,
+                            sorted((item.name, item.setup_cmd) for item in tcase.configs)])
+
+    def record(self, test_type, tcase, phase, seconds, fidelity = None):
+        if self.journal is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            self.journal = JsonlJournal(self.path, 1)
+        self.journal.append({'time': int(time.time()), 'test_type': test_type, 'testcase': tcase.name,
+                             'phase': phase, 'seconds': round(seconds, 3), 'fidelity': fidelity,
+                             'case': self.case_key(test_type, tcase), 'cmd': self.cmd_key(test_type, tcase)})
+        self.index = None
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def _load(self):
+        if self.index is not None:
+            return self.index
+        self.index = {}
+        for record in JsonlJournal.load(self.path):
+            seconds = record.get('seconds')
+            if not isinstance(seconds, (int, float)):
+                continue
+            sample = (seconds, record.get('fidelity'))
+            for level in ('case', 'cmd', 'test_type'):
+                self.index.setdefault((level, record.get(level), record.get('phase')), []).append(sample)
+        return self.index
+
+    def empty(self) -> bool:
+        return len(self._load()) == 0
+
+    @staticmethod
+    def _scale(samples, fidelity):
+        values = []
+        for seconds, recorded in samples:
+            if isinstance(fidelity, (int, float)) and isinstance(recorded, (int, float)) and recorded > 0:
+                seconds = seconds * fidelity / recorded
+            values.append(seconds)
+        return sum(values) / len(values)
+
+    def estimate(self, test_type, tcase, phase, fidelity = None):
+        """
+        :param fidelity: 本次运行的精度, 测试命令未引用{fidelity}时忽略
+        :return: (秒数, 来源) 来源为case/cmd/test_type, 没有记录时返回(None, None)
+        """
+        index = self._load()
+        if not tcase.uses_fidelity:
+            fidelity = None
+        cmd = self.cmd_key(test_type, tcase)
+        levels = [('cmd', cmd), ('test_type', test_type)]
+        if ('cmd', cmd, phase) in index:
+            # 同一测试命令有记录时才需要计算测试用例的键
+            levels.insert(0, ('case', self.case_key(test_type, tcase)))
+        for level, key in levels:
+            samples = index.get((level, key, phase))
+            if samples:
+                return self._scale(samples[-self.RECENT:], fidelity), level
+        return None, None
@@ -0,0 +1,89 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+__all__ = ['ConfigTransition']
+
+
+class ConfigTransition(object):
+    """
+    测试用例之间的参数切换, 只设置与上一个测试用例取值不同的参数:
+        transition = ConfigTransition(rollback)
+        for tcase in testcases:
+            drop, change = transition.plan(tcase)   # 首次修改的参数在此保存原始值
+            transition.apply(tcase, drop, change)
+            tcase.run() ...
+        transition.restore()                        # 全部测试结束后统一还原
+    下一个测试用例不再使用的参数先还原为原始值, 各测试用例开始时的参数状态与逐个设置、还原时相同.
+    """
+
+    def __init__(self, rollback = None):
+        """
+        :param rollback: RollbackJournal, 保存原始值后立即记录, 还原后释放
+        """
+        self.rollback = rollback
+        self.applied = {}      # 参数名 -> 当前生效的TestConfig
+        self.originals = {}    # 参数名 -> 保存了原始值的TestConfig
+        self.tcase = None      # 最近切换到的测试用例
+
+    @staticmethod
+    def _owner(name):
+        return 'config:{name}'.format(name = name)
+
+    def plan(self, tcase):
+        """
+        计算切换到tcase需要还原及设置的参数, 并保存首次修改的参数的原始值
+        :return: (drop, change) 需要还原的参数, 需要设置的参数
+        """
+        self.tcase = tcase
+        names = set(item.name for item in tcase.configs)
+        drop = [origin for name, origin in self.originals.items() if name not in names]
+        change = []
+        for item in tcase.configs:
+            origin = self.originals.get(item.name)
+            if origin is None:
+                tcase.save_config([item])
+                self.originals[item.name] = item
+                if self.rollback is not None:
+                    self.rollback.record(self._owner(item.name), [item])
+            else:
+                item.keep_saved(origin)
+            if not item.same_as(self.applied.get(item.name)):
+                change.append(item)
+        return drop, change
+
+    def apply(self, tcase, drop, change):
+        if len(drop) > 0:
+            self._reset(tcase, drop)
+        if len(change) > 0:
+            tcase.setup_config(change)
+            for item in change:
+                self.applied[item.name] = item
+        logging.info('testcase({name}) reset {drop} configs, setup {change} of {total} configs'.format(
+            name = tcase.name, drop = len(drop), change = len(change), total = len(tcase.configs)))
+
+    def _reset(self, tcase, items):
+        tcase.reset_config(items)
+        for item in items:
+            self.applied.pop(item.name, None)
+            self.originals.pop(item.name, None)
+            if self.rollback is not None:
+                self.rollback.release(self._owner(item.name))
+
+    def restore(self):
+        """
+        还原全部保存过原始值的参数
+        """
+        items = list(reversed(list(self.originals.values())))
+        if len(items) > 0:
+            self._reset(self.tcase, items)
+        self.applied.clear()
+        self.originals.clear()
+        self.tcase = None
@@ -0,0 +1,106 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import shlex
+import logging
+
+__all__ = ['TunableError', 'tunable_path', 'sysctl_key', 'read_tunable', 'write_tunables', 'shell_write_cmd']
+
+
+class TunableError(Exception):
+    def __init__(self, path, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+        self.path = path
+
+
+# 形如 "sysctl -w vm.swappiness={value}" 的设置命令可直接改写/proc/sys
+_sysctl_set = re.compile(r'^\s*sysctl\s+(?:-q\s+)?-w\s+([\w./-]+)\s*=\s*"?\{value\}"?\s*$')
+
+
+def sysctl_key(set_cmd):
+    """
+    从sysctl -w设置命令中取出参数名, 不是单条sysctl -w命令时返回None
+    """
+    if not set_cmd:
+        return None
+    m = _sysctl_set.match(set_cmd)
+    return m.group(1) if m else None
+
+
+def tunable_path(name):
+    """
+    参数对应的文件路径: 绝对路径须位于/proc/sys或/sys下, 否则按sysctl参数名处理
+    """
+    if name.startswith('/'):
+        path = os.path.normpath(name)
+        if not (path.startswith('/proc/sys/') or path.startswith('/sys/')):
+            raise TunableError(name, '{name} is not under /proc/sys or /sys'.format(name=name))
+        return path
+    # 与sysctl相同, 以'.'分隔时参数名中的'/'对应路径中的'.', 如net.ipv4.conf.eth0/1.rp_filter
+    if '.' in name:
+        parts = [part.replace('/', '.') for part in name.split('.')]
+    else:
+        parts = name.split('/')
+    return os.path.join('/proc/sys', *parts)
+
+
+def _normalize(text):
+    """
+    规整参数取值: 合并空白; sysfs中"always [madvise] never"形式取方括号中的当前值
+    """
+    text = str(text).strip()
+    m = re.search(r'\[([^\]]+)\]', text)
+    if m:
+        return m.group(1)
+    return ' '.join(text.split())
+
+
+def read_tunable(path):
+    with open(path, 'r') as fp:
+        return _normalize(fp.read())
+
+
+def write_tunables(items):
+    """
+    一次写入一组参数, 全部写完后逐个读回校验; 当前值已等于目标值的参数不写入
+    :param items: [(path, value), ...]
+    :raise TunableError: 写入失败或读回的值与目标值不一致
+    """
+    pending = []
+    for path, value in items:
+        value = _normalize(value)
+        try:
+            if read_tunable(path) == value:
+                continue
+        except OSError:
+            pass
+        try:
+            with open(path, 'w') as fp:
+                fp.write(value + '\n')
+        except OSError as e:
+            raise TunableError(path, 'write {value} to {path} failed: {err}'.format(value=value, path=path, err=e))
+        pending.append((path, value))
+    for path, value in pending:
+        try:
+            current = read_tunable(path)
+        except OSError as e:
+            raise TunableError(path, 'read back {path} failed: {err}'.format(path=path, err=e))
+        if current != value:
+            raise TunableError(path, '{path} is {current} after writing {value}'.format(path=path, current=current, value=value))
+        logging.debug('tunable {path} = {value}'.format(path=path, value=value))
+    return len(pending)
+
+
+def shell_write_cmd(path, value):
+    """
+    与写入参数等价的shell命令, 用于记录还原命令(如--resume时还原)
+    """
+    return 'printf "%s\\n" {value} > {path}'.format(value=shlex.quote(_normalize(value)), path=shlex.quote(path))
@@ -0,0 +1,214 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import sys
+import glob
+import time
+import tarfile
+import tempfile
+import threading
+import subprocess
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'src'))
+
+from kytuning.config import KYConfig
+from kytuning.fleet import WorkQueue, Controller
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def test_batch(self):
+        queue = WorkQueue(8, batch = 4)
+        self.assertEqual(queue.next('a'), ('index', 0))
+        self.assertEqual(queue.next('b'), ('index', 4))
+        self.assertEqual(list(queue.local['a']), [1, 2, 3])
+        self.assertTrue(queue.complete('a', 0))
+        self.assertEqual(queue.next('a'), ('index', 1))
+
+    def test_steal(self):
+        queue = WorkQueue(8, batch = 4)
+        queue.next('a')
+        queue.next('b')
+        # 全局队列已空, 从剩余最多的代理端队列尾部取走一半
+        queue.local['b'].pop()
+        self.assertEqual(queue.next('c'), ('index', 2))
+        self.assertEqual(list(queue.local['a']), [1])
+        self.assertEqual(list(queue.local['c']), [3])
+
+    def test_wait_and_done(self):
+        queue = WorkQueue(2, batch = 2)
+        self.assertEqual(queue.next('a'), ('index', 0))
+        self.assertEqual(queue.next('b'), ('index', 1))
+        self.assertEqual(queue.next('c'), ('wait', None))
+        queue.complete('a', 0)
+        queue.complete('b', 1)
+        self.assertTrue(queue.finished())
+        self.assertEqual(queue.next('c'), ('done', None))
+
+    def test_expire(self):
+        now = time.time()
+        queue = WorkQueue(4, batch = 2, timeout = 10)
+        self.assertEqual(queue.next('a', now), ('index', 0))
+        self.assertEqual(queue.next('b', now), ('index', 2))
+        queue.touch('b', now + 20)
+        # a失联, 正在运行及尚未运行的测试用例放回全局队列
+        self.assertEqual(queue.next('c', now + 20), ('index', 0))
+        self.assertNotIn('a', queue.seen)
+        self.assertNotIn('a', queue.running)
+        self.assertEqual(list(queue.local['c']), [1])
+
+    def test_duplicate_result(self):
+        now = time.time()
+        queue = WorkQueue(1, batch = 1, timeout = 10)
+        queue.next('a', now)
+        self.assertEqual(queue.next('b', now + 20), ('index', 0))
+        self.assertTrue(queue.complete('b', 0))
+        # 失联后又恢复的代理端上报的结果丢弃
+        self.assertFalse(queue.complete('a', 0))
+        self.assertEqual(queue.done, {0})
+
+    def test_retry(self):
+        queue = WorkQueue(1, batch = 1, retries = 1)
+        self.assertEqual(queue.next('a'), ('index', 0))
+        queue.fail('a', 0, 'error')
+        self.assertFalse(queue.finished())
+        # 失败的测试用例在其它代理端重试一次
+        self.assertEqual(queue.next('b'), ('index', 0))
+        queue.fail('b', 0, 'error again')
+        self.assertTrue(queue.finished())
+        self.assertEqual(queue.failed, {0: 'error again'})
+        self.assertEqual(queue.next('a'), ('done', None))
+
+    def test_lost_running(self):
+        queue = WorkQueue(2, batch = 2)
+        self.assertEqual(queue.next('a'), ('index', 0))
+        # 未上报结果即领取下一个, 放回的测试用例由其它代理端运行
+        self.assertEqual(queue.next('a'), ('index', 1))
+        self.assertEqual(queue.next('b'), ('index', 0))
+
+
+class SameHostTest(unittest.TestCase):
+
+    def _session(self, tunes):
+        return {'name': 'fio.yaml', 'tunes': tunes, 'hosts': {}, 'queue': WorkQueue(4)}
+
+    def _join(self, session, agent, host):
+        ret = Controller._same_host(session, agent, host)
+        if ret is None:
+            session['queue'].touch(agent)
+        return ret
+
+    def test_refuse_with_configs(self):
+        session = self._session(True)
+        self.assertIsNone(self._join(session, 'a', 'host-1'))
+        self.assertIsNone(self._join(session, 'b', 'host-2'))
+        self.assertIsNotNone(self._join(session, 'c', 'host-1'))
+        # 重新加入的代理端不受影响
+        self.assertIsNone(self._join(session, 'a', 'host-1'))
+
+    def test_allow_without_configs(self):
+        session = self._session(False)
+        self.assertIsNone(self._join(session, 'a', 'host-1'))
+        self.assertIsNone(self._join(session, 'b', 'host-1'))
+
+
+FLEET_SCHEME = """
+project:    "fio-fleet"
+test_type:  "fio"
+tool_tgz:   "{base_path}/tools/dummy.tar.gz"
+tool_dir:   "{base_path}/dummy"
+tool_decompression: "tar -xf {tool_tgz} -C {base_path}"
+maxiterations:  1
+testcase:
+%s
+"""
+
+FLEET_TESTCASE = """
+  - clean:  "true"
+    build:  "true"
+    run:
+        command: "printf '4K_write: (g=0): rw={readwrite}, bs=(R) 4096B-4096B, (W) 4096B-4096B\\\\n  write: IOPS=%d, BW=48.1MiB/s (50.4MB/s)(2886MiB/60001msec)\\\\n' > {ret_dir}/{blocksize}_{readwrite}.result"
+        c_param: {blocksize: "4K", readwrite: "write"}
+"""
+
+
+class LocalFleetTest(unittest.TestCase):
+    """
+    本机运行控制端及多个代理端(--base_path区分), 方案中没有configs
+    """
+    TESTCASES = 8
+    AGENTS = 3
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'controller')
+        KYConfig().load(os.path.join(TOP, 'conf', 'kytuning.yaml'))
+        KYConfig().add({'main': {'base_path': self.base, 'report_path': self.tmp.name, 'result_cache_ttl': 0}})
+        tool = os.path.join(self.base, 'tools', 'dummy')
+        os.makedirs(tool)
+        with open(os.path.join(tool, 'Makefile'), 'w') as fp:
+            fp.write('all:\n')
+        with tarfile.open(os.path.join(self.base, 'tools', 'dummy.tar.gz'), 'w:gz') as tar:
+            tar.add(tool, 'dummy')
+        self.scheme = os.path.join(self.tmp.name, 'fio-fleet.yaml')
+        with open(self.scheme, 'w') as fp:
+            # 测试用例均未命名, 名称相同, 各自的IOPS不同
+            fp.write(FLEET_SCHEME % ''.join(FLEET_TESTCASE % (1000 + idx) for idx in range(self.TESTCASES)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_agents(self):
+        controller = Controller([self.scheme], ('127.0.0.1', 0), batch = 2, timeout = 60, linger = 10)
+        thread = threading.Thread(target = controller.serve)
+        thread.daemon = True
+        thread.start()
+        for _ in range(100):
+            if controller.server is not None:
+                break
+            time.sleep(0.1)
+        url = 'http://127.0.0.1:{port}'.format(port = controller.server.server_address[1])
+        agents = [subprocess.Popen([sys.executable, os.path.join(TOP, 'src', 'kytuning.py'), '--agent=' + url,
+                                    '--base_path=' + os.path.join(self.tmp.name, 'agent{idx}'.format(idx = idx))],
+                                   cwd = TOP, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+                  for idx in range(self.AGENTS)]
+        try:
+            thread.join(180)
+            self.assertFalse(thread.is_alive())
+            for agent in agents:
+                self.assertEqual(agent.wait(60), 0)
+        finally:
+            for agent in agents:
+                if agent.poll() is None:
+                    agent.kill()
+
+        # 全部结果汇总到控制端的同一个结果目录中, 每个测试用例恰好一个
+        rdirs = glob.glob(os.path.join(self.base, 'run', 'fio', 'results', '*'))
+        self.assertEqual(len(rdirs), 1)
+        results = [path for path in glob.glob(os.path.join(rdirs[0], 'result', '*')) if not path.endswith('.json')]
+        iops = []
+        for path in results:
+            with open(path, 'r') as fp:
+                iops.extend(int(v) for v in re.findall(r'IOPS=(\d+)', fp.read()))
+        self.assertEqual(sorted(iops), [1000 + idx for idx in range(self.TESTCASES)])
+        self.assertTrue(os.path.exists(os.path.join(rdirs[0], 'kytuning-result.xlsx')))
+        agents = set()
+        for path in glob.glob(os.path.join(rdirs[0], 'testcases', 'testcase-*.json')):
+            with open(path, 'r') as fp:
+                agents.add(json.load(fp).get('agent'))
+        self.assertGreater(len(agents), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
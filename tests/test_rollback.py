@@ -0,0 +1,94 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'src'))
+
+from kytuning.rollback import RollbackJournal
+
+
+def item(name, value, cmd = None):
+    return {'name': name, 'path': None, 'value': value, 'cmd': cmd}
+
+
+class RollbackJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rollback = RollbackJournal(self.tmp.name)
+        self.order = os.path.join(self.tmp.name, 'order')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, *records, tail = ''):
+        with open(self.rollback.path, 'a') as fp:
+            for record in records:
+                fp.write(json.dumps(record) + '\n')
+            fp.write(tail)
+
+    def restore_cmd(self, name):
+        return 'echo {name} >> {path}'.format(name = name, path = self.order)
+
+    def test_resave_keeps_earliest(self):
+        self.write({'type': 'save', 'owner': 'a', 'items': [item('x', 1)]},
+                   {'type': 'save', 'owner': 'a', 'items': [item('x', 2), item('y', 3)]})
+        # 同一owner未还原时再次保存, x保留最早的原始值
+        self.assertEqual(self.rollback.pending(), [('a', [item('x', 1), item('y', 3)])])
+
+    def test_done(self):
+        self.write({'type': 'save', 'owner': 'a', 'items': [item('x', 1)]},
+                   {'type': 'save', 'owner': 'b', 'items': [item('y', 2)]},
+                   {'type': 'done', 'owner': 'a'})
+        self.assertEqual(self.rollback.pending(), [('b', [item('y', 2)])])
+
+    def test_truncated_tail(self):
+        # 写入最后一行时进程被杀, 不完整的记录跳过
+        self.write({'type': 'save', 'owner': 'a', 'items': [item('x', 1)]},
+                   tail = '{"type": "done", "own')
+        self.assertEqual(self.rollback.pending(), [('a', [item('x', 1)])])
+        self.assertTrue(self.rollback.unclean())
+
+    def test_restore_order(self):
+        self.write({'type': 'save', 'owner': 'a', 'items': [item('x', 1, self.restore_cmd('x')),
+                                                            item('y', 2, self.restore_cmd('y'))]},
+                   {'type': 'save', 'owner': 'b', 'items': [item('z', 3, self.restore_cmd('z'))]})
+        self.assertTrue(self.rollback.restore())
+        # 按保存的逆序还原, 全部成功后清空日志
+        with open(self.order, 'r') as fp:
+            self.assertEqual(fp.read().split(), ['z', 'y', 'x'])
+        self.assertFalse(os.path.exists(self.rollback.path))
+        self.assertFalse(self.rollback.unclean())
+
+    def test_restore_failed(self):
+        self.write({'type': 'save', 'owner': 'a', 'items': [item('x', 1, self.restore_cmd('x'))]},
+                   {'type': 'save', 'owner': 'b', 'items': [item('y', 2, 'false')]})
+        self.assertFalse(self.rollback.restore())
+        # 还原失败时保留日志, 其余参数仍然还原
+        with open(self.order, 'r') as fp:
+            self.assertEqual(fp.read().split(), ['x'])
+        self.assertEqual(len(self.rollback.pending()), 2)
+
+    def test_release(self):
+        self.rollback._open().append({'type': 'save', 'owner': 'a', 'items': [item('x', 1)]})
+        self.rollback._open().append({'type': 'save', 'owner': 'b', 'items': [item('y', 2)]})
+        self.rollback.release('a')
+        self.assertTrue(os.path.exists(self.rollback.path))
+        self.rollback.release('b')
+        self.assertFalse(os.path.exists(self.rollback.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
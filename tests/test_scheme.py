@@ -0,0 +1,99 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'src'))
+
+from kytuning.config import KYConfig
+from kytuning.scheme import SchemeParser, SchemeParserError
+
+
+SCHEME = """
+project:    "fio-test"
+test_type:  "fio"
+tool_tgz:   "{base_path}/tools/fio.tar.gz"
+tool_dir:   "{base_path}/fio"
+tool_decompression: "tar -xf {tool_tgz} -C {base_path}"
+fidelity:   60
+%(extra)s
+testcase:
+    clean:  "make clean"
+    build:  "make"
+    run:    "./fio --runtime={fidelity}"
+    %(flag)s
+    configs:
+        - name:   "vm.swappiness"
+          get:    "cat /proc/sys/vm/swappiness"
+          set:    "echo {value} > /proc/sys/vm/swappiness"
+          type:   "continuous"
+          values: [0, 101, 25]
+          %(refine)s
+"""
+
+SCREENING = """
+screening:
+    fidelity: [10]
+    keep:     0.5
+"""
+
+
+def parse(extra = '', flag = '', refine = ''):
+    return SchemeParser().parse(SCHEME % {'extra': extra, 'flag': flag, 'refine': refine})
+
+
+class SchemeParserTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        KYConfig().load(os.path.join(TOP, 'conf', 'kytuning.yaml'))
+        KYConfig().add({'main': {'base_path': cls.tmp.name}})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_grid(self):
+        scheme = parse()
+        self.assertEqual([tcase.configs[0].value for tcase in scheme.testcases], [0, 25, 50, 75, 100])
+
+    def test_refine(self):
+        scheme = parse(refine = 'refine: {resolution: 5, budget: 10}')
+        self.assertEqual(len(scheme.testcases), 10)
+
+    def test_refine_with_screening(self):
+        # 筛选须先展开全部测试用例, 细分的取值依赖测试结果
+        with self.assertRaises(SchemeParserError):
+            parse(extra = SCREENING, refine = 'refine: {resolution: 5, budget: 10}')
+
+    def test_search_with_screening(self):
+        with self.assertRaises(SchemeParserError):
+            parse(extra = SCREENING, flag = 'schemeflag: "search"')
+
+    def test_screening(self):
+        scheme = parse(extra = SCREENING)
+        self.assertEqual(scheme.get_screening()['fidelity'], [10])
+        self.assertEqual(len(list(scheme.testcases)), 5)
+
+    @unittest.skipUnless(os.access('/proc/sys/vm/swappiness', os.R_OK | os.W_OK), 'requires root')
+    def test_native_sysctl(self):
+        parser = SchemeParser()
+        self.assertEqual(parser.parse_tunable_path({'set': 'sysctl -w vm.swappiness={value}'}),
+                         '/proc/sys/vm/swappiness')
+        # 只写的参数无法读回校验, 仍使用设置命令
+        self.assertIsNone(parser.parse_tunable_path({'set': 'sysctl -w vm.drop_caches={value}'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'src'))
+
+from kytuning.search import Tuner, Refiner
+
+
+# 可分离的目标函数, 最优点为TARGET
+SIZES = [6, 6, 6]
+TARGET = (2, 4, 1)
+
+
+def objective(point):
+    return -sum((idx - target) ** 2 for idx, target in zip(point, TARGET))
+
+
+def search(searcher, func):
+    points = []
+    while True:
+        point = searcher.propose()
+        if point is None:
+            return points
+        points.append(point)
+        searcher.observe(point, func(point))
+
+
+class TunerTest(unittest.TestCase):
+
+    def test_budget(self):
+        for strategy in Tuner.STRATEGIES:
+            tuner = Tuner(SIZES, strategy, budget = 10)
+            points = search(tuner, objective)
+            self.assertEqual(len(points), 10)
+            self.assertEqual(len(set(points)), 10)
+            self.assertIsNone(tuner.propose())
+
+    def test_space(self):
+        # 预算超过组合总数时测试全部组合后结束
+        for strategy in Tuner.STRATEGIES:
+            points = search(Tuner([2, 3], strategy, budget = 100), objective)
+            self.assertEqual(sorted(points), [(a, b) for a in range(2) for b in range(3)])
+
+    def test_seed(self):
+        for strategy in Tuner.STRATEGIES:
+            first = search(Tuner(SIZES, strategy, budget = 30, seed = 7), objective)
+            second = search(Tuner(SIZES, strategy, budget = 30, seed = 7), objective)
+            self.assertEqual(first, second)
+
+    def test_optimum(self):
+        for strategy in ('hill', 'tpe'):
+            tuner = Tuner(SIZES, strategy, budget = 60)
+            search(tuner, objective)
+            self.assertEqual(tuple(tuner.best['point']), TARGET, strategy)
+            self.assertEqual(tuner.best['objective'], 0)
+
+    def test_min(self):
+        tuner = Tuner(SIZES, 'hill', budget = 60, goal = 'min')
+        search(tuner, lambda point: -objective(point))
+        self.assertEqual(tuple(tuner.best['point']), TARGET)
+
+    def test_failed(self):
+        # 无法取得目标值的组合最差
+        tuner = Tuner([4], 'random', budget = 4)
+        search(tuner, lambda point: None if point[0] == 3 else point[0])
+        self.assertEqual(tuner.best['point'], [2])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Tuner(SIZES, 'anneal')
+        with self.assertRaises(ValueError):
+            Tuner(SIZES, goal = 'avg')
+
+
+class RefinerTest(unittest.TestCase):
+    GRID = [0, 25, 50, 75, 100]
+
+    def test_converge(self):
+        for target in (0, 13, 37, 100):
+            refiner = Refiner(self.GRID, resolution = 1, budget = 30)
+            values = search(refiner, lambda value: -(value - target) ** 2)
+            self.assertEqual(refiner.best['point'], target)
+            self.assertEqual(values[:len(self.GRID)], self.GRID)
+            # 已测试的取值不再重复测试
+            self.assertEqual(len(values), len(set(values)))
+
+    def test_budget(self):
+        refiner = Refiner(self.GRID, resolution = 1, budget = 8)
+        self.assertEqual(len(search(refiner, lambda value: -(value - 37) ** 2)), 8)
+
+    def test_min(self):
+        refiner = Refiner(self.GRID, resolution = 1, budget = 30, goal = 'min')
+        search(refiner, lambda value: (value - 62) ** 2)
+        self.assertEqual(refiner.best['point'], 62)
+
+    def test_float(self):
+        refiner = Refiner([0.0, 0.5, 1.0], resolution = 0.01, budget = 30)
+        search(refiner, lambda value: -(value - 0.3) ** 2)
+        self.assertAlmostEqual(refiner.best['point'], 0.3, delta = 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
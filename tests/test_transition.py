@@ -0,0 +1,99 @@
+"""
+ * Copyright (c) KylinSoft  Co., Ltd. 2024.All rights reserved.
+ * PilotGo-plugin licensed under the Mulan Permissive Software License, Version 2.
+ * See LICENSE file for more details.
+ * Date: Sun Oct 18 15:40:12 2026 +0800
+"""
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'src'))
+
+from kytuning import scheme
+from kytuning.rollback import RollbackJournal
+from kytuning.transition import ConfigTransition
+
+
+class FakeCase(object):
+    """
+    记录参数的保存、设置和还原, 不执行命令
+    """
+    def __init__(self, name, log, **values):
+        self.name = name
+        self.log = log
+        self.configs = [scheme.TestConfig(k, '', None, 'set %s {value}' % k, v) for k, v in values.items()]
+
+    def save_config(self, items):
+        for item in items:
+            item.reset_cmd = item.format_set('orig')
+            self.log.append(('save', item.name))
+
+    def setup_config(self, items):
+        for item in items:
+            self.log.append(('setup', item.name, item.value))
+
+    def reset_config(self, items):
+        for item in items:
+            self.log.append(('reset', item.name, item.reset_cmd))
+
+
+class ConfigTransitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rollback = RollbackJournal(self.tmp.name)
+        self.transition = ConfigTransition(self.rollback)
+        self.log = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def switch(self, tcase):
+        del self.log[:]
+        drop, change = self.transition.plan(tcase)
+        self.transition.apply(tcase, drop, change)
+        return list(self.log)
+
+    def owners(self):
+        return [owner for owner, _ in self.rollback.pending()]
+
+    def test_sequence(self):
+        self.assertEqual(self.switch(FakeCase('t1', self.log, a = 1, b = 1)),
+                         [('save', 'a'), ('save', 'b'), ('setup', 'a', 1), ('setup', 'b', 1)])
+        self.assertEqual(self.owners(), ['config:a', 'config:b'])
+
+        # 只设置取值改变的参数, 原始值沿用首次保存的
+        tcase = FakeCase('t2', self.log, a = 1, b = 2)
+        self.assertEqual(self.switch(tcase), [('setup', 'b', 2)])
+        self.assertEqual(tcase.configs[1].reset_cmd, 'set b orig')
+
+        # 不再使用的参数先还原, 再设置改变的参数
+        self.assertEqual(self.switch(FakeCase('t3', self.log, a = 2)),
+                         [('reset', 'b', 'set b orig'), ('setup', 'a', 2)])
+        self.assertEqual(self.owners(), ['config:a'])
+
+        # 再次使用已还原的参数时重新保存原始值
+        self.assertEqual(self.switch(FakeCase('t4', self.log, a = 2, b = 3)),
+                         [('save', 'b'), ('setup', 'b', 3)])
+
+        del self.log[:]
+        self.transition.restore()
+        self.assertEqual(self.log, [('reset', 'b', 'set b orig'), ('reset', 'a', 'set a orig')])
+        self.assertFalse(os.path.exists(self.rollback.path))
+        self.assertEqual(self.transition.originals, {})
+
+    def test_same_configs(self):
+        self.switch(FakeCase('t1', self.log, a = 1))
+        self.assertEqual(self.switch(FakeCase('t2', self.log, a = 1)), [])
+        self.assertEqual(self.switch(FakeCase('t3', self.log)), [('reset', 'a', 'set a orig')])
+        self.assertFalse(self.rollback.unclean())
+
+
+if __name__ == '__main__':
+    unittest.main()